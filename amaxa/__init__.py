@@ -1,3 +1,3 @@
-from . import transforms
+from . import formats, transforms
 from .amaxa import *
 from .constants import *
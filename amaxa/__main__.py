@@ -3,13 +3,18 @@ import logging
 import os.path
 import sys
 
+import amaxa
 from amaxa import constants
 from amaxa.loader import (
     CredentialLoader,
     ExtractionOperationLoader,
     LoadOperationLoader,
+    StateJournal,
     StateLoader,
+    load_binary_state,
     load_file,
+    replay_journal,
+    save_binary_state,
     save_state,
 )
 
@@ -100,11 +105,22 @@ def main():
     ex = operation_loader.result
 
     if args.use_state:
-        state_file = load_file(args.use_state)
-        state_loader = StateLoader(state_file, ex)
-        state_loader.load()
-        if state_loader.errors:
-            errors = "\n".join(state_loader.errors)
+        try:
+            if args.use_state.name.endswith(".journal"):
+                state_errors = replay_journal(args.use_state, ex)
+            elif args.use_state.name.endswith(".bin"):
+                state_errors = load_binary_state(args.use_state.buffer, ex)
+            else:
+                state_loader = StateLoader(load_file(args.use_state), ex)
+                state_loader.load()
+                state_errors = state_loader.errors
+        finally:
+            # A journal we resume from is replaced when the load starts,
+            # which some platforms don't allow while it's open.
+            args.use_state.close()
+
+        if state_errors:
+            errors = "\n".join(state_errors)
             logger.error(f"Errors occured during load of the state file: {errors}")
             return -1
 
@@ -112,19 +128,53 @@ def main():
         logger.info("Input files validated successfully.")
         return 0
 
-    ret = ex.run()
-
-    if args.load and ret != 0 and ex.global_id_map:
-        # Save the operation state.
-        json_mode = args.config.name.endswith("json")
-        with open(
-            os.path.splitext(args.config.name)[0]
-            + ".state"
-            + (".json" if json_mode else ".yaml"),
-            "w",
-            encoding="utf-8",
-        ) as state_file:
-            state_file.write(save_state(ex, json_mode))
+    if args.load:
+        # Record progress as we go, so that the load can be resumed
+        # even if we don't get the chance to save the state file.
+        journal_path = os.path.splitext(args.config.name)[0] + ".journal"
+        resuming_journal = args.use_state is not None and os.path.abspath(
+            args.use_state.name
+        ) == os.path.abspath(journal_path)
+        if not resuming_journal and os.path.exists(journal_path):
+            # Starting the journal would overwrite that of an earlier load,
+            # which may hold Ids loaded since any state file we resume from was saved.
+            logger.error(
+                f"The journal {journal_path} of an earlier load exists. "
+                f"Resume that load with --use-state {journal_path}, "
+                "or delete the journal to start over."
+            )
+            return -1
+
+        ex.journal = StateJournal(journal_path, ex)
+
+    try:
+        ret = ex.run()
+    finally:
+        if args.load:
+            ex.journal.close()
+
+    if args.load and ret == 0:
+        ex.journal.remove()
+
+    if args.load and ret != 0:
+        # A failed load keeps its Id map open, so that we can save the operation state.
+        try:
+            if ex.global_id_map:
+                # Save the operation state.
+                state_path = os.path.splitext(args.config.name)[0] + ".state"
+                if ex.state_format is amaxa.StateFormat.BINARY:
+                    with open(state_path + ".bin", "wb") as state_file:
+                        save_binary_state(ex, state_file)
+                else:
+                    json_mode = args.config.name.endswith("json")
+                    with open(
+                        state_path + (".json" if json_mode else ".yaml"),
+                        "w",
+                        encoding="utf-8",
+                    ) as state_file:
+                        state_file.write(save_state(ex, json_mode))
+        finally:
+            ex.close()
 
     return ret
 
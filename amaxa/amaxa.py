@@ -1,10 +1,24 @@
 import abc
+import array
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
 import csv
-import functools
+import itertools
 import logging
+import multiprocessing
+import operator
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import weakref
 from enum import Enum, unique
 
-from . import constants
+from . import constants, formats
+from .api import ThreadedIterator
 
 
 @unique
@@ -41,6 +55,23 @@ class LoadStage(StringEnum):
     DEPENDENTS = "dependents"
 
 
+class IdMapType(StringEnum):
+    MEMORY = "memory"
+    COMPACT = "compact"
+    DISK = "disk"
+
+
+class IdSetType(StringEnum):
+    MEMORY = "memory"
+    COMPACT = "compact"
+    DISK = "disk"
+
+
+class StateFormat(StringEnum):
+    TEXT = "text"
+    BINARY = "binary"
+
+
 class FileType(Enum):
     INPUT = 1
     OUTPUT = 2
@@ -52,54 +83,150 @@ class AmaxaException(Exception):
     pass
 
 
-class SalesforceId(object):
-    def __init__(self, idstr):
-        if isinstance(idstr, SalesforceId):
-            self.id = idstr.id
-        else:
-            idstr = idstr.strip()
-            if len(idstr) == 15:
-                suffix = ""
-                for i in range(0, 3):
-                    baseTwo = 0
-                    for j in range(0, 5):
-                        character = idstr[i * 5 + j]
-                        if character >= "A" and character <= "Z":
-                            baseTwo += 1 << j
-                    suffix += "ABCDEFGHIJKLMNOPQRSTUVWXYZ012345"[baseTwo]
-                self.id = idstr + suffix
-            elif len(idstr) == 18:
-                self.id = idstr
-            else:
-                raise ValueError("Salesforce Ids must be 15 or 18 characters.")
+# Maps each character of a 15-character Salesforce Id to "1" if it's an uppercase letter,
+# and "0" otherwise. Each group of five of these flags, read in reverse, selects one
+# character of the three-character case-insensitivity suffix.
+_ID_CASE_FLAGS = str.maketrans(
+    {chr(c): "1" if "A" <= chr(c) <= "Z" else "0" for c in range(128)}
+)
+_ID_SUFFIX_CHARACTERS = {
+    format(i, "05b")[::-1]: "ABCDEFGHIJKLMNOPQRSTUVWXYZ012345"[i] for i in range(32)
+}
+
+# SalesforceIds by their 18-character form. See SalesforceId.__new__().
+_interned_ids = {}
+
+
+def _add_id_suffix(idstr):
+    # Returns the 18-character form of a 15-character Id.
+    flags = idstr.translate(_ID_CASE_FLAGS)
+    try:
+        return (
+            idstr
+            + _ID_SUFFIX_CHARACTERS[flags[0:5]]
+            + _ID_SUFFIX_CHARACTERS[flags[5:10]]
+            + _ID_SUFFIX_CHARACTERS[flags[10:15]]
+        )
+    except KeyError:
+        raise ValueError("Salesforce Ids must contain only ASCII characters.")
+
+
+def _uninterned_id(idstr):
+    # Build a SalesforceId from a valid 15- or 18-character Id string without interning it.
+    # The compact and disk-backed Id containers rebuild their Ids this way, so that
+    # the Ids they hand out don't fill the intern table and stay alive with it.
+    if len(idstr) == 15:
+        idstr = _add_id_suffix(idstr)
+
+    return str.__new__(SalesforceId, idstr)
+
+
+class SalesforceId(str):
+    # An 18-character Salesforce Id. SalesforceIds are strings, so they hash at native
+    # string speed and carry no per-instance dictionary. They compare equal to both
+    # the 15- and 18-character forms of the Id.
+    __slots__ = ()
+
+    def __new__(cls, idstr):
+        if type(idstr) is cls:
+            return idstr
+
+        # Ids are interned, so that equal Ids are usually the same object
+        # and set and dict lookups don't need to call __eq__().
+        # The table is emptied when it's full, which costs only speed.
+        interned = _interned_ids.get(idstr)
+        if interned is not None:
+            return interned
+
+        idstr = idstr.strip()
+        if len(idstr) == 15:
+            idstr = _add_id_suffix(idstr)
+
+            interned = _interned_ids.get(idstr)
+            if interned is not None:
+                return interned
+        elif len(idstr) != 18:
+            raise ValueError("Salesforce Ids must be 15 or 18 characters.")
+
+        if len(_interned_ids) >= constants.ID_INTERN_TABLE_SIZE:
+            _interned_ids.clear()
+
+        interned = _interned_ids[idstr] = str.__new__(cls, idstr)
+        return interned
 
     def __eq__(self, other):
-        if isinstance(other, SalesforceId):
-            return self.id == other.id
-        elif isinstance(other, str):
-            return self.id == SalesforceId(other).id
+        if self is other:
+            return True
+        if not isinstance(other, str):
+            return False
+        if len(other) == 15:
+            return self.startswith(other)
+
+        return str.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
-        return False
+    __hash__ = str.__hash__
 
-    def __hash__(self):
-        return hash(self.id)
+    @property
+    def id(self):
+        return str.__str__(self)
 
     def __str__(self):
-        return self.id
+        return str.__str__(self)
 
     def __repr__(self):
-        return self.id
+        return str.__str__(self)
+
+
+class BufferedCsvWriter(object):
+    # Collects rows for a csv writer and hands them, a block at a time,
+    # to its FileStore's writer thread.
+    def __init__(self, file_store, writer):
+        self.file_store = file_store
+        self.writer = writer
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def writerow(self, row):
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= constants.BUFFERED_WRITE_ROWS:
+                self.file_store.write_rows(self.writer, self.rows)
+                self.rows = []
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        with self.lock:
+            if self.rows:
+                self.file_store.write_rows(self.writer, self.rows)
+                self.rows = []
 
 
 class FileStore(object):
     def __init__(self):
         self.store = {}
         self.csv_store = {}
+        self.buffered_writers = []
+        self.write_queue = None
+        self.write_thread = None
+        self.write_lock = threading.Lock()
+        self.write_error = None
 
     def set_file(self, sobject, ftype, f):
         self.store[(sobject, ftype)] = f
 
-    def set_csv(self, sobject, ftype, f):
+    def set_csv(self, sobject, ftype, f, buffered=False):
+        # Rows written to a buffered csv writer are written to disk on a background thread,
+        # so that a slow disk doesn't hold up API calls. They're flushed by flush() and close().
+        if buffered:
+            f = BufferedCsvWriter(self, f)
+            self.buffered_writers.append(f)
+
         self.csv_store[(sobject, ftype)] = f
 
     def get_file(self, sobject, ftype):
@@ -108,12 +235,851 @@ class FileStore(object):
     def get_csv(self, sobject, ftype):
         return self.csv_store[(sobject, ftype)]
 
+    def write_rows(self, writer, rows):
+        # Queue rows to be written by the writer thread, blocking if it's too far behind.
+        # Errors from the writer thread are raised here or by flush().
+        if self.write_error is not None:
+            raise self.write_error
+
+        # The lock makes sure that concurrent callers share a single writer thread,
+        # and that no rows are queued after flush() has stopped it.
+        with self.write_lock:
+            if self.write_thread is None:
+                self.write_queue = queue.Queue(maxsize=constants.WRITE_QUEUE_SIZE)
+                self.write_thread = threading.Thread(
+                    target=self._write_queued_rows, daemon=True
+                )
+                self.write_thread.start()
+
+            self.write_queue.put((writer, rows))
+
+    def _write_queued_rows(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+
+            # After an error, keep draining the queue so that writers don't block.
+            if self.write_error is None:
+                try:
+                    item[0].writerows(item[1])
+                except Exception as e:
+                    self.write_error = e
+
+    def flush(self):
+        for writer in self.buffered_writers:
+            writer.flush()
+
+        with self.write_lock:
+            if self.write_thread is not None:
+                self.write_queue.put(None)
+                self.write_thread.join()
+                self.write_thread = None
+
+        if self.write_error is not None:
+            raise self.write_error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for f in self.store.values():
+                f.close()
+
+
+def _strongly_connected_components(successors):
+    # Tarjan's algorithm, iteratively, over a graph given as lists of successor node indices.
+    # Returns the component number of each node. Components are numbered in the order found,
+    # so that every component follows all of the components reachable from it.
+    index = [None] * len(successors)
+    low = [0] * len(successors)
+    on_stack = [False] * len(successors)
+    components = [None] * len(successors)
+    stack = []
+    counter = 0
+    component_count = 0
+
+    for root in range(len(successors)):
+        if index[root] is not None:
+            continue
+
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on_stack[v] = True
+
+            recurse = False
+            while i < len(successors[v]):
+                w = successors[v][i]
+                i += 1
+                if index[w] is None:
+                    work[-1] = (v, i)
+                    work.append((w, 0))
+                    recurse = True
+                    break
+                elif on_stack[w]:
+                    low[v] = min(low[v], index[w])
+
+            if recurse:
+                continue
+
+            work.pop()
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    components[w] = component_count
+                    if w == v:
+                        break
+                component_count += 1
+
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+
+    return components
+
+
+def _pack_id(id):
+    # Split an 18-character Id into a group key, made up of its first seven characters
+    # (the key prefix and instance), and an integer holding the next eight characters.
+    # The suffix is recomputed on unpacking. Returns None for Ids that can't be packed.
+    try:
+        return id[:7], int.from_bytes(id[7:15].encode("ascii"), "big")
+    except UnicodeEncodeError:
+        return None
+
+
+def _unpack_id(key, packed):
+    return _uninterned_id(key + packed.to_bytes(8, "big").decode("ascii"))
+
+
+class _PackedIdGroup(object):
+    # Packed Ids sharing one group key, in a sorted array, with a parallel array of values
+    # if used for a map. New entries are held in `pending` until there are enough of them
+    # to be worth merging into the arrays.
+    def __init__(self, has_values):
+        self.keys = array.array("q")
+        self.values = array.array("q") if has_values else None
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def find(self, packed):
+        # Returns the index of `packed` in the sorted array, or -1.
+        i = bisect.bisect_left(self.keys, packed)
+        return i if i < len(self.keys) and self.keys[i] == packed else -1
+
+    def get(self, packed):
+        # Returns the value stored for `packed` (True, in a set), or None.
+        value = self.pending.get(packed)
+        if value is None:
+            i = self.find(packed)
+            if i >= 0:
+                value = self.values[i] if self.values is not None else True
+
+        return value
+
+    def add(self, packed, value=True):
+        i = self.find(packed)
+        if i >= 0:
+            if self.values is not None:
+                self.values[i] = value
+            return
+
+        self.pending[packed] = value
+        if len(self.pending) >= max(
+            constants.PACKED_ID_MERGE_SIZE, len(self.keys) >> 3
+        ):
+            self.merge()
+
+    def remove(self, packed):
+        # Returns whether `packed` was present.
+        if self.pending.pop(packed, None) is not None:
+            return True
+
+        i = self.find(packed)
+        if i < 0:
+            return False
+
+        del self.keys[i]
+        if self.values is not None:
+            del self.values[i]
+        return True
+
+    def merge(self):
+        if not self.pending:
+            return
+
+        if self.values is None:
+            self.keys = array.array(
+                "q", sorted(itertools.chain(self.keys, self.pending))
+            )
+        else:
+            entries = sorted(
+                itertools.chain(zip(self.keys, self.values), self.pending.items())
+            )
+            self.keys = array.array("q", (k for k, v in entries))
+            self.values = array.array("q", (v for k, v in entries))
+        self.pending = {}
+
+    def sorted_keys(self):
+        # The sorted array of packed Ids, with any pending Ids merged in.
+        self.merge()
+        return self.keys
+
+    def packed_items(self):
+        if self.values is None:
+            return itertools.chain(((k, True) for k in self.keys), self.pending.items())
+
+        return itertools.chain(zip(self.keys, self.values), self.pending.items())
+
+    def copy(self):
+        group = _PackedIdGroup(self.values is not None)
+        group.keys = array.array("q", self.keys)
+        if self.values is not None:
+            group.values = array.array("q", self.values)
+        group.pending = dict(self.pending)
+
+        return group
+
+
+def _union_keys(first, second):
+    # Merge two sorted arrays of packed Ids. Sorting their concatenation finds
+    # the two sorted runs and merges them in linear time. Duplicates are then
+    # adjacent, so we keep each entry that differs from the one after it.
+    if not first:
+        return array.array("q", second)
+    if not second:
+        return array.array("q", first)
+
+    merged = sorted(first + second)
+    result = array.array(
+        "q",
+        itertools.compress(
+            merged, map(operator.ne, merged, itertools.islice(merged, 1, None))
+        ),
+    )
+    result.append(merged[-1])
+
+    return result
+
+
+def _intersect_keys(first, second):
+    return array.array("q", filter(set(second).__contains__, first))
+
+
+def _subtract_keys(first, second):
+    return array.array("q", itertools.filterfalse(set(second).__contains__, first))
+
+
+class IdSet(collections.abc.MutableSet):
+    # A set of Salesforce Ids, stored as packed integers in sorted arrays: 8 to 16 bytes
+    # per Id, rather than well over 100 for a set of SalesforceIds. Membership tests
+    # are roughly ten times slower than for a set.
+    # Set algebra with another IdSet works on the packed form.
+    def __init__(self, ids=()):
+        self.groups = {}
+        # Ids that can't be packed.
+        self.other = set()
+
+        for i in ids:
+            self.add(i)
+
+    def __contains__(self, id):
+        id = SalesforceId(id)
+        packed = _pack_id(id)
+        if packed is None:
+            return id in self.other
+
+        group = self.groups.get(packed[0])
+        return group is not None and group.get(packed[1]) is not None
+
+    def add(self, id):
+        id = SalesforceId(id)
+        packed = _pack_id(id)
+        if packed is None:
+            self.other.add(id)
+            return
+
+        group = self.groups.get(packed[0])
+        if group is None:
+            group = self.groups[packed[0]] = _PackedIdGroup(False)
+        group.add(packed[1])
+
+    def discard(self, id):
+        id = SalesforceId(id)
+        packed = _pack_id(id)
+        if packed is None:
+            self.other.discard(id)
+            return
+
+        group = self.groups.get(packed[0])
+        if group is not None and group.remove(packed[1]) and len(group) == 0:
+            del self.groups[packed[0]]
+
+    def __iter__(self):
+        for key, group in list(self.groups.items()):
+            for packed, _ in list(group.packed_items()):
+                yield _unpack_id(key, packed)
+
+        yield from list(self.other)
+
+    def __len__(self):
+        return sum(len(g) for g in self.groups.values()) + len(self.other)
+
+    def copy(self):
+        result = IdSet()
+        result.groups = {k: g.copy() for k, g in self.groups.items()}
+        result.other = set(self.other)
+
+        return result
+
+    def _combine(self, other, keep_keys, keep_other):
+        # Combine two IdSets group by group. `keep_keys(a, b)` combines the sorted arrays
+        # of packed Ids of one group key in each, and returns a sorted array; a group
+        # absent from either set is passed as empty. `keep_other` combines the sets
+        # of Ids that can't be packed.
+        if not isinstance(other, IdSet):
+            other = IdSet(other)
+
+        empty = array.array("q")
+        result = IdSet()
+        for key in self.groups.keys() | other.groups.keys():
+            mine = self.groups.get(key)
+            theirs = other.groups.get(key)
+            keys = keep_keys(
+                mine.sorted_keys() if mine else empty,
+                theirs.sorted_keys() if theirs else empty,
+            )
+            if keys:
+                group = result.groups[key] = _PackedIdGroup(False)
+                group.keys = keys
+
+        result.other = keep_other(self.other, other.other)
+        return result
+
+    def union(self, *others):
+        result = self
+        for other in others:
+            result = result._combine(other, _union_keys, set.union)
+
+        return result if result is not self else self.copy()
+
+    def intersection(self, *others):
+        result = self
+        for other in others:
+            result = result._combine(other, _intersect_keys, set.intersection)
+
+        return result if result is not self else self.copy()
+
+    def difference(self, *others):
+        result = self
+        for other in others:
+            result = result._combine(other, _subtract_keys, set.difference)
+
+        return result if result is not self else self.copy()
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __ior__(self, other):
+        if not isinstance(other, IdSet):
+            other = IdSet(other)
+
+        for key, theirs in other.groups.items():
+            mine = self.groups.get(key)
+            if mine is None:
+                self.groups[key] = theirs.copy()
+            else:
+                mine.keys = _union_keys(mine.sorted_keys(), theirs.sorted_keys())
+        self.other |= other.other
+
+        return self
+
+
+class CompactIdMap(collections.abc.MutableMapping):
+    # An Id map that stores Ids as packed integers in sorted arrays.
+    # The group keys of new Ids are stored once each, in `value_keys`.
+    # Like DiskIdMap, it may be read by one thread while another adds to it,
+    # so all access to its groups is under a lock.
+    def __init__(self):
+        self.groups = {}
+        self.value_keys = []
+        self.value_key_indexes = {}
+        # Entries that can't be packed.
+        self.other = {}
+        self.lock = threading.RLock()
+
+    def _pack_value(self, key, packed):
+        # Values are stored with seven bits per character, leaving the top seven bits
+        # of each array entry for the index of their group key in `value_keys`.
+        index = self.value_key_indexes.get(key)
+        if index is None:
+            if len(self.value_keys) >= 128:
+                return None
+            index = self.value_key_indexes[key] = len(self.value_keys)
+            self.value_keys.append(key)
+
+        for c in packed.to_bytes(8, "big"):
+            index = (index << 7) | c
+
+        return index
+
+    def _unpack_value(self, value):
+        return _uninterned_id(
+            self.value_keys[value >> 56]
+            + bytes((value >> shift) & 0x7F for shift in range(49, -1, -7)).decode(
+                "ascii"
+            )
+        )
+
+    def __getitem__(self, key):
+        key = SalesforceId(key)
+        packed = _pack_id(key)
+
+        with self.lock:
+            if packed is not None:
+                group = self.groups.get(packed[0])
+                value = group.get(packed[1]) if group is not None else None
+                if value is not None:
+                    return self._unpack_value(value)
+
+            return self.other[key]
+
+    def __setitem__(self, key, value):
+        key = SalesforceId(key)
+        value = SalesforceId(value)
+        packed = _pack_id(key)
+        packed_value = _pack_id(value)
+
+        with self.lock:
+            if packed_value is not None:
+                packed_value = self._pack_value(*packed_value)
+
+            if packed is None or packed_value is None:
+                self._remove_packed(key, packed)
+                self.other[key] = value
+                return
+
+            self.other.pop(key, None)
+            group = self.groups.get(packed[0])
+            if group is None:
+                group = self.groups[packed[0]] = _PackedIdGroup(True)
+            group.add(packed[1], packed_value)
+
+    def _remove_packed(self, key, packed):
+        if packed is None:
+            return False
+
+        group = self.groups.get(packed[0])
+        if group is None or not group.remove(packed[1]):
+            return False
+
+        if len(group) == 0:
+            del self.groups[packed[0]]
+        return True
+
+    def __delitem__(self, key):
+        key = SalesforceId(key)
+        with self.lock:
+            if not self._remove_packed(key, _pack_id(key)):
+                del self.other[key]
+
+    def __iter__(self):
+        return (k for k, v in self.items())
+
+    def items(self):
+        with self.lock:
+            groups = list(self.groups.items())
+        for key, group in groups:
+            with self.lock:
+                entries = list(group.packed_items())
+            for packed, value in entries:
+                yield _unpack_id(key, packed), self._unpack_value(value)
+
+        with self.lock:
+            other = list(self.other.items())
+        yield from other
+
+    def update_id_strings(self, pairs):
+        # Add pairs of 18-character Id strings that are already known to be valid.
+        # They're packed directly, without building a SalesforceId for each.
+        with self.lock:
+            for k, v in pairs:
+                try:
+                    packed = int.from_bytes(k[7:15].encode("ascii"), "big")
+                    packed_value = self._pack_value(
+                        v[:7], int.from_bytes(v[7:15].encode("ascii"), "big")
+                    )
+                except UnicodeEncodeError:
+                    packed_value = None
+
+                if packed_value is None:
+                    self[k] = v
+                    continue
+
+                if self.other:
+                    self.other.pop(k, None)
+                group = self.groups.get(k[:7])
+                if group is None:
+                    group = self.groups[k[:7]] = _PackedIdGroup(True)
+                group.add(packed, packed_value)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(g) for g in self.groups.values()) + len(self.other)
+
+
+def _open_temporary_database(filename, schema):
+    # Returns a temporary directory and a SQLite database within it, created with `schema`.
+    # The caller closes the database and cleans up the directory.
+    directory = tempfile.TemporaryDirectory(prefix="amaxa-")
+    db = sqlite3.connect(
+        os.path.join(directory.name, filename), check_same_thread=False
+    )
+    # This database is a cache that lives only as long as the operation.
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute(schema)
+
+    return directory, db
+
+
+class DiskIdMap(collections.abc.MutableMapping):
+    # An Id map backed by a SQLite database in a temporary directory.
+    # New entries are written in batches, and recently used entries are kept in an LRU cache.
+    def __init__(
+        self,
+        cache_size=constants.ID_MAP_CACHE_SIZE,
+        write_batch_size=constants.ID_MAP_WRITE_BATCH_SIZE,
+    ):
+        self.cache_size = cache_size
+        self.write_batch_size = write_batch_size
+        self.cache = collections.OrderedDict()
+        self.pending = {}
+        self.lock = threading.RLock()
+
+        self.directory, self.db = _open_temporary_database(
+            "id-map.db",
+            "CREATE TABLE id_map (old_id TEXT PRIMARY KEY, new_id TEXT) WITHOUT ROWID",
+        )
+
+    def _cache(self, key, value):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO id_map VALUES (?, ?)",
+                        self.pending.items(),
+                    )
+                self.pending = {}
+
+    def __getitem__(self, key):
+        key = str(SalesforceId(key))
+
+        with self.lock:
+            value = self.cache.get(key) or self.pending.get(key)
+            if value is None:
+                row = self.db.execute(
+                    "SELECT new_id FROM id_map WHERE old_id = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(key)
+                value = row[0]
+
+            self._cache(key, value)
+
+        return _uninterned_id(value)
+
+    def __setitem__(self, key, value):
+        key = str(SalesforceId(key))
+
+        with self.lock:
+            self.pending[key] = str(SalesforceId(value))
+            self._cache(key, self.pending[key])
+            if len(self.pending) >= self.write_batch_size:
+                self.flush()
+
+    def __delitem__(self, key):
+        key = str(SalesforceId(key))
+
+        with self.lock:
+            self.flush()
+            self.cache.pop(key, None)
+            if (
+                self.db.execute("DELETE FROM id_map WHERE old_id = ?", (key,)).rowcount
+                == 0
+            ):
+                raise KeyError(key)
+
+    def __iter__(self):
+        return (k for k, v in self.items())
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.db.execute("SELECT COUNT(*) FROM id_map").fetchone()[0]
+
+    def update_id_strings(self, pairs):
+        # Add pairs of 18-character Id strings that are already known to be valid.
+        with self.lock:
+            self.flush()
+            self.cache.clear()
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO id_map VALUES (?, ?)", pairs
+                )
+
+    def items(self):
+        # Another step may write to the database while we read, so, like CompactIdMap,
+        # we read a snapshot of the entries under the lock.
+        with self.lock:
+            self.flush()
+            rows = self.db.execute("SELECT old_id, new_id FROM id_map").fetchall()
+
+        for k, v in rows:
+            yield _uninterned_id(k), _uninterned_id(v)
+
+    def close(self):
+        self.db.close()
+        self.directory.cleanup()
+
+
+class DiskIdSetStore(object):
+    # Holds the Ids of a family of DiskIdSets, keeping at most `memory_limit` of them
+    # in memory. When there are more, the sets used least recently are spilled to
+    # a SQLite database in a temporary directory.
+    def __init__(self, memory_limit=constants.OPTION_DEFAULTS["id-set-memory-limit"]):
+        self.memory_limit = memory_limit
+        self.in_memory = 0
+        self.sets = collections.OrderedDict()
+        self.next_number = 0
+        # Sets that have been garbage collected, as (number, Ids in memory), whose rows
+        # are yet to be deleted. Collection can happen on any thread, so the deletion
+        # is left for the next use of the store.
+        self.released = collections.deque()
+
+        self.directory, self.db = _open_temporary_database(
+            "id-sets.db",
+            "CREATE TABLE ids (set_number INTEGER, id TEXT, "
+            "PRIMARY KEY (set_number, id)) WITHOUT ROWID",
+        )
+
+    def create(self, ids=()):
+        self.drop_released()
+
+        id_set = DiskIdSet(self, self.next_number)
+        self.sets[id_set.number] = weakref.ref(id_set)
+        # Sets that are only used for a while, such as the Ids for one lookup pass,
+        # give up their rows after they're garbage collected.
+        weakref.finalize(id_set, self.release, id_set.number, id_set.memory)
+        self.next_number += 1
+
+        id_set |= ids
+        return id_set
+
+    def touch(self, id_set):
+        self.sets.move_to_end(id_set.number)
+
+    def added(self, count):
+        self.in_memory += count
+        if self.in_memory > self.memory_limit:
+            self.drop_released()
+            self.spill()
+
+    def spill(self):
+        # Spill the least recently used sets until we're at half our limit,
+        # so that we don't spill again on the next Id added.
+        for number in list(self.sets):
+            if self.in_memory <= self.memory_limit // 2:
+                break
+
+            id_set = self.sets[number]()
+            if id_set is not None:
+                id_set.spill()
+
+    def release(self, number, memory):
+        self.released.append((number, memory))
+
+    def drop_released(self):
+        while self.released:
+            number, memory = self.released.popleft()
+            self.sets.pop(number, None)
+            self.in_memory -= len(memory)
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM ids WHERE set_number = ?", (number,))
+
     def close(self):
-        for f in self.store.values():
-            f.close()
+        self.released.clear()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        self.directory.cleanup()
+
+
+class DiskIdSet(collections.abc.MutableSet):
+    # A set of Salesforce Ids whose members may be spilled to disk by its DiskIdSetStore.
+    # Spilled Ids are read back a chunk at a time as the set is iterated, so Ids added
+    # while the set is iterated, as in a self-lookup pass, may or may not be included.
+    # Each Id is yielded once, even if the set is spilled during iteration.
+    def __init__(self, store, number):
+        self.store = store
+        self.number = number
+        self.memory = set()
+        self.spilled = 0
+
+    def _from_iterable(self, ids):
+        return self.store.create(ids)
+
+    def __contains__(self, id):
+        id = SalesforceId(id)
+        if id in self.memory:
+            return True
+
+        return (
+            self.spilled > 0
+            and self.store.db.execute(
+                "SELECT 1 FROM ids WHERE set_number = ? AND id = ?",
+                (self.number, str.__str__(id)),
+            ).fetchone()
+            is not None
+        )
+
+    def add(self, id):
+        id = SalesforceId(id)
+        if id not in self:
+            self.memory.add(id)
+            self.store.touch(self)
+            self.store.added(1)
+
+    def discard(self, id):
+        id = SalesforceId(id)
+        if id in self.memory:
+            self.memory.remove(id)
+            self.store.in_memory -= 1
+        elif self.spilled > 0:
+            with self.store.db:
+                self.spilled -= self.store.db.execute(
+                    "DELETE FROM ids WHERE set_number = ? AND id = ?",
+                    (self.number, str.__str__(id)),
+                ).rowcount
+
+    def __iter__(self):
+        # We iterate over a copy of our Ids in memory, so that Ids may be added meanwhile.
+        # So that the copy is no larger than a chunk of spilled Ids, we first spill
+        # a larger set of Ids to read back from disk. If the Ids we yield from memory
+        # are spilled while we iterate, we skip them when we read the spilled Ids.
+        if len(self.memory) > constants.ID_SET_READ_CHUNK_SIZE:
+            self.spill()
+        memory = set(self.memory)
+        yield from memory
+
+        last = ""
+        while self.spilled > 0:
+            rows = self.store.db.execute(
+                "SELECT id FROM ids WHERE set_number = ? AND id > ? ORDER BY id LIMIT ?",
+                (self.number, last, constants.ID_SET_READ_CHUNK_SIZE),
+            ).fetchall()
+            if not rows:
+                return
+
+            for (id,) in rows:
+                id = _uninterned_id(id)
+                if id not in memory:
+                    yield id
+            last = rows[-1][0]
+
+    def __len__(self):
+        return len(self.memory) + self.spilled
+
+    def __ior__(self, other):
+        if isinstance(other, DiskIdSet) and other.store is self.store:
+            # Copy the other set's spilled Ids without reading them into memory.
+            # We spill our own Ids first, so that those among the copied Ids
+            # are counted once.
+            if other.spilled > 0:
+                self.spill()
+                with self.store.db:
+                    self.store.db.execute(
+                        "INSERT OR IGNORE INTO ids "
+                        "SELECT ?, id FROM ids WHERE set_number = ?",
+                        (self.number, other.number),
+                    )
+                self.spilled = self.store.db.execute(
+                    "SELECT COUNT(*) FROM ids WHERE set_number = ?", (self.number,)
+                ).fetchone()[0]
+            other = list(other.memory)
+
+        for id in other:
+            self.add(id)
+
+        return self
+
+    def copy(self):
+        return self.store.create(self)
+
+    def intersection(self, other):
+        return self & other
+
+    def spill(self):
+        if self.memory:
+            with self.store.db:
+                self.store.db.executemany(
+                    "INSERT OR IGNORE INTO ids VALUES (?, ?)",
+                    ((self.number, str.__str__(id)) for id in self.memory),
+                )
+            self.spilled += len(self.memory)
+            self.store.in_memory -= len(self.memory)
+            self.memory.clear()
+
+
+class LookupValueStore(object):
+    # Spills the Ids and values of a set of lookup fields to a temporary file,
+    # for records that have a value in at least one of them.
+    def __init__(self, fields):
+        self.fields = sorted(fields)
+        self.file = tempfile.TemporaryFile("w+", newline="")
+        self.writer = csv.writer(self.file)
+
+    def add(self, record):
+        values = [record.get(f) or "" for f in self.fields]
+        if any(values):
+            self.writer.writerow([record["Id"]] + values)
+
+    def records(self):
+        self.file.flush()
+        self.file.seek(0)
+        for row in csv.reader(self.file):
+            yield dict(zip(["Id"] + self.fields, row))
+
+    def close(self):
+        self.file.close()
 
 
 class Operation(metaclass=abc.ABCMeta):
+    # Whether the temporary storage of a failed run is kept open, for its caller to save
+    # state from. The caller must then close() the operation.
+    keeps_storage_on_failure = False
+
     def __init__(self, connection):
         self.steps = []
         self.connection = connection
@@ -122,14 +1088,28 @@ class Operation(metaclass=abc.ABCMeta):
         self.file_store = FileStore()
 
     def run(self):
+        result = -1
         try:
             self.initialize()
-            return self.execute()
+            result = self.execute()
         except Exception as e:
             self.logger.error("Unexpected exception {} occurred.".format(str(e)))
-            return -1
         finally:
-            self.file_store.close()
+            # Buffered output is written when the files are closed.
+            try:
+                self.file_store.close()
+            except Exception as e:
+                self.logger.error("Unable to write output files ({}).".format(e))
+                result = -1
+
+            if result == 0 or not self.keeps_storage_on_failure:
+                self.close()
+
+        return result
+
+    def close(self):
+        # Release temporary storage, such as on-disk Id maps and sets.
+        pass
 
     def initialize(self):
         for s in self.steps:
@@ -237,24 +1217,55 @@ class Step(metaclass=abc.ABCMeta):
 
 
 class LoadOperation(Operation):
-    def __init__(self, connection):
+    # A state file is saved from the Id map of a failed load.
+    keeps_storage_on_failure = True
+
+    def __init__(self, connection, id_map_type=IdMapType.MEMORY):
         super().__init__(connection)
         self.mappers = {}
-        self.global_id_map = {}
+        self.global_id_map = {
+            IdMapType.MEMORY: dict,
+            IdMapType.COMPACT: CompactIdMap,
+            IdMapType.DISK: DiskIdMap,
+        }[id_map_type]()
         self.success = True
+        self.failed_sobjects = set()
         self.stage = LoadStage.INSERTS
+        self.state_format = StateFormat.TEXT
+        self.max_concurrent_steps = constants.OPTION_DEFAULTS["max-concurrent-steps"]
+        # Results and errors may be registered from the threads of a pipelined load.
+        self.results_lock = threading.Lock()
+        # If set, a StateJournal to which new Ids and stage changes are recorded.
+        self.journal = None
+        # Bulk API batches of inserts posted by a prior run whose results may not have been read,
+        # by sObject, as (job Id, batch Id, original Ids of the batch's records) tuples.
+        self.posted_batches = {}
+
+    def close(self):
+        if isinstance(self.global_id_map, DiskIdMap):
+            self.global_id_map.close()
 
     def register_new_id(self, sobjectname, old_id, new_id):
-        self.global_id_map[old_id] = new_id
-        self.file_store.get_csv(sobjectname, FileType.RESULT).writerow(
-            {constants.ORIGINAL_ID: str(old_id), constants.NEW_ID: str(new_id)}
-        )
+        with self.results_lock:
+            self.global_id_map[old_id] = new_id
+            if self.journal is not None:
+                self.journal.add_id(old_id, new_id)
+            self.file_store.get_csv(sobjectname, FileType.RESULT).writerow(
+                {constants.ORIGINAL_ID: str(old_id), constants.NEW_ID: str(new_id)}
+            )
+
+    def register_posted_batch(self, sobjectname, job, batch, old_ids):
+        with self.results_lock:
+            if self.journal is not None:
+                self.journal.add_batch(sobjectname, job, batch, old_ids)
 
     def register_error(self, sobjectname, old_id, error):
-        self.file_store.get_csv(sobjectname, FileType.RESULT).writerow(
-            {constants.ORIGINAL_ID: str(old_id), constants.ERROR: error}
-        )
-        self.success = False
+        with self.results_lock:
+            self.file_store.get_csv(sobjectname, FileType.RESULT).writerow(
+                {constants.ORIGINAL_ID: str(old_id), constants.ERROR: error}
+            )
+            self.success = False
+            self.failed_sobjects.add(sobjectname)
 
     def get_new_id(self, old_id):
         return self.global_id_map.get(old_id, None)
@@ -264,35 +1275,117 @@ class LoadOperation(Operation):
             "Starting load with sObjects %s", ", ".join(self.get_sobject_list())
         )
         if self.stage is LoadStage.INSERTS:
+            # Collect the results of any batches a prior run posted,
+            # so that we don't insert their records again.
             for s in self.steps:
-                self.logger.info("%s: starting load", s.sobjectname)
-                s.execute()
+                s.reattach_posted_batches()
 
-                # After each step, check whether errors happened and stop the process.
-                if not self.success:
-                    self.logger.error(
-                        "%s: errors took place during load. See results file for details.",
-                        s.sobjectname,
-                    )
-                    return -1
+            if not self.success:
+                self.logger.error(
+                    "Unable to read the results of Bulk API batches posted by a prior run. "
+                    "See results file for details."
+                )
+                return -1
+
+            if not self.run_steps(
+                lambda s: s.execute(),
+                "%s: starting load",
+                "%s: errors took place during load. See results file for details.",
+                ordered=True,
+            ):
+                return -1
 
             self.stage = LoadStage.DEPENDENTS
+            if self.journal is not None:
+                self.journal.set_stage(self.stage)
 
         if self.stage is LoadStage.DEPENDENTS:
+            if not self.run_steps(
+                lambda s: s.execute_dependent_updates(),
+                "%s: populating dependent and self-lookups",
+                "%s: errors took place during dependent updates. See results file for details.",
+            ):
+                return -1
+
+        return 0
+
+    def run_steps(self, action, start_message, error_message, ordered=False):
+        if self.max_concurrent_steps <= 1:
             for s in self.steps:
-                self.logger.info(
-                    "%s: populating dependent and self-lookups", s.sobjectname
-                )
-                s.execute_dependent_updates()
+                self.logger.info(start_message, s.sobjectname)
+                action(s)
 
+                # After each step, check whether errors happened and stop the process.
                 if not self.success:
-                    self.logger.error(
-                        "%s: errors took place during dependent updates. See results file for details.",
-                        s.sobjectname,
-                    )
-                    return -1
+                    self.logger.error(error_message, s.sobjectname)
+                    return False
 
-        return 0
+            return True
+
+        # Run each step, if `ordered`, once all of the steps it depends upon are complete,
+        # with up to max_concurrent_steps running at a time.
+        # Once any step has errors, we start no further steps, but allow
+        # those already running to complete.
+        if ordered:
+            dependencies = self.get_step_dependencies()
+        else:
+            dependencies = {s: set() for s in self.steps}
+        pending = list(self.steps)
+        complete = set()
+        running = {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_concurrent_steps
+        ) as executor:
+            while pending or running:
+                if self.success:
+                    for s in [s for s in pending if dependencies[s] <= complete]:
+                        if len(running) >= self.max_concurrent_steps:
+                            break
+
+                        pending.remove(s)
+                        self.logger.info(start_message, s.sobjectname)
+                        running[executor.submit(action, s)] = s
+
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    s = running.pop(future)
+                    future.result()
+
+                    if s.sobjectname in self.failed_sobjects:
+                        self.logger.error(error_message, s.sobjectname)
+                    else:
+                        complete.add(s)
+
+        return self.success
+
+    def get_step_dependencies(self):
+        # Map each step to the set of earlier steps whose inserts it must wait for:
+        # those whose sObjects it looks up to on insert (descendent lookups).
+        # Dependent lookups are populated only once every insert is complete,
+        # so they don't order the steps. Steps that share no such lookups
+        # may insert concurrently.
+        steps_by_sobject = {s.sobjectname: s for s in self.steps}
+        order = {s: i for i, s in enumerate(self.steps)}
+
+        dependencies = {}
+        for s in self.steps:
+            field_map = self.get_field_map(s.sobjectname)
+            dependencies[s] = {
+                steps_by_sobject[refTo]
+                for f in s.descendent_lookups
+                for refTo in field_map[f]["referenceTo"]
+                if refTo in steps_by_sobject and refTo != s.sobjectname
+                # Preserve the operation's order between related steps.
+                and order[steps_by_sobject[refTo]] < order[s]
+            }
+
+        return dependencies
 
 
 class LoadStep(Step):
@@ -307,11 +1400,18 @@ class LoadStep(Step):
         self.field_scope = field_scope
         self.outside_lookup_behavior = outside_lookup_behavior
         self.lookup_behaviors = {}
-        self.dependent_lookup_records = []
+        self.dependent_lookup_store = None
+        self.record_preparers = {}
         self.options = options or {}
 
         self.context = None
 
+    def initialize(self):
+        super().initialize()
+
+        # Record preparers are compiled on first use, from the lookups found here.
+        self.record_preparers = {}
+
     def set_lookup_behavior_for_field(self, field, behavior):
         self.lookup_behaviors[field] = behavior
 
@@ -319,24 +1419,34 @@ class LoadStep(Step):
         return self.lookup_behaviors.get(field, self.outside_lookup_behavior)
 
     def get_value_for_lookup(self, lookup, value, record_id):
-        if value == "":
-            return ""
+        return self.get_lookup_remapper(lookup)(value, record_id)
 
+    def get_lookup_remapper(self, lookup):
+        # Returns a function mapping a value of the lookup field `lookup` to its new Id,
+        # applying the field's outside lookup behavior.
         b = self.get_lookup_behavior_for_field(lookup)
+        get_new_id = self.context.get_new_id
+        sobjectname = self.sobjectname
 
-        mapped_id = self.context.get_new_id(SalesforceId(value))
+        def remap(value, record_id):
+            if value == "":
+                return ""
 
-        if mapped_id is not None:
-            return str(mapped_id)
-        elif b is OutsideLookupBehavior.INCLUDE:
-            return value
-        elif b is OutsideLookupBehavior.ERROR:
-            raise AmaxaException(
-                f"{self.sobjectname} {record_id} has an outside reference in field {lookup} ({value}), "
-                "which is not allowed by the extraction configuration.",
-            )
-        elif b is OutsideLookupBehavior.DROP_FIELD:
-            return ""
+            mapped_id = get_new_id(SalesforceId(value))
+
+            if mapped_id is not None:
+                return str(mapped_id)
+            elif b is OutsideLookupBehavior.INCLUDE:
+                return value
+            elif b is OutsideLookupBehavior.ERROR:
+                raise AmaxaException(
+                    f"{sobjectname} {record_id} has an outside reference in field {lookup} ({value}), "
+                    "which is not allowed by the extraction configuration.",
+                )
+            elif b is OutsideLookupBehavior.DROP_FIELD:
+                return ""
+
+        return remap
 
     def populate_lookups(self, record, lookups, id):
         return {
@@ -346,33 +1456,109 @@ class LoadStep(Step):
             for k in record
         }
 
-    def primitivize(self, record):
+    def get_value_converter(self, field_type):
+        # Returns a function converting an input value for a field of SOAP type `field_type`.
         # We're using the Bulk API over JSON, so values can be specified as strings (not converted to JSON primitives)
         # We will apply a light transformation to ensure we format correctly and respect a few Boolean equivalents
-        def convert_value(value, field_type):
-            if field_type == "xsd:boolean":
-                if value is None or value.lower() in ["no", "false", "n", "f", "0", ""]:
+        if field_type == "xsd:boolean":
+
+            def convert(value):
+                if value is None or value.lower() in constants.FALSE_VALUES:
                     return "false"
-                elif value.lower() in ["yes", "true", "y", "t", "1"]:
+                elif value.lower() in constants.TRUE_VALUES:
                     return "true"
                 raise ValueError(f"Invalid Boolean value {value}")
-            elif value is None or len(value) == 0:
+
+        elif field_type == "tns:ID":
+
+            def convert(value):
+                return None if value is None or len(value) == 0 else str(value)
+
+        elif field_type in [
+            "xsd:string",
+            "xsd:date",
+            "xsd:dateTime",
+            "xsd:int",
+            "xsd:double",
+        ]:
+
+            def convert(value):
+                return None if value is None or len(value) == 0 else value
+
+        else:
+
+            def convert(value):
                 return None
-            elif field_type == "tns:ID":
-                return str(value)
-            elif field_type in [
-                "xsd:string",
-                "xsd:date",
-                "xsd:dateTime",
-                "xsd:int",
-                "xsd:double",
-            ]:
-                return value
 
-            return None
+        return convert
+
+    def primitivize(self, record):
+        field_map = self.context.get_field_map(self.sobjectname)
+        return {
+            k: self.get_value_converter(field_map[k]["soapType"])(record[k])
+            for k in record
+        }
 
+    def get_record_preparer(self, populated_self_lookups=frozenset()):
+        # Returns a function that turns an input record into a record ready for the Bulk API,
+        # doing the work of transform_record(), clean_dependent_lookups(), populate_lookups(),
+        # and primitivize() in one pass. The field projection, value converters, and lookup
+        # remapping are worked out once per step (and per set of self-lookups to populate).
+        if populated_self_lookups not in self.record_preparers:
+            self.record_preparers[
+                populated_self_lookups
+            ] = self.compile_record_preparer(populated_self_lookups)
+
+        return self.record_preparers[populated_self_lookups]
+
+    def compile_record_preparer(self, populated_self_lookups):
         field_map = self.context.get_field_map(self.sobjectname)
-        return {k: convert_value(record[k], field_map[k]["soapType"]) for k in record}
+        lookups = self.descendent_lookups | populated_self_lookups
+        cleaned = (self.dependent_lookups | self.self_lookups) - populated_self_lookups
+
+        converters = []
+        remappers = []
+        for f in self.field_scope:
+            if f in cleaned:
+                continue
+
+            convert = self.get_value_converter(field_map[f]["soapType"])
+            if f in lookups:
+                remappers.append((f, self.get_lookup_remapper(f), convert))
+            else:
+                converters.append((f, convert))
+
+        mapper = self.context.mappers.get(self.sobjectname)
+        transform = mapper.transform_record if mapper is not None else None
+
+        def prepare(record, record_id):
+            if transform is not None:
+                record = transform(record)
+
+            out = {f: convert(record[f]) for f, convert in converters if f in record}
+            for f, remap, convert in remappers:
+                if f in record:
+                    out[f] = convert(remap(record[f], record_id))
+
+            return out
+
+        return prepare
+
+    def keep_input_column(self, column):
+        # We read only the Id and the input columns that map to fields in our scope,
+        # which are all that record preparation uses.
+        mapper = self.context.mappers.get(self.sobjectname)
+
+        return (
+            column == "Id"
+            or (mapper.transform_key(column) if mapper is not None else column)
+            in self.field_scope
+        )
+
+    def read_input(self):
+        return self.context.file_store.get_csv(
+            self.sobjectname, FileType.INPUT
+        ).records(self.keep_input_column)
 
     def transform_record(self, record):
         if self.sobjectname in self.context.mappers:
@@ -394,123 +1580,516 @@ class LoadStep(Step):
         # Read our incoming file.
         # Apply transformations specified in our configuration file (column name -> field name, for example)
         # Then, populate all direct lookups. Dependent lookups and self-lookups will be populated in a later pass.
-        records_to_load = []
-        original_ids = []
-        success = True
+        # Records are prepared lazily as the Bulk API consumes them, so memory use
+        # does not grow with the size of the input file.
 
-        reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
-        for record in reader:
-            # We might have resumed this operation. Check to be sure this record hasn't been loaded already.
-            if self.context.get_new_id(SalesforceId(record["Id"])) is not None:
-                continue
+        # While we read the input, we keep the values of dependent and self-lookups
+        # so that execute_dependent_updates() need not re-read the whole file.
+        all_lookups = self.dependent_lookups | self.self_lookups
+        if len(all_lookups) > 0:
+            self.dependent_lookup_store = LookupValueStore(all_lookups)
 
-            # We need to save off the original record Id because it'll be cleaned from the record before insert.
-            # We use the original Id for error reporting.
-            original_ids.append(record["Id"])
+        reader = self.read_input()
 
-            # Then, prep this record for the Bulk API, populate its lookups, apply transforms, and clean dependent lookups
-            try:
-                record = self.primitivize(
-                    self.populate_lookups(
-                        self.clean_dependent_lookups(self.transform_record(record)),
-                        self.descendent_lookups,
-                        original_ids[-1],
-                    )
+        if self.get_option("insert-self-lookups-by-level") and self.self_lookups:
+            self.insert_by_level(list(reader))
+            return
+
+        records = self.prepare_input(reader)
+
+        # Optionally place all children of the same parent next to one another,
+        # so that they land in the same batch and concurrent batches don't contend
+        # for locks on the same parent records. This requires holding all records in memory.
+        parent_lookup = self.get_parent_lookup_for_grouping()
+        if parent_lookup is not None:
+            records = sorted(records, key=lambda r: r[1].get(parent_lookup) or "")
+        else:
+            # Otherwise, prepare records in the background while earlier batches upload.
+            records = self.pipeline(records)
+
+        self.insert_records(records)
+
+    def insert_records(self, records):
+        for original_id, r in self.perform_bulk_operation(
+            self.context.connection.bulk_api_insert, records, track_batches=True
+        ):
+            if r.success:
+                self.context.register_new_id(
+                    self.sobjectname,
+                    SalesforceId(original_id),
+                    SalesforceId(r.id),  # note lowercase in result
                 )
-                records_to_load.append(record)
-            except AmaxaException as e:
-                self.context.register_error(self.sobjectname, original_ids[-1], str(e))
-                success = False
-            except ValueError as e:
+            else:
                 self.context.register_error(
-                    self.sobjectname,
-                    original_ids[-1],
-                    f"Bad data in record {original_ids[-1]}: {str(e)}",
+                    self.sobjectname, original_id, self.format_error(r.error)
                 )
-                success = False
 
-        if not success or len(records_to_load) == 0:
-            return
+    def reattach_posted_batches(self):
+        # Read the results of Bulk API batches that a prior run posted but may not have finished
+        # reading, and register the records they created. Records of batches that failed, or
+        # that never reached Salesforce, are not in the Id map and so are loaded as usual.
+        # Records of batches whose results can't be read may already have been loaded,
+        # so rather than load them again, we register them as errors.
+        for job, batch, original_ids in self.context.posted_batches.pop(
+            self.sobjectname, []
+        ):
+            if all(SalesforceId(i) in self.context.global_id_map for i in original_ids):
+                continue
 
-        for i, r in enumerate(
-            self.context.connection.bulk_api_insert(
-                self.sobjectname,
-                records_to_load,
+            results = self.context.connection.get_bulk_api_batch_results(
+                job,
+                batch,
                 self.get_option("bulk-api-timeout"),
                 self.get_option("bulk-api-poll-interval"),
-                self.get_option("bulk-api-batch-size"),
-                self.get_option("bulk-api-mode"),
             )
-        ):
-            if r.success:
-                self.context.register_new_id(
+            if results is None:
+                self.context.logger.info(
+                    "%s: Bulk API batch %s posted by a prior run failed; its records will be loaded again",
+                    self.sobjectname,
+                    batch,
+                )
+                continue
+
+            if isinstance(results, str):
+                for original_id in original_ids:
+                    if SalesforceId(original_id) not in self.context.global_id_map:
+                        self.context.register_error(
+                            self.sobjectname,
+                            original_id,
+                            "{}. This record may or may not have been loaded by a prior run.".format(
+                                results
+                            ),
+                        )
+                continue
+
+            recovered = 0
+            for original_id, r in zip(original_ids, results):
+                original_id = SalesforceId(original_id)
+                if r.success and original_id not in self.context.global_id_map:
+                    self.context.register_new_id(
+                        self.sobjectname, original_id, SalesforceId(r.id)
+                    )
+                    recovered += 1
+
+            self.context.logger.info(
+                "%s: recovered %d record%s from Bulk API batch %s posted by a prior run",
+                self.sobjectname,
+                recovered,
+                "s" if recovered != 1 else "",
+                batch,
+            )
+
+    def insert_by_level(self, records):
+        # Insert records in order of the self-lookup hierarchy: first those that have no parent
+        # in our input, then their children, and so on, one Bulk API job per level.
+        # Each record's self-lookups can then be populated on insert. Only self-lookups
+        # between records in a cycle are left for execute_dependent_updates().
+        levels, deferred = self.get_self_lookup_levels(records)
+
+        def without_populated_lookups(record):
+            return {
+                k: record[k]
+                if k not in self.self_lookups
+                or (SalesforceId(record["Id"]), k) in deferred
+                else ""
+                for k in record
+            }
+
+        if self.dependent_lookup_store is not None:
+            for record in records:
+                self.dependent_lookup_store.add(without_populated_lookups(record))
+
+        for level in levels:
+            self.insert_records(self.pipeline(self.prepare_records(level, deferred)))
+
+            # Children of records that failed would not be able to populate their lookups.
+            if self.sobjectname in self.context.failed_sobjects:
+                return
+
+    def get_self_lookup_levels(self, records):
+        # Returns the records grouped into levels of the self-lookup hierarchy,
+        # along with the set of (Id, field) self-lookup references that form cycles
+        # and so cannot be populated on insert.
+        ids = {SalesforceId(r["Id"]): i for i, r in enumerate(records)}
+
+        def get_references(record):
+            references = []
+            for f in sorted(self.self_lookups):
+                if record.get(f):
+                    try:
+                        parent = SalesforceId(record[f])
+                    except ValueError:
+                        # Leave this record at the top level. It's reported as bad data
+                        # when it's prepared for insert.
+                        return []
+                    if parent in ids:
+                        references.append((f, ids[parent]))
+
+            return references
+
+        references = [get_references(r) for r in records]
+        components = _strongly_connected_components(
+            [[j for f, j in refs] for refs in references]
+        )
+
+        deferred = {
+            (SalesforceId(records[i]["Id"]), f)
+            for i, refs in enumerate(references)
+            for f, j in refs
+            if components[i] == components[j]
+        }
+
+        # Components are numbered such that each one follows all of the components it references.
+        component_levels = {}
+        for i in sorted(range(len(records)), key=lambda i: components[i]):
+            component_levels[components[i]] = max(
+                [component_levels.get(components[i], 0)]
+                + [
+                    component_levels[components[j]] + 1
+                    for f, j in references[i]
+                    if components[i] != components[j]
+                ]
+            )
+
+        levels = [[] for _ in range(max(component_levels.values(), default=-1) + 1)]
+        for i, r in enumerate(records):
+            levels[component_levels[components[i]]].append(r)
+
+        return levels, deferred
+
+    def prepare_input(self, reader):
+        # Yields (original Id, record) pairs for our input, like prepare_records().
+        # With `preparation-processes` above 1, we prepare byte ranges of the input
+        # in worker processes when we can. Workers are forked, so that they share
+        # a read-only snapshot of the Id map and of this step.
+        processes = self.get_option("preparation-processes")
+        if processes > 1:
+            ranges = self.context.file_store.get_csv(
+                self.sobjectname, FileType.INPUT
+            ).byte_ranges(constants.PREPARATION_RANGE_SIZE)
+
+            if ranges is None:
+                self.context.logger.info(
+                    "%s: preparing records in one process, because the input can't be split.",
+                    self.sobjectname,
+                )
+            elif isinstance(self.context.global_id_map, DiskIdMap):
+                self.context.logger.info(
+                    "%s: preparing records in one process, because the Id map is on disk.",
+                    self.sobjectname,
+                )
+            elif "fork" not in multiprocessing.get_all_start_methods():
+                self.context.logger.info(
+                    "%s: preparing records in one process, because this platform can't fork.",
                     self.sobjectname,
-                    SalesforceId(original_ids[i]),
-                    SalesforceId(r.id),  # note lowercase in result
                 )
             else:
-                self.context.register_error(
-                    self.sobjectname, original_ids[i], self.format_error(r.error)
+                return self.prepare_ranges_in_processes(
+                    ranges, processes, self.start_preparation_pool(processes)
                 )
 
+        return self.prepare_records(self.capture_dependent_lookups(reader))
+
+    def start_preparation_pool(self, processes):
+        # Forks the worker processes now, on the step's own thread, before the pipeline
+        # thread that consumes our records starts. Other threads may still be running,
+        # such as those of concurrent steps and buffered output files. Workers use only
+        # the input file, this step's compiled record preparer and the Id map, so the
+        # only state that another thread might be changing as we fork is the Id map.
+        # We hold its lock while forking, so each worker's copy is consistent, and each
+        # worker replaces the lock with its own in _start_preparation_worker().
+        self.get_record_preparer()
+
+        lock = getattr(self.context.global_id_map, "lock", None)
+        if lock is not None:
+            lock.acquire()
+        try:
+            # Unlike a ProcessPoolExecutor, a Pool starts all of its workers here.
+            return multiprocessing.get_context("fork").Pool(
+                processes, _start_preparation_worker, (self,)
+            )
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def prepare_ranges_in_processes(self, ranges, processes, pool):
+        source = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
+        # Files whose remaining ranges we read sequentially in this process.
+        sequential_paths = set()
+        ranges = (r for r in ranges if r[0] not in sequential_paths)
+
+        try:
+            # Results are consumed in order, with a few ranges queued for each worker.
+            # Ranges without an end aren't sent to workers.
+            in_flight = collections.deque()
+            while True:
+                for r in itertools.islice(ranges, processes * 2 - len(in_flight)):
+                    in_flight.append(
+                        (
+                            r,
+                            pool.apply_async(_prepare_input_range, r)
+                            if r[2] is not None
+                            else None,
+                        )
+                    )
+                if not in_flight:
+                    break
+
+                (path, start, end), pending = in_flight.popleft()
+                result = pending.get() if pending is not None else None
+                if result is None:
+                    # The file can't be split, at least from this range on. Earlier ranges
+                    # of the file were valid, so this range begins a record.
+                    self.context.logger.info(
+                        "%s: reading %s sequentially, because its quoting isn't strict CSV.",
+                        self.sobjectname,
+                        path,
+                    )
+                    sequential_paths.add(path)
+                    in_flight = collections.deque(
+                        f for f in in_flight if f[0][0] != path
+                    )
+                    yield from self.prepare_records(
+                        self.capture_dependent_lookups(
+                            source.read_range(path, start, None, self.keep_input_column)
+                        )
+                    )
+                    continue
+
+                captured, results = result
+                if self.dependent_lookup_store is not None:
+                    for record in captured:
+                        self.dependent_lookup_store.add(record)
+
+                for original_id, record, error in results:
+                    if error is not None:
+                        self.context.register_error(
+                            self.sobjectname, original_id, error
+                        )
+                    else:
+                        yield original_id, record
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def capture_dependent_lookups(self, records):
+        for record in records:
+            if self.dependent_lookup_store is not None:
+                self.dependent_lookup_store.add(record)
+
+            yield record
+
+    def prepare_records(self, records, deferred=None):
+        # Yields (original Id, record) pairs ready for the Bulk API.
+        # Records that cannot be prepared are registered as errors and skipped.
+        for original_id, record, error in self.try_prepare_records(records, deferred):
+            if error is not None:
+                self.context.register_error(self.sobjectname, original_id, error)
+            else:
+                yield original_id, record
+
+    def try_prepare_records(self, records, deferred=None):
+        # Yields (original Id, record, error) for each record that hasn't been loaded already:
+        # either a record ready for the Bulk API or an error message.
+        # If `deferred` is supplied, self-lookups not listed in it are populated
+        # along with descendent lookups, rather than cleaned for a later update.
+        for record in records:
+            # We might have resumed this operation. Check to be sure this record hasn't been loaded already.
+            if self.context.get_new_id(SalesforceId(record["Id"])) is not None:
+                continue
+
+            # We need to save off the original record Id because it'll be cleaned from the record before insert.
+            # We use the original Id for error reporting.
+            original_id = record["Id"]
+
+            # Then, prep this record for the Bulk API, populate its lookups, apply transforms, and clean dependent lookups
+            try:
+                if deferred is None:
+                    prepare = self.get_record_preparer()
+                else:
+                    prepare = self.get_record_preparer(
+                        frozenset(
+                            f
+                            for f in self.self_lookups
+                            if (SalesforceId(original_id), f) not in deferred
+                        )
+                    )
+
+                yield original_id, prepare(record, original_id), None
+            except AmaxaException as e:
+                yield original_id, None, str(e)
+            except ValueError as e:
+                yield original_id, None, f"Bad data in record {original_id}: {str(e)}"
+
+    def get_parent_lookup_for_grouping(self):
+        # The `bulk-api-group-by-parent` option is either the name of a lookup field
+        # or True, in which case we pick the main parent lookup among our descendent lookups:
+        # required lookups (such as master-detail relationships) first, then by name.
+        option = self.get_option("bulk-api-group-by-parent")
+
+        if not option:
+            return None
+        if isinstance(option, str):
+            return option
+
+        field_map = self.context.get_field_map(self.sobjectname)
+        candidates = sorted(
+            self.descendent_lookups, key=lambda f: (field_map[f]["nillable"], f)
+        )
+
+        return candidates[0] if candidates else None
+
     def execute_dependent_updates(self):
         # Populate dependent and self-lookups in a single pass
-        records_to_load = []
-        original_ids = []
         all_lookups = self.dependent_lookups | self.self_lookups
-        success = True
 
         if len(all_lookups) > 0:
-            # Re-check, for each record, whether we have any loading to do.
-            # If all of the dependent lookups prove to be dropped outside references,
-            # we have no work to do.
-            self.reset_input_csv()
-            reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
-            for record in reader:
-                try:
-                    cleaned_record = self.populate_lookups(
-                        self.extract_dependent_lookups(record),
-                        all_lookups,
-                        record["Id"],
+            # If we inserted this sObject's records in this run, we captured
+            # the lookup values we need. If we've resumed in the dependents stage,
+            # we have to read them from the input again.
+            if self.dependent_lookup_store is not None:
+                records = self.dependent_lookup_store.records()
+            else:
+                records = self.read_input()
+
+            for original_id, r in self.perform_bulk_operation(
+                self.context.connection.bulk_api_update,
+                self.pipeline(self.prepare_dependent_updates(all_lookups, records)),
+            ):
+                if not r.success:
+                    self.context.register_error(
+                        self.sobjectname,
+                        original_id,
+                        self.format_error(r.error),
                     )
-                    if (
-                        len(
-                            list(
-                                filter(
-                                    lambda r: r is not None and r != "",
-                                    cleaned_record.values(),
-                                )
+
+            if self.dependent_lookup_store is not None:
+                self.dependent_lookup_store.close()
+                self.dependent_lookup_store = None
+
+    def prepare_dependent_updates(self, all_lookups, records):
+        # Yields (original Id, record) pairs for records that have dependent lookups to populate.
+        # Re-check, for each record, whether we have any loading to do.
+        # If all of the dependent lookups prove to be dropped outside references,
+        # we have no work to do.
+        for record in records:
+            try:
+                cleaned_record = self.populate_lookups(
+                    self.extract_dependent_lookups(record),
+                    all_lookups,
+                    record["Id"],
+                )
+                if (
+                    len(
+                        list(
+                            filter(
+                                lambda r: r is not None and r != "",
+                                cleaned_record.values(),
                             )
                         )
-                        > 1
-                    ):  # 1 for the Id
-                        # Populate the new Id for this record
-                        original_ids.append(cleaned_record["Id"])
-                        cleaned_record["Id"] = str(
-                            self.context.get_new_id(SalesforceId(cleaned_record["Id"]))
-                        )
-                        records_to_load.append(cleaned_record)
-                except AmaxaException as e:
-                    self.context.register_error(self.sobjectname, record["Id"], str(e))
-                    success = False
-
-            if success and len(records_to_load) > 0:
-                for i, r in enumerate(
-                    self.context.connection.bulk_api_update(
+                    )
+                    > 1
+                ):  # 1 for the Id
+                    # Populate the new Id for this record
+                    original_id = cleaned_record["Id"]
+                    cleaned_record["Id"] = str(
+                        self.context.get_new_id(SalesforceId(original_id))
+                    )
+                    yield original_id, cleaned_record
+            except AmaxaException as e:
+                self.context.register_error(self.sobjectname, record["Id"], str(e))
+
+    def pipeline(self, records):
+        return ThreadedIterator(
+            records, constants.PIPELINE_QUEUE_SIZE, constants.PIPELINE_CHUNK_SIZE
+        )
+
+    def perform_bulk_operation(self, bulk_api_call, records, track_batches=False):
+        # Run the Bulk API job over an iterable of (original Id, record) pairs,
+        # yielding each record's original Id alongside its result.
+        # The records are consumed lazily; we retain only those whose batches
+        # are still in flight, so that results can be matched up to them in order.
+        # Records that fail only due to lock contention (UNABLE_TO_LOCK_ROW) are
+        # collected and resubmitted in a follow-up Serial-mode job, up to
+        # `bulk-api-retry-attempts` times. Only failures that survive the retries
+        # are yielded as errors.
+        # With `track_batches`, each batch is recorded to the operation's journal
+        # as it is posted, so that a resumed load can collect its results.
+        attempts = self.get_option("bulk-api-retry-attempts")
+        mode = self.get_option("bulk-api-mode")
+
+        records = iter(records)
+        while True:
+            # Don't start a Bulk API job if there are no records to load.
+            first = next(records, None)
+            if first is None:
+                return
+
+            in_flight = collections.deque()
+            retry_records = []
+            # Original Ids of in-flight records, by the identity of the record.
+            original_ids = {}
+            kwargs = {}
+
+            def submit(records):
+                for original_id, record in records:
+                    in_flight.append((original_id, record))
+                    original_ids[id(record)] = original_id
+                    yield record
+
+            if track_batches and self.context.journal is not None:
+
+                def batch_posted(job, batch, record_batch):
+                    self.context.register_posted_batch(
                         self.sobjectname,
-                        records_to_load,
-                        self.get_option("bulk-api-timeout"),
-                        self.get_option("bulk-api-poll-interval"),
-                        self.get_option("bulk-api-batch-size"),
-                        self.get_option("bulk-api-mode"),
+                        job,
+                        batch,
+                        [original_ids[id(record)] for record in record_batch],
                     )
-                ):
-                    if not r.success:
-                        self.context.register_error(
-                            self.sobjectname,
-                            original_ids[i],
-                            self.format_error(r.error),
-                        )
+
+                kwargs["batch_posted"] = batch_posted
+
+            for r in bulk_api_call(
+                self.sobjectname,
+                submit(itertools.chain([first], records)),
+                self.get_option("bulk-api-timeout"),
+                self.get_option("bulk-api-poll-interval"),
+                self.get_bulk_api_batch_size(),
+                mode,
+                **kwargs,
+            ):
+                original_id, record = in_flight.popleft()
+                original_ids.pop(id(record), None)
+                if attempts > 0 and not r.success and self.is_retryable_error(r.error):
+                    retry_records.append((original_id, record))
+                else:
+                    yield original_id, r
+
+            if not retry_records:
+                return
+
+            attempts -= 1
+            self.context.logger.info(
+                "%s: retrying %d record%s that failed due to lock contention in Serial mode",
+                self.sobjectname,
+                len(retry_records),
+                "s" if len(retry_records) != 1 else "",
+            )
+            records = iter(retry_records)
+            mode = "Serial"
+
+    def get_bulk_api_batch_size(self):
+        # Adopt a smaller batch size if the connection had to split batches
+        # that failed on Salesforce limits earlier in this step.
+        batch_size = self.get_option("bulk-api-batch-size")
+        limit = self.context.connection.get_bulk_api_batch_size_limit(self.sobjectname)
+
+        return min(batch_size, limit) if limit is not None else batch_size
+
+    def is_retryable_error(self, error):
+        return len(error) > 0 and all(
+            e["statusCode"] in constants.RETRYABLE_STATUS_CODES for e in error
+        )
 
     def format_error(self, error):
         return "\n".join(
@@ -527,48 +2106,124 @@ class LoadStep(Step):
             ]
         )
 
-    def reset_input_csv(self):
-        fh = self.context.file_store.get_file(self.sobjectname, FileType.INPUT)
-        fh.seek(0)
-        self.context.file_store.set_csv(
-            self.sobjectname, FileType.INPUT, csv.DictReader(fh)
+
+# In a worker process started by LoadStep.start_preparation_pool(), the step whose
+# records it prepares.
+_preparing_step = None
+
+
+def _start_preparation_worker(step):
+    global _preparing_step
+
+    _preparing_step = step
+    # The parent held this lock as it forked. It belongs to the parent's thread.
+    if hasattr(step.context.global_id_map, "lock"):
+        step.context.global_id_map.lock = threading.RLock()
+
+
+def _prepare_input_range(path, start, end):
+    # Runs in a worker process. Returns the lookup values to capture from a byte range
+    # of the step's input, and the results of try_prepare_records() for its records,
+    # or None if the range can't be read on its own.
+    step = _preparing_step
+    try:
+        records = list(
+            step.context.file_store.get_csv(
+                step.sobjectname, FileType.INPUT
+            ).read_range(path, start, end, step.keep_input_column)
         )
+    except formats.UnsplittableRangeException:
+        return None
+    captured = []
+    if step.dependent_lookup_store is not None:
+        fields = ["Id"] + step.dependent_lookup_store.fields
+        captured = [
+            {f: r.get(f) for f in fields}
+            for r in records
+            if any(r.get(f) for f in fields[1:])
+        ]
+
+    return captured, list(step.try_prepare_records(records))
 
 
 class ExtractOperation(Operation):
-    def __init__(self, connection):
+    def __init__(
+        self,
+        connection,
+        id_set_type=IdSetType.MEMORY,
+        id_set_memory_limit=constants.OPTION_DEFAULTS["id-set-memory-limit"],
+    ):
         super().__init__(connection)
+        self.id_set_store = None
+        if id_set_type is IdSetType.DISK:
+            self.id_set_store = DiskIdSetStore(id_set_memory_limit)
+            self.create_id_set = self.id_set_store.create
+        else:
+            self.create_id_set = {IdSetType.MEMORY: set, IdSetType.COMPACT: IdSet}[
+                id_set_type
+            ]
         self.required_ids = {}
         self.extracted_ids = {}
         self.mappers = {}
+        self.max_concurrent_steps = constants.OPTION_DEFAULTS["max-concurrent-steps"]
+
+    def close(self):
+        if self.id_set_store is not None:
+            self.id_set_store.close()
 
     def execute(self):
         self.logger.info(
             "Starting extraction with sObjects %s", self.get_sobject_list()
         )
-        for s in self.steps:
-            self.logger.info("%s: starting extraction", s.sobjectname)
-            s.execute()
-            if len(s.errors) > 0:
-                self.logger.error(
-                    "%s: errors took place during extraction:\n%s",
-                    s.sobjectname,
-                    "\n".join(s.errors),
-                )
-                return -1
-            else:
-                self.logger.info(
-                    "%s: extracted %d record%s",
-                    s.sobjectname,
-                    len(self.get_extracted_ids(s.sobjectname)),
-                    "s" if len(self.get_extracted_ids(s.sobjectname)) != 1 else "",
-                )
+
+        # Bulk API queries for ALL_RECORDS and QUERY steps don't depend on the results
+        # of earlier steps, so we can start up to max_concurrent_steps of them ahead of time.
+        # Results are still processed in order, because they register dependencies
+        # and cross-hierarchy references against earlier steps.
+        to_start = collections.deque(
+            s
+            for s in self.steps
+            if self.max_concurrent_steps > 1 and s.get_bulk_api_query() is not None
+        )
+        started = collections.deque()
+
+        try:
+            for s in self.steps:
+                while to_start and len(started) < self.max_concurrent_steps:
+                    step = to_start.popleft()
+                    step.start_bulk_api_query()
+                    started.append(step)
+
+                self.logger.info("%s: starting extraction", s.sobjectname)
+                s.execute()
+                if started and started[0] is s:
+                    started.popleft()
+
+                if len(s.errors) > 0:
+                    self.logger.error(
+                        "%s: errors took place during extraction:\n%s",
+                        s.sobjectname,
+                        "\n".join(s.errors),
+                    )
+                    return -1
+                else:
+                    self.logger.info(
+                        "%s: extracted %d record%s",
+                        s.sobjectname,
+                        len(self.get_extracted_ids(s.sobjectname)),
+                        "s" if len(self.get_extracted_ids(s.sobjectname)) != 1 else "",
+                    )
+        finally:
+            # If we stopped early, abort the queries whose results we won't process,
+            # including that of a step that raised an exception, so their jobs don't keep running.
+            for step in started:
+                step.abort_bulk_api_query()
 
         return 0
 
     def add_dependency(self, sobjectname, id):
         if sobjectname not in self.required_ids:
-            self.required_ids[sobjectname] = set()
+            self.required_ids[sobjectname] = self.create_id_set()
         if id not in self.get_extracted_ids(sobjectname):
             self.required_ids[sobjectname].add(id)
 
@@ -580,7 +2235,7 @@ class ExtractOperation(Operation):
         )
 
     def get_sobject_ids_for_reference(self, sobjectname, field):
-        ids = set()
+        ids = self.create_id_set()
         for name in self.get_field_map(sobjectname)[field]["referenceTo"]:
             # For each sObject that we've extracted data for,
             # if that object is a potential reference target for this field,
@@ -598,25 +2253,21 @@ class ExtractOperation(Operation):
         )
 
     def store_result(self, sobjectname, record):
-        if sobjectname not in self.extracted_ids:
-            self.extracted_ids[sobjectname] = set()
+        record_id = SalesforceId(record["Id"])
+        extracted_ids = self.extracted_ids.get(sobjectname)
+        if extracted_ids is None:
+            extracted_ids = self.extracted_ids[sobjectname] = self.create_id_set()
 
-        if SalesforceId(record["Id"]) not in self.extracted_ids[sobjectname]:
-            self.logger.debug(
-                "%s: extracting record %s", sobjectname, SalesforceId(record["Id"])
-            )
-            self.extracted_ids[sobjectname].add(SalesforceId(record["Id"]))
+        if record_id not in extracted_ids:
+            extracted_ids.add(record_id)
             self.file_store.get_csv(sobjectname, FileType.OUTPUT).writerow(
                 self.mappers[sobjectname].transform_record(record)
                 if sobjectname in self.mappers
                 else record
             )
 
-        if (
-            sobjectname in self.required_ids
-            and SalesforceId(record["Id"]) in self.required_ids[sobjectname]
-        ):
-            self.required_ids[sobjectname].remove(SalesforceId(record["Id"]))
+        if sobjectname in self.required_ids:
+            self.required_ids[sobjectname].discard(record_id)
 
 
 class ExtractionStep(Step):
@@ -638,6 +2289,14 @@ class ExtractionStep(Step):
         self.lookup_behaviors = {}
         self.errors = []
         self.options = options or {}
+        self.bulk_api_query_batch = None
+        self.result_processor = None
+
+    def initialize(self):
+        super().initialize()
+
+        # The result processor is compiled on first use, from the lookups found here.
+        self.result_processor = None
 
     def set_lookup_behavior_for_field(self, f, behavior):
         self.lookup_behaviors[f] = behavior
@@ -657,7 +2316,7 @@ class ExtractionStep(Step):
         # perform a query to extract those records by Id.
 
         if self.scope == ExtractionScope.ALL_RECORDS:
-            query = "SELECT {} FROM {}".format(self.get_field_list(), self.sobjectname)
+            query = self.get_bulk_api_query()
 
             self.context.logger.debug(
                 "%s: extracting all records using Bulk API query %s",
@@ -667,9 +2326,7 @@ class ExtractionStep(Step):
             self.perform_bulk_api_pass(query)
             return
         elif self.scope == ExtractionScope.QUERY:
-            query = "SELECT {} FROM {} WHERE {}".format(
-                self.get_field_list(), self.sobjectname, self.where_clause
-            )
+            query = self.get_bulk_api_query()
 
             self.context.logger.debug(
                 "%s: extracting filtered records using Bulk API query %s",
@@ -727,80 +2384,111 @@ class ExtractionStep(Step):
 
     def store_result(self, result):
         # Examine the received data to determine whether we have any cross-hierarchy lookups
-        # or down-hierarchy dependencies to register
+        # or down-hierarchy dependencies to register, then store it.
+        if self.result_processor is None:
+            self.result_processor = self.compile_result_processor()
 
+        self.result_processor(result)
+
+    def compile_result_processor(self):
+        # Returns a function that does the work of store_result() for one record.
+        # Lookup targets, lookup behaviors, and the positions of sObjects in the operation
+        # are worked out once per step, rather than for each record.
         field_map = self.context.get_field_map(self.sobjectname)
         sobject_list = self.context.get_sobject_list()
+        context = self.context
+        sobjectname = self.sobjectname
 
-        # Add a dependency for the reference in each self lookup of this record.
-        for lookup in self.self_lookups:
-            if (
-                self.get_self_lookup_behavior_for_field(lookup)
-                is not SelfLookupBehavior.TRACE_NONE
-                and result[lookup] is not None
-            ):
-                self.context.add_dependency(
-                    self.sobjectname, SalesforceId(result[lookup])
-                )
+        # sObject names by Id key prefix, for polymorphic lookups.
+        sobjects_by_prefix = {}
 
-        # Register any dependencies from dependent lookups
-        # Note that a dependent lookup can *also* be a descendent lookup (e.g. Task.WhatId),
-        # so we handle polymorphic lookups carefully
-        for f in self.dependent_lookups:
-            lookup_value = result[f]
-            if lookup_value is not None:
-                # Determine what sObject this Id looks up to
-                # If this is a regular lookup, it's the target of the field, and is always dependent.
-                # If this lookup is polymorphic, we have to determine it based on the Id itself,
-                # and this value may actually be a cross-hierarchy reference or descendent reference.
-                if len(field_map[f]["referenceTo"]) > 1:
-                    target_sobject = self.context.get_sobject_name_for_id(lookup_value)
-
-                    if target_sobject not in sobject_list:
-                        continue  # Ignore references to objects not in our extraction.
-
-                    # Determine if this is really a dependent connection, or if it's a descendent
-                    # that should be handled below.
-                    # The descendent code looks for cross-hierarchy references
-                    if sobject_list.index(target_sobject) < sobject_list.index(
-                        self.sobjectname
-                    ):
-                        continue
-
-                    # Otherwise, fall through to add a dependency
-                else:
-                    target_sobject = field_map[f]["referenceTo"][0]
+        def get_sobject_name_for_id(value):
+            prefix = value[:3]
+            if prefix not in sobjects_by_prefix:
+                sobjects_by_prefix[prefix] = context.get_sobject_name_for_id(value)
+
+            return sobjects_by_prefix[prefix]
 
-                self.context.add_dependency(target_sobject, SalesforceId(lookup_value))
+        self_lookups = [
+            f
+            for f in self.self_lookups
+            if self.get_self_lookup_behavior_for_field(f)
+            is not SelfLookupBehavior.TRACE_NONE
+        ]
 
-        # Check for cross-hierarchy lookup values:
-        # references to records above us in the extraction hierarchy, but that weren't extracted already.
-        for f in self.descendent_lookups:
-            lookup_value = result[f]
+        # Note that a dependent lookup can *also* be a descendent lookup (e.g. Task.WhatId).
+        # If a lookup is polymorphic, its target is determined from each Id: only references
+        # to this sObject or those after it in the operation are dependent. References
+        # earlier in the operation are descendent references, handled below.
+        later_sobjects = set(sobject_list[sobject_list.index(sobjectname) :])
+        dependent_lookups = [
+            (
+                f,
+                field_map[f]["referenceTo"][0]
+                if len(field_map[f]["referenceTo"]) == 1
+                else None,
+            )
+            for f in self.dependent_lookups
+        ]
 
-            if lookup_value is not None:
-                if len(field_map[f]["referenceTo"]) == 1:
-                    target_sobject = field_map[f]["referenceTo"][0]
-                else:
-                    target_sobject = self.context.get_sobject_name_for_id(lookup_value)
+        # Cross-hierarchy references need checking only for lookups
+        # whose outside lookup behavior does something with them.
+        descendent_lookups = [
+            (
+                f,
+                field_map[f]["referenceTo"][0]
+                if len(field_map[f]["referenceTo"]) == 1
+                else None,
+                self.get_outside_lookup_behavior_for_field(f),
+            )
+            for f in self.descendent_lookups
+            if self.get_outside_lookup_behavior_for_field(f)
+            is not OutsideLookupBehavior.INCLUDE
+        ]
 
-                if lookup_value not in self.context.get_extracted_ids(target_sobject):
-                    # This is a cross-hierarchy reference
-                    behavior = self.get_outside_lookup_behavior_for_field(f)
+        def process(result):
+            # Add a dependency for the reference in each self lookup of this record.
+            for f in self_lookups:
+                if result[f] is not None:
+                    context.add_dependency(sobjectname, SalesforceId(result[f]))
+
+            # Register any dependencies from dependent lookups
+            for f, target_sobject in dependent_lookups:
+                lookup_value = result[f]
+                if lookup_value is not None:
+                    if target_sobject is None:
+                        polymorphic_target = get_sobject_name_for_id(lookup_value)
+                        if polymorphic_target in later_sobjects:
+                            context.add_dependency(
+                                polymorphic_target, SalesforceId(lookup_value)
+                            )
+                    else:
+                        context.add_dependency(
+                            target_sobject, SalesforceId(lookup_value)
+                        )
 
+            # Check for cross-hierarchy lookup values:
+            # references to records above us in the extraction hierarchy, but that weren't extracted already.
+            for f, target_sobject, behavior in descendent_lookups:
+                lookup_value = result[f]
+                if lookup_value is not None and SalesforceId(lookup_value) not in (
+                    context.get_extracted_ids(
+                        target_sobject or get_sobject_name_for_id(lookup_value)
+                    )
+                ):
                     if behavior is OutsideLookupBehavior.DROP_FIELD:
                         del result[f]
-                    elif behavior is OutsideLookupBehavior.INCLUDE:
-                        continue
                     elif behavior is OutsideLookupBehavior.ERROR:
                         self.errors.append(
                             "{} {} has an outside reference in field {} ({}), which is not allowed by the extraction configuration.".format(
-                                self.sobjectname, result["Id"], f, result[f]
+                                sobjectname, result["Id"], f, result[f]
                             )
                         )
 
-        # Finally, call through to the context to store this result.
-        self.context.store_result(self.sobjectname, result)
+            # Finally, call through to the context to store this result.
+            context.store_result(sobjectname, result)
+
+        return process
 
     def resolve_registered_dependencies(self):
         pre_deps = self.context.get_dependencies(self.sobjectname).copy()
@@ -817,6 +2505,26 @@ class ExtractionStep(Step):
                 )
             )
 
+    def get_bulk_api_query(self):
+        # Steps with ALL_RECORDS and QUERY scope extract records with a single Bulk API query.
+        if self.scope == ExtractionScope.ALL_RECORDS:
+            return "SELECT {} FROM {}".format(self.get_field_list(), self.sobjectname)
+        elif self.scope == ExtractionScope.QUERY:
+            return "SELECT {} FROM {} WHERE {}".format(
+                self.get_field_list(), self.sobjectname, self.where_clause
+            )
+
+    def start_bulk_api_query(self):
+        self.context.logger.debug("%s: starting Bulk API query", self.sobjectname)
+        self.bulk_api_query_batch = self.context.connection.start_bulk_api_query(
+            self.sobjectname, self.get_bulk_api_query()
+        )
+
+    def abort_bulk_api_query(self):
+        self.context.logger.debug("%s: aborting Bulk API query", self.sobjectname)
+        self.context.connection.abort_bulk_api_query(self.bulk_api_query_batch)
+        self.bulk_api_query_batch = None
+
     def perform_bulk_api_pass(self, query):
         # The JSON Bulk API returns DateTime values as epoch seconds, instead of ISO 8601-format strings.
         # If we have DateTime fields in our field set, postprocess the result before we store it.
@@ -826,12 +2534,22 @@ class ExtractionStep(Step):
             if self.context.get_field_map(self.sobjectname)[f]["type"] == "datetime"
         ]
 
-        for result in self.context.connection.bulk_api_query(
-            self.sobjectname,
-            query,
-            date_time_fields,
-            self.get_option("bulk-api-poll-interval"),
-        ):
+        # Use the results of our query if the operation started it ahead of time.
+        if self.bulk_api_query_batch is not None:
+            results = self.context.connection.get_bulk_api_query_results(
+                self.bulk_api_query_batch,
+                date_time_fields,
+                self.get_option("bulk-api-poll-interval"),
+            )
+        else:
+            results = self.context.connection.bulk_api_query(
+                self.sobjectname,
+                query,
+                date_time_fields,
+                self.get_option("bulk-api-poll-interval"),
+            )
+
+        for result in results:
             self.store_result(result)
 
     def perform_lookup_pass(self, field):
@@ -844,18 +2562,69 @@ class ExtractionStep(Step):
                 self.store_result(rec)
 
 
+def _compose_transforms(transforms):
+    # Returns a single callable that applies each of `transforms` in turn.
+    if len(transforms) == 1:
+        return transforms[0]
+
+    def apply_transforms(value):
+        for transform in transforms:
+            value = transform(value)
+
+        return value
+
+    return apply_transforms
+
+
 class DataMapper(object):
     def __init__(self, field_name_mapping=None, field_transforms=None):
         self.field_name_mapping = field_name_mapping or {}
         self.field_transforms = field_transforms or {}
+        # Record transformers are compiled on first use, for each distinct set of keys.
+        # The mapping and transforms must not change once records have been transformed.
+        self.record_transformers = {}
 
     def transform_record(self, record):
-        return {
-            self.transform_key(k): self.transform_value(k, record[k]) for k in record
-        }
+        keys = tuple(record)
+        transform = self.record_transformers.get(keys)
+        if transform is None:
+            transform = self.record_transformers[
+                keys
+            ] = self.compile_record_transformer(keys)
+
+        return transform(record)
+
+    def compile_record_transformer(self, keys):
+        # Returns a function that transforms records with `keys` (in that order).
+        # Renamed keys are worked out here, and each field's transforms are composed
+        # into one callable. Untransformed values are copied as they are.
+        new_keys = [self.transform_key(k) for k in keys]
+        transforms = [
+            (i, _compose_transforms(self.field_transforms[k]))
+            for i, k in enumerate(keys)
+            if self.field_transforms.get(k)
+        ]
+
+        if not transforms:
+            if new_keys == list(keys):
+                return dict
+
+            return lambda record: dict(zip(new_keys, record.values()))
+
+        def transform_record(record):
+            values = list(record.values())
+            for i, transform in transforms:
+                values[i] = transform(values[i])
+
+            return dict(zip(new_keys, values))
+
+        return transform_record
 
     def transform_key(self, k):
         return self.field_name_mapping.get(k, k)
 
     def transform_value(self, k, v):
-        return functools.reduce(lambda x, f: f(x), self.field_transforms.get(k, []), v)
+        for transform in self.field_transforms.get(k, []):
+            v = transform(v)
+
+        return v
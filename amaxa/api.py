@@ -1,10 +1,17 @@
+import collections
 import itertools
 import json
+import logging
+import queue
+import threading
 from datetime import datetime, timedelta
 from time import sleep
 from urllib.parse import urlparse
 
 import salesforce_bulk
+from salesforce_bulk.salesforce_bulk import BulkBatchFailed
+
+from . import constants
 
 
 def JSONIterator(records):
@@ -21,6 +28,16 @@ def JSONIterator(records):
     yield b"]"
 
 
+def _is_limit_message(message):
+    message = (message or "").lower()
+
+    return any(m in message for m in constants.BATCH_LIMIT_MESSAGES)
+
+
+def _is_limit_error(error):
+    return len(error) > 0 and all(_is_limit_message(e.get("message")) for e in error)
+
+
 def BatchIterator(iterator, n=10000):
     while True:
         batch = list(itertools.islice(iterator, n))
@@ -30,6 +47,50 @@ def BatchIterator(iterator, n=10000):
         yield batch
 
 
+def ThreadedIterator(iterator, max_queued, chunk_size=1):
+    # Consume `iterator` in a background thread, passing its items across a bounded queue
+    # in chunks of up to `chunk_size`. The thread runs at most `max_queued` chunks ahead
+    # of the consumer. Exceptions raised by `iterator` are re-raised to the consumer.
+    q = queue.Queue(maxsize=max_queued)
+    done = object()
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def produce():
+        try:
+            for chunk in BatchIterator(iter(iterator), n=chunk_size):
+                if not put(chunk):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            chunk = q.get()
+            if chunk is done:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+
+            yield from chunk
+    finally:
+        # If our consumer stops early, let the producer thread exit.
+        stopped.set()
+
+
 class Connection(object):
     def __init__(self, sf, api_version):
         self._sf = sf
@@ -41,6 +102,7 @@ class Connection(object):
         self._describe_info = {}
         self._field_maps = {}
         self._key_prefix_map = None
+        self._batch_size_limits = {}
 
     def get_global_describe(self):
         return self._sf.describe()
@@ -69,6 +131,11 @@ class Connection(object):
 
         return self._key_prefix_map[id[:3]]
 
+    def get_bulk_api_batch_size_limit(self, sobject):
+        # If batches for this sObject had to be split to stay within Salesforce limits,
+        # this is the batch size that finally succeeded.
+        return self._batch_size_limits.get(sobject)
+
     def _bulk_api_insert_update(
         self,
         job,
@@ -77,25 +144,173 @@ class Connection(object):
         bulk_api_timeout,
         bulk_api_poll_interval,
         bulk_api_batch_size,
+        batch_posted=None,
     ):
-        batches = []
-        for record_batch in BatchIterator(iter(record_list), n=bulk_api_batch_size):
-            json_iter = JSONIterator(record_batch)
-            batches.append(self._bulk.post_batch(job, json_iter))
+        # Records are consumed lazily. At most MAX_BULK_API_BATCHES_IN_FLIGHT batches
+        # (and their records) are held at a time; once that many are posted, we wait
+        # for the oldest and yield its results before posting more.
+        # The job stays open until all batches are complete, so that batches split
+        # due to Salesforce limits can be resubmitted to it.
+        batches = collections.deque()
+
+        def get_results(record_batch, batch):
+            return self._get_batch_results(
+                job,
+                sobject,
+                record_batch,
+                batch,
+                bulk_api_timeout,
+                bulk_api_poll_interval,
+                batch_posted=batch_posted,
+            )
+
+        def post(record_batch, data):
+            batch = self._bulk.post_batch(job, data)
+            if batch_posted is not None:
+                batch_posted(job, batch, record_batch)
+
+            return record_batch, batch
 
-        for batch in batches:
+        def get_batch_size():
+            # Once batches have had to be split, later batches use the size that succeeded.
+            limit = self._batch_size_limits.get(sobject)
+            return (
+                min(bulk_api_batch_size, limit)
+                if limit is not None
+                else bulk_api_batch_size
+            )
+
+        def cut_batches(records):
+            while True:
+                record_batch = list(itertools.islice(records, get_batch_size()))
+                if not record_batch:
+                    return
+
+                yield record_batch
+
+        # Batches are serialized in a background thread while we upload and wait on earlier batches.
+        serialized_batches = ThreadedIterator(
+            (
+                (record_batch, b"".join(JSONIterator(record_batch)))
+                for record_batch in cut_batches(iter(record_list))
+            ),
+            constants.PIPELINE_QUEUE_SIZE,
+        )
+        for record_batch, data in serialized_batches:
+            batch_size = get_batch_size()
+            if len(record_batch) > batch_size:
+                # This batch was cut before we learned a smaller batch size.
+                parts = [
+                    (part, b"".join(JSONIterator(part)))
+                    for part in BatchIterator(iter(record_batch), n=batch_size)
+                ]
+            else:
+                parts = [(record_batch, data)]
+
+            for part, part_data in parts:
+                batches.append(post(part, part_data))
+
+                if len(batches) >= constants.MAX_BULK_API_BATCHES_IN_FLIGHT:
+                    yield from get_results(*batches.popleft())
+
+        while batches:
+            yield from get_results(*batches.popleft())
+
+        self._bulk.close_job(job)
+
+    def _get_batch_results(
+        self,
+        job,
+        sobject,
+        record_batch,
+        batch,
+        bulk_api_timeout,
+        bulk_api_poll_interval,
+        split=False,
+        batch_posted=None,
+    ):
+        # Wait for the batch and return its results. If the whole batch failed on Apex CPU
+        # or processing time limits, split its records in half, resubmit both halves to the
+        # (still open) job, and recurse until they succeed or reach the minimum batch size.
+        state_message = None
+        try:
             self._bulk.wait_for_batch(
                 job,
                 batch,
                 timeout=bulk_api_timeout,
                 sleep_interval=bulk_api_poll_interval,
             )
+            results = self._bulk.get_batch_results(batch, job)
+            failed = len(results) > 0 and all(
+                not r.success and _is_limit_error(r.error) for r in results
+            )
+        except BulkBatchFailed as e:
+            if not _is_limit_message(e.state_message):
+                raise
 
-        self._bulk.close_job(job)
+            results = None
+            failed = True
+            state_message = e.state_message
 
-        for batch in batches:
-            for r in self._bulk.get_batch_results(batch, job):
-                yield r
+        if not failed:
+            if split and len(record_batch) < self._batch_size_limits.get(
+                sobject, len(record_batch) + 1
+            ):
+                self._batch_size_limits[sobject] = len(record_batch)
+                logging.getLogger("amaxa").info(
+                    "%s: resubmitted batch of %d records succeeded. "
+                    "Using this batch size for the rest of the step.",
+                    sobject,
+                    len(record_batch),
+                )
+            return results
+
+        if len(record_batch) <= constants.MIN_BULK_API_BATCH_SIZE:
+            if results is None:
+                error = [
+                    {
+                        "statusCode": "BATCH_FAILED",
+                        "message": state_message,
+                        "fields": [],
+                    }
+                ]
+                results = [
+                    salesforce_bulk.UploadResult(None, False, False, error)
+                    for _ in record_batch
+                ]
+
+            return results
+
+        half = (len(record_batch) + 1) // 2
+        logging.getLogger("amaxa").warning(
+            "%s: batch of %d records failed due to Salesforce limits. "
+            "Resubmitting as batches of %d records.",
+            sobject,
+            len(record_batch),
+            half,
+        )
+
+        halves = [record_batch[:half], record_batch[half:]]
+        posted = []
+        for h in halves:
+            posted.append((h, self._bulk.post_batch(job, b"".join(JSONIterator(h)))))
+            if batch_posted is not None:
+                batch_posted(job, posted[-1][1], h)
+
+        return [
+            r
+            for h, b in posted
+            for r in self._get_batch_results(
+                job,
+                sobject,
+                h,
+                b,
+                bulk_api_timeout,
+                bulk_api_poll_interval,
+                True,
+                batch_posted,
+            )
+        ]
 
     def bulk_api_insert(
         self,
@@ -105,6 +320,7 @@ class Connection(object):
         bulk_api_poll_interval,
         bulk_api_batch_size,
         bulk_api_mode,
+        batch_posted=None,
     ):
         yield from self._bulk_api_insert_update(
             self._bulk.create_insert_job(
@@ -115,6 +331,7 @@ class Connection(object):
             bulk_api_timeout,
             bulk_api_poll_interval,
             bulk_api_batch_size,
+            batch_posted,
         )
 
     def bulk_api_update(
@@ -125,6 +342,7 @@ class Connection(object):
         bulk_api_poll_interval,
         bulk_api_batch_size,
         bulk_api_mode,
+        batch_posted=None,
     ):
         yield from self._bulk_api_insert_update(
             self._bulk.create_update_job(
@@ -135,13 +353,68 @@ class Connection(object):
             bulk_api_timeout,
             bulk_api_poll_interval,
             bulk_api_batch_size,
+            batch_posted,
         )
 
+    def get_bulk_api_batch_results(
+        self, job, batch, bulk_api_timeout, bulk_api_poll_interval
+    ):
+        # Wait for a batch posted earlier, perhaps by another process, and return its results.
+        # Returns None if the batch failed as a whole, in which case none of its records were loaded.
+        # If the batch's results can't be read, because it has expired, is unknown to the org
+        # or didn't finish in time, some of its records may have been loaded. In that case,
+        # we return a message describing the error.
+        try:
+            self._bulk.wait_for_batch(
+                job,
+                batch,
+                timeout=bulk_api_timeout,
+                sleep_interval=bulk_api_poll_interval,
+            )
+            if self._bulk.is_batch_done(batch, job):
+                return self._bulk.get_batch_results(batch, job)
+
+            error = "Timed out waiting for Bulk API batch {}".format(batch)
+        except BulkBatchFailed:
+            return None
+        except salesforce_bulk.BulkApiError as e:
+            error = "Unable to read the results of Bulk API batch {}: {}".format(
+                batch, e
+            )
+
+        logging.getLogger("amaxa").warning(error)
+        return error
+
     def bulk_api_query(self, sobject, query, date_time_fields, bulk_api_poll_interval):
+        yield from self.get_bulk_api_query_results(
+            self.start_bulk_api_query(sobject, query),
+            date_time_fields,
+            bulk_api_poll_interval,
+        )
+
+    def start_bulk_api_query(self, sobject, query):
+        # Start a Bulk API query job and return its batch, whose results may be
+        # collected later with get_bulk_api_query_results().
         job = self._bulk.create_query_job(sobject, contentType="JSON")
         batch = self._bulk.query(job, query)
         self._bulk.close_job(job)
 
+        return batch
+
+    def abort_bulk_api_query(self, batch):
+        # Abort the job of a query started with start_bulk_api_query() whose results
+        # we no longer need. A job that has already finished can't be aborted; we just log that.
+        job = self._bulk.lookup_job_id(batch)
+        try:
+            self._bulk.abort_job(job)
+        except salesforce_bulk.BulkApiError as e:
+            logging.getLogger("amaxa").warning(
+                "Unable to abort Bulk API query job %s: %s", job, e
+            )
+
+    def get_bulk_api_query_results(
+        self, batch, date_time_fields, bulk_api_poll_interval
+    ):
         while not self._bulk.is_batch_done(batch):
             sleep(bulk_api_poll_interval)
 
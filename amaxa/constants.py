@@ -1,10 +1,78 @@
 ORIGINAL_ID = "Original Id"
 NEW_ID = "New Id"
 ERROR = "Error"
+
+# Input values accepted for Boolean fields.
+TRUE_VALUES = frozenset(["yes", "true", "y", "t", "1"])
+FALSE_VALUES = frozenset(["no", "false", "n", "f", "0", ""])
+
 OPTION_DEFAULTS = {
     "bulk-api-poll-interval": 5,
     "bulk-api-timeout": 1200,
     "bulk-api-batch-size": 10000,
     "bulk-api-mode": "Parallel",
+    "bulk-api-retry-attempts": 0,
+    "bulk-api-group-by-parent": False,
+    "insert-self-lookups-by-level": False,
+    "preparation-processes": 1,
     "api-version": "52.0",
+    "max-concurrent-steps": 1,
+    "order-steps": False,
+    "id-map": "memory",
+    "id-set": "memory",
+    "id-set-memory-limit": 10000000,
+    "state-format": "text",
 }
+RETRYABLE_STATUS_CODES = ["UNABLE_TO_LOCK_ROW"]
+# Batches that fail because they hit Salesforce processing limits are split in half and
+# resubmitted. The Bulk API processes batches in transactions of 200 records, so smaller
+# batches would not reduce the work done in each transaction.
+BATCH_LIMIT_MESSAGES = ["cpu time", "timed out", "timeout", "processing time"]
+MIN_BULK_API_BATCH_SIZE = 200
+
+# Bulk API insert and update jobs stream their records: only this many batches
+# are held in memory and in flight at a time.
+MAX_BULK_API_BATCHES_IN_FLIGHT = 10
+
+# Loads are pipelined: records are prepared, and batches serialized, in background
+# threads while earlier batches upload. Each stage runs at most this many chunks ahead
+# of the next; records pass between stages in chunks of PIPELINE_CHUNK_SIZE.
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_CHUNK_SIZE = 200
+
+# When planning the order of load steps, required lookups are weighted heavily against
+# becoming dependent lookups, since records can't be inserted with them blank.
+REQUIRED_LOOKUP_WEIGHT = 100
+
+# The disk-backed Id map keeps this many recently used entries in memory,
+# and writes new entries to disk in batches of this size.
+ID_MAP_CACHE_SIZE = 100000
+ID_MAP_WRITE_BATCH_SIZE = 10000
+
+# The load journal is synced to disk after this many new Ids, or this many seconds.
+JOURNAL_SYNC_INTERVAL = 10000
+JOURNAL_SYNC_SECONDS = 1
+
+# At most this many SalesforceIds are interned at a time.
+ID_INTERN_TABLE_SIZE = 65536
+
+# Packed Id sets and maps merge new entries into their sorted arrays once there are
+# this many, or once they are one eighth the size of the array, whichever is larger.
+PACKED_ID_MERGE_SIZE = 1024
+
+# Id sets spilled to disk are read back this many Ids at a time.
+ID_SET_READ_CHUNK_SIZE = 10000
+
+# Buffered csv writers pass rows to their writer thread this many at a time,
+# with up to WRITE_QUEUE_SIZE blocks of rows waiting to be written.
+BUFFERED_WRITE_ROWS = 1000
+WRITE_QUEUE_SIZE = 16
+
+# Parquet and Arrow files are written and read in blocks of this many rows.
+ARROW_BATCH_ROWS = 65536
+
+# With multiple preparation processes, each prepares ranges of this many bytes of input.
+PREPARATION_RANGE_SIZE = 4 * 1024 * 1024
+
+# Binary state files are read and written this many Id map entries at a time.
+BINARY_STATE_CHUNK_SIZE = 100000
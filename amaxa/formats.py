@@ -0,0 +1,450 @@
+import csv
+import glob
+import gzip
+import itertools
+import io
+import json
+import operator
+import re
+
+from . import constants
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Data files are read and written in the format given by their extension.
+# CSV and JSON Lines files may also be compressed, with a further extension.
+CSV = "csv"
+JSON_LINES = "jsonl"
+PARQUET = "parquet"
+ARROW = "arrow"
+
+FORMAT_EXTENSIONS = {
+    ".csv": CSV,
+    ".jsonl": JSON_LINES,
+    ".ndjson": JSON_LINES,
+    ".parquet": PARQUET,
+    ".arrow": ARROW,
+    ".feather": ARROW,
+}
+COMPRESSION_EXTENSIONS = [".gz", ".zst"]
+
+
+class FileFormatException(Exception):
+    pass
+
+
+class UnsplittableRangeException(FileFormatException):
+    # Raised by InputSource.read_range() for a range whose quotes don't follow strict
+    # CSV quoting, so that the boundaries we found by counting quotes can't be trusted.
+    pass
+
+
+def get_file_format(path):
+    # Returns the format and compression extension (or None) of a data file.
+    # Files with extensions we don't recognize are treated as CSV.
+    name = path.lower()
+    compression = None
+    for ext in COMPRESSION_EXTENSIONS:
+        if name.endswith(ext):
+            compression = ext
+            name = name[: -len(ext)]
+
+    file_format = CSV
+    for ext, f in FORMAT_EXTENSIONS.items():
+        if name.endswith(ext):
+            file_format = f
+
+    if compression is not None and file_format in [PARQUET, ARROW]:
+        raise FileFormatException(
+            "{} files are compressed internally and can't be compressed as {}".format(
+                file_format, compression
+            )
+        )
+    if compression == ".zst" and zstandard is None:
+        raise FileFormatException("the zstandard package is required for .zst files")
+    if file_format in [PARQUET, ARROW] and pyarrow is None:
+        raise FileFormatException(
+            "the pyarrow package is required for {} files".format(file_format)
+        )
+
+    return file_format, compression
+
+
+def _open_text(path, mode, compression):
+    if compression == ".gz":
+        return gzip.open(path, mode + "t", newline="", encoding="utf-8")
+    if compression == ".zst":
+        return zstandard.open(path, mode + "t", newline="", encoding="utf-8")
+    if mode == "r":
+        return open(path, "r", encoding="utf-8")
+
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def _to_text(value):
+    # Values read from typed formats are passed on as a csv.DictReader would read them
+    # from a CSV file written by Amaxa.
+    if value is None:
+        return ""
+    if type(value) is str:
+        return value
+
+    return str(value)
+
+
+def open_output(path, fieldnames):
+    # Returns a file, which must be closed, and a writer for `path`,
+    # which behaves like a csv.DictWriter. The caller writes the header.
+    file_format, compression = get_file_format(path)
+
+    if file_format in [PARQUET, ARROW]:
+        writer = ArrowWriter(path, fieldnames, file_format)
+        return writer, writer
+
+    f = _open_text(path, "w", compression)
+    if file_format == JSON_LINES:
+        return f, JsonLinesWriter(f, fieldnames)
+
+    return f, csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+
+
+def open_input(path, keep_column=None):
+    # Returns a reader for `path`, which yields records as dicts of strings,
+    # like a csv.DictReader, and must be closed. Compressed files are
+    # decompressed as they're read. If `keep_column` is given, records include
+    # only the columns for which it returns True.
+    file_format, compression = get_file_format(path)
+
+    if file_format in [PARQUET, ARROW]:
+        return ArrowReader(path, file_format, keep_column)
+    if file_format == JSON_LINES:
+        return JsonLinesReader(lambda: _open_text(path, "r", compression), keep_column)
+
+    return CsvReader(lambda: _open_text(path, "r", compression), keep_column)
+
+
+class JsonLinesWriter(object):
+    def __init__(self, f, fieldnames):
+        self.file = f
+        self.fieldnames = fieldnames
+        self.encoder = json.JSONEncoder(ensure_ascii=False)
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, row):
+        self.file.write(
+            self.encoder.encode({f: row.get(f) for f in self.fieldnames}) + "\n"
+        )
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+class ArrowWriter(object):
+    # Writes Parquet or Arrow IPC files in blocks of ARROW_BATCH_ROWS rows.
+    # All columns are strings. Parquet files dictionary-encode them.
+    def __init__(self, path, fieldnames, file_format):
+        self.fieldnames = fieldnames
+        self.columns = [[] for _ in fieldnames]
+        self.schema = pyarrow.schema([(f, pyarrow.string()) for f in fieldnames])
+        if file_format == PARQUET:
+            self.writer = pyarrow.parquet.ParquetWriter(
+                path, self.schema, use_dictionary=True
+            )
+        else:
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, row):
+        for f, column in zip(self.fieldnames, self.columns):
+            value = row.get(f)
+            column.append(value if value is None or type(value) is str else str(value))
+
+        if len(self.columns[0]) >= constants.ARROW_BATCH_ROWS:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self.columns and self.columns[0]:
+            self.writer.write_table(
+                pyarrow.Table.from_arrays(
+                    [pyarrow.array(c, pyarrow.string()) for c in self.columns],
+                    schema=self.schema,
+                )
+            )
+            self.columns = [[] for _ in self.fieldnames]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class RecordReader(object):
+    def __init__(self, opener, keep_column=None):
+        self.file = opener()
+        self._open()
+        # `fieldnames` are those of the file. `columns` are those of the records we yield.
+        self.columns = [
+            c for c in self.fieldnames if keep_column is None or keep_column(c)
+        ]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CsvReader(RecordReader):
+    # Reads rows with csv.reader and builds dicts of only the columns we keep,
+    # rather than building a full dict for every row with csv.DictReader.
+    # If `fieldnames` are given, the file has no header.
+    def __init__(self, opener, keep_column=None, fieldnames=None):
+        self.fieldnames = fieldnames
+        super().__init__(opener, keep_column)
+
+    def _open(self):
+        self.reader = csv.reader(self.file)
+        if self.fieldnames is None:
+            self.fieldnames = next(self.reader, None) or []
+
+    def __iter__(self):
+        width = len(self.fieldnames)
+        columns = self.columns
+        if not columns:
+            get_values = None
+        elif len(columns) == width:
+            get_values = None
+            columns = self.fieldnames
+        else:
+            indexes = [self.fieldnames.index(c) for c in columns]
+            if len(indexes) > 1:
+                get_values = operator.itemgetter(*indexes)
+            else:
+                get_values = lambda row: (row[indexes[0]],)  # noqa: E731
+
+        for row in self.reader:
+            # Like csv.DictReader, skip blank rows and fill out short ones with None.
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + [None] * (width - len(row))
+
+            yield dict(zip(columns, get_values(row) if get_values else row))
+
+
+class JsonLinesReader(RecordReader):
+    def _open(self):
+        # The columns are those of the first record.
+        self.first_line = self.file.readline()
+        self.fieldnames = (
+            list(json.loads(self.first_line)) if self.first_line.strip() else []
+        )
+
+    def __iter__(self):
+        decoder = json.JSONDecoder()
+        fieldnames = self.columns
+        first_line, self.first_line = self.first_line, ""
+
+        for line in itertools.chain([first_line], self.file):
+            if line.strip():
+                record = decoder.decode(line)
+                yield {f: _to_text(record.get(f)) for f in fieldnames}
+
+
+class ArrowReader(RecordReader):
+    def __init__(self, path, file_format, keep_column=None):
+        self.path = path
+        self.file_format = file_format
+        self.memory_map = None
+        super().__init__(self._open_file, keep_column)
+
+    def _open_file(self):
+        if self.file_format == PARQUET:
+            return pyarrow.parquet.ParquetFile(self.path)
+
+        # We close the memory map ourselves, since the IPC reader doesn't.
+        self.memory_map = pyarrow.memory_map(self.path)
+        return pyarrow.ipc.open_file(self.memory_map)
+
+    def _open(self):
+        if self.file_format == PARQUET:
+            self.fieldnames = self.file.schema_arrow.names
+        else:
+            self.fieldnames = self.file.schema.names
+
+    def close(self):
+        if self.file is not None and self.file_format == PARQUET:
+            self.file.close()
+        if self.memory_map is not None:
+            self.memory_map.close()
+            self.memory_map = None
+        self.file = None
+
+    def _batches(self):
+        # Parquet files are columnar on disk, so we read only the columns we keep.
+        if self.file_format == PARQUET:
+            yield from self.file.iter_batches(
+                batch_size=constants.ARROW_BATCH_ROWS, columns=self.columns
+            )
+        else:
+            for i in range(self.file.num_record_batches):
+                yield self.file.get_batch(i)
+
+    def __iter__(self):
+        fieldnames = self.columns
+        for batch in self._batches():
+            for row in batch.to_pylist():
+                yield {f: _to_text(row.get(f)) for f in fieldnames}
+
+
+# Records in which every quote opens a quoted value at the start of a field, closes one
+# at its end, or is doubled within one. A quote within an unquoted value, which csv
+# reads as an ordinary character, doesn't match.
+# Each part must match in only one way: if a lone \r could end a record, a \r\n could
+# also be read as two line breaks around an empty record, and a range that doesn't
+# match would take exponential time to reject.
+_CSV_FIELD = rb'(?:"[^"]*(?:""[^"]*)*"|[^",\r\n]*)'
+_CSV_RECORD = _CSV_FIELD + rb"(?:," + _CSV_FIELD + rb")*"
+_CSV_RECORDS = re.compile(
+    rb"(?:" + _CSV_RECORD + rb"(?:\r\n|\n|\r(?!\n)))*(?:" + _CSV_RECORD + rb")?"
+)
+
+
+def _csv_byte_ranges(path, size):
+    # A line break ends a record if there are an even number of quotes before it,
+    # since quotes within quoted values are doubled. That holds only for strict
+    # CSV quoting, which read_range() checks for each range. If the header doesn't
+    # follow it, we yield the whole file as one range to be read sequentially.
+    with open(path, "rb") as f:
+        quotes = 0
+
+        def read_to_end_of_record():
+            nonlocal quotes
+            while True:
+                line = f.readline()
+                quotes += line.count(b'"')
+                if not line or (line.endswith(b"\n") and quotes % 2 == 0):
+                    return
+
+        read_to_end_of_record()  # The header
+        start = f.tell()
+        f.seek(0)
+        if not _CSV_RECORDS.fullmatch(f.read(start)):
+            yield path, 0, None
+            return
+        while True:
+            block = f.read(size)
+            if not block:
+                return
+
+            quotes += block.count(b'"')
+            if not block.endswith(b"\n") or quotes % 2:
+                read_to_end_of_record()
+
+            end = f.tell()
+            yield path, start, end
+            start = end
+
+
+class InputSource(object):
+    # The input for a load: one file, or all of the files matching a glob pattern,
+    # which are read in order as a single sequence of records. Each iteration
+    # reopens the files, so that the input can be read more than once.
+    def __init__(self, pattern):
+        self.pattern = pattern
+        if re.search(r"[*?[]", pattern):
+            self.paths = sorted(glob.glob(pattern))
+            if not self.paths:
+                raise FileNotFoundError("no files match {}".format(pattern))
+        else:
+            self.paths = [pattern]
+
+        # Open each file now, to check that we can read it and that its columns match.
+        self.fieldnames = None
+        for path in self.paths:
+            reader = open_input(path)
+            try:
+                fieldnames = list(reader.fieldnames or [])
+            finally:
+                reader.close()
+
+            if self.fieldnames is None:
+                self.fieldnames = fieldnames
+            elif fieldnames != self.fieldnames:
+                raise FileFormatException(
+                    "{} has different columns from {}".format(path, self.paths[0])
+                )
+
+    def __iter__(self):
+        return self.records()
+
+    def byte_ranges(self, size):
+        # Returns an iterator over (path, start, end) byte ranges of our files, of about
+        # `size` bytes, each holding whole records, or None if our files can't be split.
+        # Only uncompressed CSV files can. An `end` of None is the rest of the file.
+        if any(get_file_format(path) != (CSV, None) for path in self.paths):
+            return None
+
+        return (r for path in self.paths for r in _csv_byte_ranges(path, size))
+
+    def read_range(self, path, start, end, keep_column=None):
+        # Yields the records in a range of one of our files from byte_ranges().
+        # Ranges with an `end` are read at once, and raise UnsplittableRangeException
+        # if they don't follow strict CSV quoting. In that case, the range still begins
+        # a record if all earlier ranges of its file were read, and the rest of the file
+        # can be read from its start, with an `end` of None.
+        if end is None:
+
+            def opener():
+                f = open(path, "rb")
+                f.seek(start)
+                return io.TextIOWrapper(f, encoding="utf-8")
+
+        else:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+            if not _CSV_RECORDS.fullmatch(data):
+                raise UnsplittableRangeException(
+                    "{} doesn't follow strict CSV quoting between bytes {} and {}".format(
+                        path, start, end
+                    )
+                )
+            data = data.decode("utf-8")
+
+            def opener():
+                return io.StringIO(data, newline=None)
+
+        # A range from the start of the file includes its header.
+        reader = CsvReader(opener, keep_column, self.fieldnames if start else None)
+        try:
+            yield from reader
+        finally:
+            reader.close()
+
+    def records(self, keep_column=None):
+        # Yields the records of all of our files. If `keep_column` is given,
+        # records include only the columns for which it returns True.
+        for path in self.paths:
+            reader = open_input(path, keep_column)
+            try:
+                yield from reader
+            finally:
+                reader.close()
@@ -2,4 +2,11 @@ from .core import load_file
 from .credentials import CredentialLoader
 from .extract_operation import ExtractionOperationLoader
 from .load_operation import LoadOperationLoader
-from .state import StateLoader, save_state
+from .state import (
+    StateJournal,
+    StateLoader,
+    load_binary_state,
+    replay_journal,
+    save_binary_state,
+    save_state,
+)
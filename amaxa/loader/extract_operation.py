@@ -1,6 +1,4 @@
-import csv
-
-from .. import amaxa
+from .. import amaxa, constants, formats
 from .core import OperationLoader
 from .input_type import InputType
 
@@ -18,11 +16,22 @@ class ExtractionOperationLoader(OperationLoader):
         self._open_files()
 
     def _load(self):
-        # Create the core operation
-        self.result = amaxa.ExtractOperation(self.connection)
-
         options = self.input.get("options") or {}
 
+        # Create the core operation
+        self.result = amaxa.ExtractOperation(
+            self.connection,
+            amaxa.IdSetType.values_dict()[
+                options.get("id-set", constants.OPTION_DEFAULTS["id-set"])
+            ],
+            options.get(
+                "id-set-memory-limit", constants.OPTION_DEFAULTS["id-set-memory-limit"]
+            ),
+        )
+        self.result.max_concurrent_steps = options.get(
+            "max-concurrent-steps", constants.OPTION_DEFAULTS["max-concurrent-steps"]
+        )
+
         # Create the steps and data mappers
         for entry in self.input["operation"]:
             sobject = entry["sobject"]
@@ -127,7 +136,6 @@ class ExtractionOperationLoader(OperationLoader):
         # Create DictWriters and populate them in the context
         for (step, entry) in zip(self.result.steps, self.input["operation"]):
             try:
-                file_handle = open(entry["file"], "w", newline="", encoding="utf-8")
                 if step.sobjectname not in self.result.mappers:
                     fieldnames = step.field_scope
                 else:
@@ -136,21 +144,18 @@ class ExtractionOperationLoader(OperationLoader):
                         for k in step.field_scope
                     ]
 
-                output = csv.DictWriter(
-                    file_handle,
-                    fieldnames=sorted(
-                        fieldnames, key=lambda x: x if x != "Id" else " Id"
-                    ),
-                    extrasaction="ignore",
+                file_handle, output = formats.open_output(
+                    entry["file"],
+                    sorted(fieldnames, key=lambda x: x if x != "Id" else " Id"),
                 )
                 output.writeheader()
                 self.result.file_store.set_file(
                     step.sobjectname, amaxa.FileType.OUTPUT, file_handle
                 )
                 self.result.file_store.set_csv(
-                    step.sobjectname, amaxa.FileType.OUTPUT, output
+                    step.sobjectname, amaxa.FileType.OUTPUT, output, buffered=True
                 )
-            except IOError as exp:
+            except (IOError, formats.FileFormatException) as exp:
                 self.errors.append(
                     "Unable to open file {} for writing ({}).".format(
                         entry["file"], exp
@@ -1,6 +1,7 @@
 import csv
+import logging
 
-from .. import amaxa, constants
+from .. import amaxa, constants, formats
 from .core import OperationLoader
 from .input_type import InputType
 
@@ -15,11 +16,22 @@ class LoadOperationLoader(OperationLoader):
         self._validate_field_mapping()
 
     def _load(self):
-        # Create the core operation
-        self.result = amaxa.LoadOperation(self.connection)
-
         options = self.input.get("options") or {}
 
+        # Create the core operation
+        self.result = amaxa.LoadOperation(
+            self.connection,
+            amaxa.IdMapType.values_dict()[
+                options.get("id-map", constants.OPTION_DEFAULTS["id-map"])
+            ],
+        )
+        self.result.state_format = amaxa.StateFormat.values_dict()[
+            options.get("state-format", constants.OPTION_DEFAULTS["state-format"])
+        ]
+        self.result.max_concurrent_steps = options.get(
+            "max-concurrent-steps", constants.OPTION_DEFAULTS["max-concurrent-steps"]
+        )
+
         # Create the steps and data mappers
         for entry in self.input["operation"]:
             sobject = entry["sobject"]
@@ -46,6 +58,132 @@ class LoadOperationLoader(OperationLoader):
             self._populate_lookup_behaviors(step, entry)
             self.result.add_step(step)
 
+        self._plan_step_order(
+            options.get("order-steps", constants.OPTION_DEFAULTS["order-steps"])
+        )
+
+    def _get_step_lookups(self):
+        # Map each sObject to the lookups in its field scope that refer to other sObjects
+        # in the operation, as (field, target sObject, weight) tuples.
+        # Required lookups are weighted heavily, because they can't be populated in an update pass.
+        sobjects = self.result.get_sobject_list()
+        lookups = {}
+
+        for step in self.result.steps:
+            field_map = self.result.get_field_map(step.sobjectname)
+            lookups[step.sobjectname] = [
+                (
+                    f,
+                    target,
+                    1 if field_map[f]["nillable"] else constants.REQUIRED_LOOKUP_WEIGHT,
+                )
+                for f in sorted(step.field_scope)
+                if f in field_map and field_map[f]["type"] == "reference"
+                for target in field_map[f]["referenceTo"]
+                if target in sobjects and target != step.sobjectname
+            ]
+
+        return lookups
+
+    def _get_dependent_lookups(self, order, lookups):
+        # Lookups that become dependent lookups, populated in an update pass,
+        # if sObjects are loaded in the given order.
+        return [
+            (sobject, f, target, weight)
+            for i, sobject in enumerate(order)
+            for (f, target, weight) in lookups[sobject]
+            if order.index(target) > i
+        ]
+
+    def _plan_step_order(self, reorder):
+        # Plan the order of steps that minimizes the (weighted) lookups that must be
+        # populated in update passes. sObjects whose lookups form a cycle are grouped
+        # into strongly connected components, which are loaded after every component they
+        # look up, so that only lookups within a cycle become dependent. Within each cycle,
+        # we repeatedly pick the sObject with the least weight of lookups to sObjects of
+        # the cycle not yet loaded. Ties go to the order given in the operation.
+        order = self.result.get_sobject_list()
+        lookups = self._get_step_lookups()
+
+        positions = {sobject: i for i, sobject in enumerate(order)}
+        components = amaxa._strongly_connected_components(
+            [sorted({positions[t] for (f, t, w) in lookups[s]}) for s in order]
+        )
+        members = {}
+        for sobject, component in zip(order, components):
+            members.setdefault(component, []).append(sobject)
+        depends_on = {
+            c: {
+                components[positions[t]]
+                for s in members[c]
+                for (f, t, w) in lookups[s]
+                if components[positions[t]] != c
+            }
+            for c in members
+        }
+
+        planned = []
+        remaining_components = set(members)
+        while remaining_components:
+            component = min(
+                (
+                    c
+                    for c in remaining_components
+                    if not depends_on[c] & remaining_components
+                ),
+                key=lambda c: positions[members[c][0]],
+            )
+            remaining_components.remove(component)
+
+            remaining = list(members[component])
+            while remaining:
+                sobject = min(
+                    remaining,
+                    key=lambda s: (
+                        sum(w for (f, t, w) in lookups[s] if t in remaining),
+                        positions[s],
+                    ),
+                )
+                planned.append(sobject)
+                remaining.remove(sobject)
+
+        given_dependents = self._get_dependent_lookups(order, lookups)
+        planned_dependents = self._get_dependent_lookups(planned, lookups)
+        logger = logging.getLogger("amaxa")
+
+        if reorder:
+            if planned != order:
+                self.result.steps = [self.result.steps[positions[s]] for s in planned]
+                self.input["operation"] = [
+                    self.input["operation"][positions[s]] for s in planned
+                ]
+                logger.info("Reordered steps as %s", ", ".join(planned))
+
+            for (sobject, f, target, weight) in planned_dependents:
+                logger.info(
+                    "Field %s.%s remains a dependent lookup, because %s must be loaded "
+                    "after %s: lookups between them form a cycle.",
+                    sobject,
+                    f,
+                    target,
+                    sobject,
+                )
+        elif sum(d[3] for d in planned_dependents) < sum(
+            d[3] for d in given_dependents
+        ):
+            logger.warning(
+                "The order of steps makes %d lookup%s (%s) dependent, requiring update passes "
+                "over %d sObject%s. Loading in the order %s would require update passes over %d. "
+                "Set the order-steps option to reorder steps automatically.",
+                len(given_dependents),
+                "s" if len(given_dependents) != 1 else "",
+                ", ".join(f"{d[0]}.{d[1]}" for d in given_dependents),
+                len({d[0] for d in given_dependents}),
+                "s" if len({d[0] for d in given_dependents}) != 1 else "",
+                ", ".join(planned),
+                len({d[0] for d in planned_dependents}),
+            )
+
     def _post_load_validate(self):
         self._validate_field_permissions("createable")
 
@@ -85,15 +223,12 @@ class LoadOperationLoader(OperationLoader):
         # Create DictReaders and populate them in the context
         for (step, entry) in zip(self.result.steps, self.input["operation"]):
             try:
-                file_handle = open(entry["file"], "r", encoding="utf-8")
-                input_file = csv.DictReader(file_handle)
-                self.result.file_store.set_file(
-                    step.sobjectname, amaxa.FileType.INPUT, file_handle
-                )
                 self.result.file_store.set_csv(
-                    step.sobjectname, amaxa.FileType.INPUT, input_file
+                    step.sobjectname,
+                    amaxa.FileType.INPUT,
+                    formats.InputSource(entry["file"]),
                 )
-            except IOError as exp:
+            except (IOError, formats.FileFormatException) as exp:
                 self.errors.append(
                     "Unable to open file {} for reading ({}).".format(
                         entry["file"], exp
@@ -122,7 +257,7 @@ class LoadOperationLoader(OperationLoader):
                     step.sobjectname, amaxa.FileType.RESULT, f
                 )
                 self.result.file_store.set_csv(
-                    step.sobjectname, amaxa.FileType.RESULT, output
+                    step.sobjectname, amaxa.FileType.RESULT, output, buffered=True
                 )
             except IOError as exp:
                 self.errors.append(
@@ -134,6 +269,7 @@ class LoadOperationLoader(OperationLoader):
     def _post_initialize_validate(self):
         self._validate_dependent_field_permissions()
         self._validate_lookup_behaviors()
+        self._validate_parent_grouping()
         self._validate_input_file_columns()
 
     def _validate_dependent_field_permissions(self):
@@ -148,6 +284,19 @@ class LoadOperationLoader(OperationLoader):
                         )
                     )
 
+    def _validate_parent_grouping(self):
+        # Validate that a field named for parent grouping is a lookup to an sObject
+        # loaded earlier in the operation.
+        for step in self.result.steps:
+            field = step.get_option("bulk-api-group-by-parent")
+            if isinstance(field, str) and field not in step.descendent_lookups:
+                self.errors.append(
+                    "Field {}.{} is specified for bulk-api-group-by-parent, "
+                    "but is not a lookup to an sObject loaded earlier in the operation.".format(
+                        step.sobjectname, field
+                    )
+                )
+
     def _validate_input_file_columns(self):
         # Validate the column sets in the input files.
         # For each file, if validation is active, check as follows.
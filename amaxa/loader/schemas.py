@@ -91,6 +91,26 @@ OPTIONS_SCHEMA = {
         "default": constants.OPTION_DEFAULTS["bulk-api-mode"],
         "allowed": ["Serial", "Parallel"],
     },
+    "bulk-api-retry-attempts": {
+        "type": "integer",
+        "default": constants.OPTION_DEFAULTS["bulk-api-retry-attempts"],
+        "min": 0,
+        "max": 10,
+    },
+    "bulk-api-group-by-parent": {
+        "type": ["boolean", "string"],
+        "default": constants.OPTION_DEFAULTS["bulk-api-group-by-parent"],
+    },
+    "insert-self-lookups-by-level": {
+        "type": "boolean",
+        "default": constants.OPTION_DEFAULTS["insert-self-lookups-by-level"],
+    },
+    "preparation-processes": {
+        "type": "integer",
+        "default": constants.OPTION_DEFAULTS["preparation-processes"],
+        "min": 1,
+        "max": 64,
+    },
 }
 
 SOBJECT_OPTIONS_SCHEMA = {
@@ -109,6 +129,36 @@ OPERATION_OPTIONS_SCHEMA = {
             "default": constants.OPTION_DEFAULTS["api-version"],
             "regex": r"\d{2}\.0",
         },
+        "max-concurrent-steps": {
+            "type": "integer",
+            "default": constants.OPTION_DEFAULTS["max-concurrent-steps"],
+            "min": 1,
+            "max": 10,
+        },
+        "order-steps": {
+            "type": "boolean",
+            "default": constants.OPTION_DEFAULTS["order-steps"],
+        },
+        "id-map": {
+            "type": "string",
+            "default": constants.OPTION_DEFAULTS["id-map"],
+            "allowed": amaxa.IdMapType.all_values(),
+        },
+        "id-set": {
+            "type": "string",
+            "default": constants.OPTION_DEFAULTS["id-set"],
+            "allowed": amaxa.IdSetType.all_values(),
+        },
+        "id-set-memory-limit": {
+            "type": "integer",
+            "default": constants.OPTION_DEFAULTS["id-set-memory-limit"],
+            "min": 1,
+        },
+        "state-format": {
+            "type": "string",
+            "default": constants.OPTION_DEFAULTS["state-format"],
+            "allowed": amaxa.StateFormat.all_values(),
+        },
     },
 }
 
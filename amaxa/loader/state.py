@@ -1,8 +1,12 @@
+import itertools
 import json
+import os
+import struct
+import time
 
 import yaml
 
-from .. import amaxa
+from .. import amaxa, constants
 from .core import Loader
 from .input_type import InputType
 
@@ -26,7 +30,206 @@ class StateLoader(Loader):
 
     def _load(self):
         self.result.stage = amaxa.LoadStage.values_dict()[self.input["state"]["stage"]]
-        self.result.global_id_map = {
-            amaxa.SalesforceId(k): amaxa.SalesforceId(v)
-            for k, v in self.input["state"]["id-map"].items()
-        }
+        self.result.global_id_map.update(
+            {
+                amaxa.SalesforceId(k): amaxa.SalesforceId(v)
+                for k, v in self.input["state"]["id-map"].items()
+            }
+        )
+
+
+# A binary state file is a header, followed by its Id map as pairs of 18-character
+# ASCII Ids (original, then new) with no separators. The header is the magic bytes,
+# the format version, the length of the stage name, the stage name, and the entry count.
+BINARY_STATE_MAGIC = b"AMAXASTATE"
+BINARY_STATE_VERSION = 1
+BINARY_STATE_HEADER = struct.Struct("<BB")
+BINARY_STATE_COUNT = struct.Struct("<Q")
+BINARY_STATE_ENTRY_SIZE = 36
+
+
+def save_binary_state(operation, state_file):
+    stage = operation.stage.value.encode("ascii")
+    state_file.write(BINARY_STATE_MAGIC)
+    state_file.write(BINARY_STATE_HEADER.pack(BINARY_STATE_VERSION, len(stage)))
+    state_file.write(stage)
+    state_file.write(BINARY_STATE_COUNT.pack(len(operation.global_id_map)))
+
+    items = iter(operation.global_id_map.items())
+    while True:
+        chunk = "".join(
+            f"{k}{v}"
+            for k, v in itertools.islice(items, constants.BINARY_STATE_CHUNK_SIZE)
+        )
+        if not chunk:
+            break
+        state_file.write(chunk.encode("ascii"))
+
+
+def load_binary_state(state_file, operation):
+    # Restore the stage and Id map from a binary state file to the operation.
+    # Only the header is validated; entries are decoded in bulk into the Id map.
+    # Returns a list of errors.
+    name = getattr(state_file, "name", "The state file")
+    header = state_file.read(len(BINARY_STATE_MAGIC) + BINARY_STATE_HEADER.size)
+    if len(header) < len(BINARY_STATE_MAGIC) + BINARY_STATE_HEADER.size or not (
+        header.startswith(BINARY_STATE_MAGIC)
+    ):
+        return [f"{name} is not an Amaxa binary state file."]
+
+    version, stage_length = BINARY_STATE_HEADER.unpack(
+        header[len(BINARY_STATE_MAGIC) :]
+    )
+    if version != BINARY_STATE_VERSION:
+        return [f"{name} has unsupported version {version}."]
+
+    stage = state_file.read(stage_length).decode("ascii", errors="replace")
+    stages = amaxa.LoadStage.values_dict()
+    if stage not in stages:
+        return [f"{name} has invalid stage {stage}."]
+
+    count_bytes = state_file.read(BINARY_STATE_COUNT.size)
+    if len(count_bytes) < BINARY_STATE_COUNT.size:
+        return [f"{name} is truncated."]
+    (count,) = BINARY_STATE_COUNT.unpack(count_bytes)
+
+    if hasattr(operation.global_id_map, "update_id_strings"):
+        update = operation.global_id_map.update_id_strings
+    else:
+
+        def update(pairs):
+            operation.global_id_map.update(
+                (amaxa.SalesforceId(k), amaxa.SalesforceId(v)) for k, v in pairs
+            )
+
+    remaining = count
+    while remaining > 0:
+        entries = min(remaining, constants.BINARY_STATE_CHUNK_SIZE)
+        data = state_file.read(entries * BINARY_STATE_ENTRY_SIZE)
+        if len(data) < entries * BINARY_STATE_ENTRY_SIZE:
+            return [f"{name} is truncated."]
+        try:
+            data = data.decode("ascii")
+        except UnicodeDecodeError:
+            return [f"{name} contains invalid Ids."]
+
+        update(
+            (data[i : i + 18], data[i + 18 : i + BINARY_STATE_ENTRY_SIZE])
+            for i in range(0, len(data), BINARY_STATE_ENTRY_SIZE)
+        )
+        remaining -= entries
+
+    if state_file.read(1):
+        return [f"{name} contains unexpected data after its Id map."]
+
+    operation.stage = stages[stage]
+    return []
+
+
+JOURNAL_HEADER = "amaxa-journal 1\n"
+
+
+class StateJournal(object):
+    # An append-only journal of a load's stage and new Ids, synced to disk in batches,
+    # from which the load can be resumed even if Amaxa is killed.
+    # Each line records the stage ("S inserts"), a new Id ("I <original> <new>"), or a Bulk API
+    # batch of inserts that has been posted ("B <sObject> <job> <batch> <original>,<original>,...").
+    def __init__(
+        self,
+        path,
+        operation,
+        sync_interval=constants.JOURNAL_SYNC_INTERVAL,
+        sync_seconds=constants.JOURNAL_SYNC_SECONDS,
+    ):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.sync_seconds = sync_seconds
+
+        # Begin with a snapshot of the operation's current state, replacing any existing
+        # journal atomically. This compacts a journal we've resumed from.
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(JOURNAL_HEADER)
+            f.write(f"S {operation.stage.value}\n")
+            for k, v in operation.global_id_map.items():
+                f.write(f"I {k} {v}\n")
+            # Keep any batches whose results have yet to be collected.
+            for sobject, batches in operation.posted_batches.items():
+                for job, batch, old_ids in batches:
+                    if not all(
+                        amaxa.SalesforceId(i) in operation.global_id_map
+                        for i in old_ids
+                    ):
+                        f.write(_format_batch(sobject, job, batch, old_ids))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+        self.file = open(path, "a", encoding="utf-8")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def add_id(self, old_id, new_id):
+        self.file.write(f"I {old_id} {new_id}\n")
+        self.unsynced += 1
+
+        if (
+            self.unsynced >= self.sync_interval
+            or time.monotonic() - self.last_sync >= self.sync_seconds
+        ):
+            self.sync()
+
+    def add_batch(self, sobject, job, batch, old_ids):
+        # The batch is synced at once: if we lose it, its records would be loaded twice.
+        self.file.write(_format_batch(sobject, job, batch, old_ids))
+        self.sync()
+
+    def set_stage(self, stage):
+        self.file.write(f"S {stage.value}\n")
+        self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def remove(self):
+        os.remove(self.path)
+
+
+def _format_batch(sobject, job, batch, old_ids):
+    return f"B {sobject} {job} {batch} {','.join(str(i) for i in old_ids)}\n"
+
+
+def replay_journal(journal_file, operation):
+    # Restore the stage and Id map recorded in a journal to the operation.
+    # Returns a list of errors.
+    if journal_file.readline() != JOURNAL_HEADER:
+        return [f"{journal_file.name} is not an Amaxa journal."]
+
+    stages = amaxa.LoadStage.values_dict()
+    for line in journal_file:
+        # A line without a newline was cut off by a crash; its entry was never synced.
+        if not line.endswith("\n"):
+            break
+
+        entry = line.split()
+        if len(entry) == 3 and entry[0] == "I":
+            operation.global_id_map[amaxa.SalesforceId(entry[1])] = amaxa.SalesforceId(
+                entry[2]
+            )
+        elif len(entry) == 5 and entry[0] == "B":
+            operation.posted_batches.setdefault(entry[1], []).append(
+                (entry[2], entry[3], entry[4].split(","))
+            )
+        elif len(entry) == 2 and entry[0] == "S" and entry[1] in stages:
+            operation.stage = stages[entry[1]]
+        else:
+            return [f"{journal_file.name} contains an invalid entry: {line.strip()}"]
+
+    return []
@@ -36,6 +36,8 @@ class MockConnection(object):
         self._retrieve_results = retrieve_results
         self._query_results = query_results
         self._field_maps = {}
+        self.inserted_records = []
+        self.updated_records = []
 
     def get_global_describe(self):
         if self._describe is None:
@@ -57,6 +59,9 @@ class MockConnection(object):
 
         return self._field_maps[sobjectname]
 
+    def get_bulk_api_batch_size_limit(self, sobject):
+        return None
+
     def bulk_api_insert(
         self,
         sobject,
@@ -65,7 +70,12 @@ class MockConnection(object):
         bulk_api_poll_interval,
         bulk_api_batch_size,
         bulk_api_mode,
+        batch_posted=None,
     ):
+        records = list(record_iterator)
+        self.inserted_records.extend(records)
+        if batch_posted is not None:
+            batch_posted("750000000000000AAA", "751000000000000AAA", records)
         for r in self._bulk_insert_results:
             yield r
 
@@ -78,13 +88,31 @@ class MockConnection(object):
         bulk_api_batch_size,
         bulk_api_mode,
     ):
+        self.updated_records.extend(record_iterator)
         for r in self._bulk_update_results:
             yield r
 
+    def get_bulk_api_batch_results(
+        self, job, batch, bulk_api_timeout, bulk_api_poll_interval
+    ):
+        return self._bulk_insert_results
+
     def bulk_api_query(self, sobject, query, date_time_fields, bulk_api_poll_interval):
         for r in self._bulk_query_results:
             yield r
 
+    def start_bulk_api_query(self, sobject, query):
+        return "751000000000000AAA"
+
+    def abort_bulk_api_query(self, batch):
+        pass
+
+    def get_bulk_api_query_results(
+        self, batch, date_time_fields, bulk_api_poll_interval
+    ):
+        for r in self._bulk_query_results:
+            yield r
+
     def retrieve_records_by_id(self, sobject, record_ids, field_names):
         for r in self._retrieve_results:
             yield r
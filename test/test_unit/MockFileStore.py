@@ -4,6 +4,14 @@ from unittest.mock import Mock
 import amaxa
 
 
+class MockInput(list):
+    def records(self, keep_column=None):
+        for record in self:
+            yield {
+                k: v for k, v in record.items() if keep_column is None or keep_column(k)
+            }
+
+
 class MockFileStore(object):
     def __init__(self):
         self.mocks = {}
@@ -18,7 +26,11 @@ class MockFileStore(object):
 
     def get_csv(self, sobject, ftype):
         if ftype == amaxa.FileType.INPUT and sobject in self.records:
-            return self.records[sobject]
+            if not isinstance(self.records[sobject], list):
+                # A real input source, such as an amaxa.formats.InputSource.
+                return self.records[sobject]
+
+            return MockInput(self.records[sobject])
 
         if not (sobject, ftype) in self.mocks:
             self.mocks[(sobject, ftype)] = Mock()
@@ -2,9 +2,12 @@ import json
 import unittest
 from unittest.mock import Mock, call, patch
 
+from salesforce_bulk import BulkApiError, UploadResult
+from salesforce_bulk.salesforce_bulk import BulkBatchFailed
 from salesforce_bulk.util import IteratorBytesIO
 
 import amaxa
+from amaxa import constants
 from amaxa.api import Connection
 
 
@@ -127,6 +130,30 @@ class test_Connection(unittest.TestCase):
 
         self.assertEqual(retval, results)
 
+    def test_abort_bulk_api_query(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.lookup_job_id.return_value = "075000000000000AAA"
+
+        conn.abort_bulk_api_query("751000000000000AAA")
+
+        conn._bulk.lookup_job_id.assert_called_once_with("751000000000000AAA")
+        conn._bulk.abort_job.assert_called_once_with("075000000000000AAA")
+
+    def test_abort_bulk_api_query_ignores_finished_jobs(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.abort_job.side_effect = BulkApiError("Job is not open", 400)
+
+        with self.assertLogs("amaxa", level="WARNING"):
+            conn.abort_bulk_api_query("751000000000000AAA")
+
     def test_bulk_query_converts_datetimes(self):
         sf = Mock()
         sf.bulk_url = "https://salesforce.com"
@@ -216,8 +243,11 @@ class test_Connection(unittest.TestCase):
         job = Mock()
 
         retval = [
-            [{"Id": "001000000000001"}, {"Id": "001000000000002"}],
-            [{"Id": "001000000000003"}],
+            [
+                UploadResult("001000000000001", True, True, ""),
+                UploadResult("001000000000002", True, True, ""),
+            ],
+            [UploadResult("001000000000003", True, True, "")],
         ]
 
         conn._bulk.is_batch_done = Mock(side_effect=[False, True])
@@ -254,15 +284,265 @@ class test_Connection(unittest.TestCase):
                 call(conn._bulk.post_batch.return_value, job),
             ],
         )
+        self.assertEqual(results, retval[0] + retval[1])
+
+    def test_bulk_api_insert_update_bounds_batches_in_flight(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.get_batch_results = Mock(
+            side_effect=lambda batch, job: [UploadResult(None, True, True, "")]
+        )
+        job = Mock()
+
+        consumed = []
+
+        def records():
+            for i in range(constants.MAX_BULK_API_BATCHES_IN_FLIGHT + 10):
+                consumed.append(i)
+                yield {"Name": "Test {}".format(i)}
+
+        results = conn._bulk_api_insert_update(job, "Account", records(), 120, 5, 1)
+        next(results)
+
+        # The first result is available before the input has been consumed.
+        # Batches are serialized ahead of upload by at most PIPELINE_QUEUE_SIZE batches.
+        self.assertEqual(
+            constants.MAX_BULK_API_BATCHES_IN_FLIGHT, conn._bulk.post_batch.call_count
+        )
+        self.assertLessEqual(
+            len(consumed),
+            constants.MAX_BULK_API_BATCHES_IN_FLIGHT
+            + constants.PIPELINE_QUEUE_SIZE
+            + 1,
+        )
+        conn._bulk.close_job.assert_not_called()
+
+        self.assertEqual(
+            constants.MAX_BULK_API_BATCHES_IN_FLIGHT + 9, len(list(results))
+        )
+        conn._bulk.close_job.assert_called_once_with(job)
+
+    def test_bulk_api_insert_update_splits_batches_failing_on_limits(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.post_batch = Mock(side_effect=["batch1", "batch2", "batch3"])
+        job = Mock()
+
+        error = [
+            {
+                "statusCode": "CANNOT_INSERT_UPDATE_ACTIVATE_ENTITY",
+                "message": "AccountTrigger: System.LimitException: Apex CPU time limit exceeded",
+                "fields": [],
+            }
+        ]
+        batch_results = {
+            "batch1": [UploadResult(None, False, False, error)] * 400,
+            "batch2": [
+                UploadResult("001000000{:06d}".format(i), True, True, "")
+                for i in range(200)
+            ],
+            "batch3": [
+                UploadResult("001000000{:06d}".format(i), True, True, "")
+                for i in range(200, 400)
+            ],
+        }
+        conn._bulk.get_batch_results = Mock(
+            side_effect=lambda batch, job: batch_results[batch]
+        )
+
+        input_data = [{"Name": "Test {}".format(i)} for i in range(400)]
+        results = list(
+            conn._bulk_api_insert_update(job, "Account", input_data, 120, 5, 400)
+        )
+
+        self.assertEqual(batch_results["batch2"] + batch_results["batch3"], results)
+        self.assertEqual(3, conn._bulk.post_batch.call_count)
+        self.assertEqual(
+            input_data[:200],
+            json.loads(conn._bulk.post_batch.call_args_list[1][0][1]),
+        )
         self.assertEqual(
-            results,
+            input_data[200:],
+            json.loads(conn._bulk.post_batch.call_args_list[2][0][1]),
+        )
+        conn._bulk.close_job.assert_called_once_with(job)
+        self.assertEqual(200, conn.get_bulk_api_batch_size_limit("Account"))
+
+    @patch("amaxa.constants.MAX_BULK_API_BATCHES_IN_FLIGHT", 1)
+    def test_bulk_api_insert_update_uses_reduced_batch_size_for_later_batches(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.post_batch = Mock(side_effect=lambda job, data: data)
+        job = Mock()
+
+        error = [
+            {
+                "statusCode": "CANNOT_INSERT_UPDATE_ACTIVATE_ENTITY",
+                "message": "AccountTrigger: System.LimitException: Apex CPU time limit exceeded",
+                "fields": [],
+            }
+        ]
+
+        def get_batch_results(batch, job):
+            records = json.loads(batch)
+            if len(records) > 200:
+                return [UploadResult(None, False, False, error)] * len(records)
+
+            return [UploadResult(None, True, True, "") for r in records]
+
+        conn._bulk.get_batch_results = Mock(side_effect=get_batch_results)
+
+        input_data = [{"Name": "Test {}".format(i)} for i in range(1200)]
+        results = list(
+            conn._bulk_api_insert_update(job, "Account", input_data, 120, 5, 400)
+        )
+
+        self.assertEqual(1200, len(results))
+        self.assertTrue(all(r.success for r in results))
+        # The first batch failed and was split. Every later batch uses the size that succeeded.
+        self.assertEqual(
+            [400] + [200] * 6,
+            [len(json.loads(c[0][1])) for c in conn._bulk.post_batch.call_args_list],
+        )
+        self.assertEqual(
+            input_data,
             [
-                {"Id": "001000000000001"},
-                {"Id": "001000000000002"},
-                {"Id": "001000000000003"},
+                r
+                for c in conn._bulk.post_batch.call_args_list[1:]
+                for r in json.loads(c[0][1])
             ],
         )
 
+    def test_bulk_api_insert_update_reports_limit_failures_at_minimum_size(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.wait_for_batch = Mock(
+            side_effect=BulkBatchFailed("job", "batch", "Max CPU time exceeded")
+        )
+        job = Mock()
+
+        input_data = [{"Name": "Test {}".format(i)} for i in range(10)]
+        results = list(
+            conn._bulk_api_insert_update(job, "Account", input_data, 120, 5, 10)
+        )
+
+        self.assertEqual(1, conn._bulk.post_batch.call_count)
+        self.assertEqual(10, len(results))
+        self.assertFalse(results[0].success)
+        self.assertEqual("Max CPU time exceeded", results[0].error[0]["message"])
+        self.assertIsNone(conn.get_bulk_api_batch_size_limit("Account"))
+
+    def test_bulk_api_insert_update_raises_other_batch_failures(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.wait_for_batch = Mock(
+            side_effect=BulkBatchFailed("job", "batch", "InvalidBatch")
+        )
+
+        with self.assertRaises(BulkBatchFailed):
+            list(
+                conn._bulk_api_insert_update(
+                    Mock(), "Account", [{"Name": "Test"}], 120, 5, 10
+                )
+            )
+
+    def test_bulk_api_insert_update_reports_posted_batches(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.post_batch = Mock(side_effect=["batch1", "batch2"])
+        conn._bulk.get_batch_results = Mock(
+            side_effect=lambda batch, job: [UploadResult(None, True, True, "")] * 2
+        )
+        batch_posted = Mock()
+        job = Mock()
+
+        input_data = [{"Name": "Test {}".format(i)} for i in range(4)]
+        results = list(
+            conn._bulk_api_insert_update(
+                job, "Account", input_data, 120, 5, 2, batch_posted
+            )
+        )
+
+        self.assertEqual(4, len(results))
+        batch_posted.assert_has_calls(
+            [
+                call(job, "batch1", input_data[:2]),
+                call(job, "batch2", input_data[2:]),
+            ]
+        )
+
+    def test_get_bulk_api_batch_results(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+
+        self.assertEqual(
+            conn._bulk.get_batch_results.return_value,
+            conn.get_bulk_api_batch_results("job", "batch", 120, 5),
+        )
+        conn._bulk.wait_for_batch.assert_called_once_with(
+            "job", "batch", timeout=120, sleep_interval=5
+        )
+        conn._bulk.get_batch_results.assert_called_once_with("batch", "job")
+
+    def test_get_bulk_api_batch_results_returns_none_for_failed_batch(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.wait_for_batch = Mock(
+            side_effect=BulkBatchFailed("job", "batch", "InvalidBatch")
+        )
+
+        self.assertIsNone(conn.get_bulk_api_batch_results("job", "batch", 120, 5))
+        conn._bulk.get_batch_results.assert_not_called()
+
+    @patch("amaxa.api.logging")
+    def test_get_bulk_api_batch_results_returns_error_for_unreadable_batch(
+        self, logging_mock
+    ):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.wait_for_batch = Mock(
+            side_effect=BulkApiError("InvalidBatch: Unable to find batch", 400)
+        )
+
+        error = conn.get_bulk_api_batch_results("job", "batch", 120, 5)
+
+        self.assertIn("batch", error)
+        self.assertIn("Unable to find batch", error)
+        conn._bulk.get_batch_results.assert_not_called()
+        logging_mock.getLogger.return_value.warning.assert_called_once_with(error)
+
+    def test_get_bulk_api_batch_results_returns_error_on_timeout(self):
+        sf = Mock()
+        sf.bulk_url = "https://salesforce.com"
+        conn = Connection(sf, "52.0")
+        conn._bulk = Mock()
+        conn._bulk.is_batch_done.return_value = False
+
+        self.assertEqual(
+            "Timed out waiting for Bulk API batch batch",
+            conn.get_bulk_api_batch_results("job", "batch", 120, 5),
+        )
+        conn._bulk.is_batch_done.assert_called_once_with("batch", "job")
+        conn._bulk.get_batch_results.assert_not_called()
+
     def test_retrieve_records_by_id(self):
         id_set = []
         # Generate enough mock Ids to require two queries.
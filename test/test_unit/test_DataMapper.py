@@ -29,3 +29,29 @@ class test_DataMapper(unittest.TestCase):
                 {"Test__c": "  NOTHING MUCH", "Second Key": "another Response"}
             ),
         )
+
+    def test_transform_record_handles_records_with_different_keys(self):
+        mapper = amaxa.DataMapper(
+            {"Test__c": "Value", "Other__c": "Other"},
+            {"Test__c": [lambda x: x.strip()], "Third__c": [lambda x: x + "!"]},
+        )
+
+        self.assertEqual(
+            {"Value": "test", "Other": "other"},
+            mapper.transform_record({"Test__c": " test ", "Other__c": "other"}),
+        )
+        self.assertEqual(
+            {"Other": "other", "Third__c": "third!"},
+            mapper.transform_record({"Other__c": "other", "Third__c": "third"}),
+        )
+        self.assertEqual({"Id": "1"}, mapper.transform_record({"Id": "1"}))
+        self.assertEqual(
+            {"Value": "test"}, mapper.transform_record({"Test__c": " test "})
+        )
+
+    def test_transform_record_returns_copy(self):
+        mapper = amaxa.DataMapper()
+        record = {"Id": "1"}
+
+        self.assertEqual(record, mapper.transform_record(record))
+        self.assertIsNot(record, mapper.transform_record(record))
@@ -36,6 +36,88 @@ class test_ExtractOperation(unittest.TestCase):
         oc.steps[1].execute.assert_called_once_with()
         oc.steps[2].execute.assert_not_called()
 
+    def test_execute_starts_bulk_queries_ahead(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.max_concurrent_steps = 2
+
+        started = []
+        executed = []
+        for name, query in [
+            ("Account", "SELECT Id FROM Account"),
+            ("Contact", None),
+            ("Lead", "SELECT Id FROM Lead"),
+            ("Campaign", "SELECT Id FROM Campaign"),
+        ]:
+            step = Mock(sobjectname=name, errors=[])
+            step.get_bulk_api_query.return_value = query
+            step.start_bulk_api_query.side_effect = lambda name=name: started.append(
+                name
+            )
+            step.execute.side_effect = lambda name=name: executed.append(
+                (name, list(started))
+            )
+            oc.add_step(step)
+
+        self.assertEqual(0, oc.execute())
+
+        # No more than two queries are running ahead of the step being executed.
+        self.assertEqual(
+            [
+                ("Account", ["Account", "Lead"]),
+                ("Contact", ["Account", "Lead", "Campaign"]),
+                ("Lead", ["Account", "Lead", "Campaign"]),
+                ("Campaign", ["Account", "Lead", "Campaign"]),
+            ],
+            executed,
+        )
+        oc.steps[1].start_bulk_api_query.assert_not_called()
+
+    def test_execute_aborts_started_bulk_queries_on_failure(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.max_concurrent_steps = 3
+
+        for name in ["Account", "Contact", "Lead"]:
+            step = Mock(sobjectname=name, errors=[])
+            step.get_bulk_api_query.return_value = f"SELECT Id FROM {name}"
+            oc.add_step(step)
+        oc.steps[0].errors = ["Failed"]
+
+        self.assertEqual(-1, oc.execute())
+
+        # The failed step processed its own query.
+        oc.steps[0].abort_bulk_api_query.assert_not_called()
+        oc.steps[1].abort_bulk_api_query.assert_called_once_with()
+        oc.steps[2].abort_bulk_api_query.assert_called_once_with()
+
+    def test_execute_aborts_started_bulk_queries_on_exception(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.max_concurrent_steps = 2
+
+        for name in ["Account", "Contact", "Lead"]:
+            step = Mock(sobjectname=name, errors=[])
+            step.get_bulk_api_query.return_value = f"SELECT Id FROM {name}"
+            oc.add_step(step)
+        oc.steps[1].execute.side_effect = amaxa.AmaxaException("Failed")
+
+        with self.assertRaises(amaxa.AmaxaException):
+            oc.execute()
+
+        oc.steps[0].abort_bulk_api_query.assert_not_called()
+        oc.steps[1].abort_bulk_api_query.assert_called_once_with()
+        oc.steps[2].abort_bulk_api_query.assert_called_once_with()
+
+    def test_execute_does_not_start_bulk_queries_ahead_by_default(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.add_step(Mock(sobjectname="Account", errors=[]))
+
+        oc.execute()
+
+        oc.steps[0].start_bulk_api_query.assert_not_called()
+
     def test_add_dependency_tracks_dependencies(self):
         connection = Mock()
 
@@ -143,28 +225,34 @@ class test_ExtractOperation(unittest.TestCase):
         )
 
     def test_get_sobject_ids_for_reference_returns_correct_ids(self):
-        connection = Mock()
-
-        oc = amaxa.ExtractOperation(connection)
-        oc.file_store = MockFileStore()
-        oc.get_field_map = Mock(
-            return_value={"Lookup__c": {"referenceTo": ["Account", "Contact"]}}
-        )
-
-        oc.store_result(
-            "Account", {"Id": "001000000000000", "Name": "University of Caprica"}
-        )
-        oc.store_result("Contact", {"Id": "003000000000000", "Name": "Gaius Baltar"})
-        oc.store_result(
-            "Opportunity", {"Id": "006000000000000", "Name": "Defense Mainframe"}
-        )
-
-        self.assertEqual(
-            set(
-                [
-                    amaxa.SalesforceId("001000000000000"),
-                    amaxa.SalesforceId("003000000000000"),
-                ]
-            ),
-            oc.get_sobject_ids_for_reference("Account", "Lookup__c"),
-        )
+        for id_set_type in amaxa.IdSetType:
+            with self.subTest(id_set_type=id_set_type):
+                connection = Mock()
+
+                oc = amaxa.ExtractOperation(connection, id_set_type, 1)
+                oc.file_store = MockFileStore()
+                oc.get_field_map = Mock(
+                    return_value={"Lookup__c": {"referenceTo": ["Account", "Contact"]}}
+                )
+
+                oc.store_result(
+                    "Account",
+                    {"Id": "001000000000000", "Name": "University of Caprica"},
+                )
+                oc.store_result(
+                    "Contact", {"Id": "003000000000000", "Name": "Gaius Baltar"}
+                )
+                oc.store_result(
+                    "Opportunity",
+                    {"Id": "006000000000000", "Name": "Defense Mainframe"},
+                )
+
+                self.assertEqual(
+                    set(
+                        [
+                            amaxa.SalesforceId("001000000000000"),
+                            amaxa.SalesforceId("003000000000000"),
+                        ]
+                    ),
+                    oc.get_sobject_ids_for_reference("Account", "Lookup__c"),
+                )
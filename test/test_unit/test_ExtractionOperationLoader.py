@@ -507,7 +507,7 @@ class test_ExtractionOperationLoader(unittest.TestCase):
         self.assertIsNotNone(csv_file)
 
         dict_writer.assert_called_once_with()
-        self.assertEqual(["Id", "Name", "ParentId"], csv_file.fieldnames)
+        self.assertEqual(["Id", "Name", "ParentId"], csv_file.writer.fieldnames)
 
     @unittest.mock.patch("csv.DictWriter.writeheader")
     def test_load_extraction_operation_writes_correct_headers_with_mapper(
@@ -535,13 +535,13 @@ class test_ExtractionOperationLoader(unittest.TestCase):
         self.assertIsNotNone(csv_file)
 
         dict_writer.assert_called_once_with()
-        self.assertEqual(["Id", "ParentId", "Title"], csv_file.fieldnames)
+        self.assertEqual(["Id", "ParentId", "Title"], csv_file.writer.fieldnames)
 
     def test_load_extraction_populates_options(self):
         result = self._run_success_test(
             {
                 "version": 2,
-                "options": {"bulk-api-batch-size": 9000},
+                "options": {"bulk-api-batch-size": 9000, "id-set": "compact"},
                 "operation": [
                     {
                         "sobject": "Account",
@@ -560,6 +560,7 @@ class test_ExtractionOperationLoader(unittest.TestCase):
 
         self.assertEqual(9000, result.steps[0].get_option("bulk-api-batch-size"))
         self.assertEqual(10000, result.steps[1].get_option("bulk-api-batch-size"))
+        self.assertIs(amaxa.IdSet, result.create_id_set)
 
     def test_load_extraction_populates_default_options(self):
         result = self._run_success_test(
@@ -575,3 +576,4 @@ class test_ExtractionOperationLoader(unittest.TestCase):
             constants.OPTION_DEFAULTS["bulk-api-batch-size"],
             result.steps[0].get_option("bulk-api-batch-size"),
         )
+        self.assertIs(set, result.create_id_set)
@@ -69,6 +69,62 @@ class test_ExtractionStep(unittest.TestCase):
         )
         oc.add_dependency.assert_not_called()
 
+    def test_store_result_compiles_processor_once(self):
+        oc = amaxa.ExtractOperation(Mock())
+
+        oc.store_result = Mock()
+        oc.get_field_map = Mock(return_value={})
+        oc.get_sobject_list = Mock(return_value=["Account"])
+
+        step = amaxa.ExtractionStep("Account", amaxa.ExtractionScope.ALL_RECORDS, [])
+        oc.add_step(step)
+        step.initialize()
+        step.compile_result_processor = Mock(wraps=step.compile_result_processor)
+
+        step.store_result({"Id": "001000000000000"})
+        step.store_result({"Id": "001000000000001"})
+
+        step.compile_result_processor.assert_called_once_with()
+        self.assertEqual(2, oc.store_result.call_count)
+
+    def test_store_result_looks_up_key_prefixes_once(self):
+        oc = amaxa.ExtractOperation(Mock())
+
+        oc.store_result = Mock()
+        oc.add_dependency = Mock()
+        oc.get_field_map = Mock(
+            return_value={
+                "Lookup__c": {
+                    "name": "Lookup__c",
+                    "type": "reference",
+                    "referenceTo": ["Opportunity", "Account"],
+                }
+            }
+        )
+        oc.get_sobject_list = Mock(return_value=["Account", "Contact", "Opportunity"])
+        oc.get_sobject_name_for_id = Mock(return_value="Opportunity")
+
+        step = amaxa.ExtractionStep(
+            "Contact", amaxa.ExtractionScope.ALL_RECORDS, ["Lookup__c"]
+        )
+        oc.add_step(step)
+        step.initialize()
+
+        step.store_result({"Id": "003000000000000", "Lookup__c": "006000000000001"})
+        step.store_result({"Id": "003000000000001", "Lookup__c": "006000000000002"})
+
+        oc.get_sobject_name_for_id.assert_called_once_with("006000000000001")
+        oc.add_dependency.assert_has_calls(
+            [
+                unittest.mock.call(
+                    "Opportunity", amaxa.SalesforceId("006000000000001")
+                ),
+                unittest.mock.call(
+                    "Opportunity", amaxa.SalesforceId("006000000000002")
+                ),
+            ]
+        )
+
     def test_store_result_registers_self_lookup_dependencies(self):
         connection = Mock()
 
@@ -507,6 +563,52 @@ class test_ExtractionStep(unittest.TestCase):
         step.store_result.assert_any_call(retval[0])
         step.store_result.assert_any_call(retval[1])
 
+    def test_perform_bulk_api_pass_uses_started_query(self):
+        retval = [{"Id": "001000000000001"}, {"Id": "001000000000002"}]
+        connection = Mock(wraps=MockConnection(bulk_query_results=retval))
+
+        oc = amaxa.ExtractOperation(connection)
+
+        step = amaxa.ExtractionStep(
+            "Account", amaxa.ExtractionScope.ALL_RECORDS, ["Name"]
+        )
+        step.store_result = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        step.start_bulk_api_query()
+        connection.start_bulk_api_query.assert_called_once_with(
+            "Account", "SELECT Name FROM Account"
+        )
+
+        step.perform_bulk_api_pass("SELECT Name FROM Account")
+        connection.bulk_api_query.assert_not_called()
+        connection.get_bulk_api_query_results.assert_called_once_with(
+            step.bulk_api_query_batch,
+            [],
+            step.get_option("bulk-api-poll-interval"),
+        )
+        step.store_result.assert_any_call(retval[0])
+        step.store_result.assert_any_call(retval[1])
+
+    def test_abort_bulk_api_query(self):
+        connection = Mock(wraps=MockConnection())
+
+        oc = amaxa.ExtractOperation(connection)
+
+        step = amaxa.ExtractionStep(
+            "Account", amaxa.ExtractionScope.ALL_RECORDS, ["Name"]
+        )
+        oc.add_step(step)
+        step.initialize()
+
+        step.start_bulk_api_query()
+        batch = step.bulk_api_query_batch
+        step.abort_bulk_api_query()
+
+        connection.abort_bulk_api_query.assert_called_once_with(batch)
+        self.assertIsNone(step.bulk_api_query_batch)
+
     def test_resolve_registered_dependencies_loads_records(self):
         oc = Mock()
         id_set = set(
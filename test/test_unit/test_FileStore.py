@@ -1,4 +1,7 @@
+import sys
+import threading
 import unittest
+import unittest.mock
 from unittest.mock import Mock
 
 import amaxa
@@ -42,3 +45,72 @@ class test_FileStore(unittest.TestCase):
         f.close.assert_called_once_with()
         g.close.assert_called_once_with()
         h.close.assert_not_called()
+
+    @unittest.mock.patch("amaxa.constants.BUFFERED_WRITE_ROWS", 2)
+    def test_FileStore_writes_buffered_csvs_on_close(self):
+        fs = amaxa.FileStore()
+        f = Mock()
+        writer = Mock()
+        fs.set_file("Account", amaxa.FileType.OUTPUT, f)
+        fs.set_csv("Account", amaxa.FileType.OUTPUT, writer, buffered=True)
+
+        csv_file = fs.get_csv("Account", amaxa.FileType.OUTPUT)
+        for i in range(5):
+            csv_file.writerow({"Id": i})
+
+        fs.close()
+
+        writer.writerows.assert_has_calls(
+            [
+                unittest.mock.call([{"Id": 0}, {"Id": 1}]),
+                unittest.mock.call([{"Id": 2}, {"Id": 3}]),
+                unittest.mock.call([{"Id": 4}]),
+            ]
+        )
+        f.close.assert_called_once_with()
+
+    def test_FileStore_raises_buffered_write_errors(self):
+        fs = amaxa.FileStore()
+        f = Mock()
+        writer = Mock()
+        writer.writerows.side_effect = OSError("No space left on device")
+        fs.set_file("Account", amaxa.FileType.OUTPUT, f)
+        fs.set_csv("Account", amaxa.FileType.OUTPUT, writer, buffered=True)
+
+        fs.get_csv("Account", amaxa.FileType.OUTPUT).writerow({"Id": 0})
+
+        with self.assertRaises(OSError):
+            fs.close()
+
+        f.close.assert_called_once_with()
+
+    @unittest.mock.patch("amaxa.constants.WRITE_QUEUE_SIZE", 0)
+    def test_FileStore_shares_writer_thread_between_threads(self):
+        fs = amaxa.FileStore()
+        writers = [Mock() for _ in range(8)]
+        barrier = threading.Barrier(len(writers))
+
+        def write(writer):
+            barrier.wait()
+            for i in range(100):
+                fs.write_rows(writer, [{"Id": i}])
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=write, args=(w,)) for w in writers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        # Without a single writer thread, flush() may never return.
+        flush = threading.Thread(target=fs.flush, daemon=True)
+        flush.start()
+        flush.join(10)
+        self.assertFalse(flush.is_alive())
+
+        for writer in writers:
+            self.assertEqual(100, writer.writerows.call_count)
@@ -0,0 +1,480 @@
+import gc
+import os
+import random
+import sys
+import threading
+import tracemalloc
+import unittest
+import unittest.mock
+
+import amaxa
+
+
+class IdMapTests(object):
+    def test_maps_ids(self):
+        id_map = self.get_id_map()
+
+        id_map[amaxa.SalesforceId("001000000000000")] = amaxa.SalesforceId(
+            "001000000000001"
+        )
+
+        self.assertEqual(
+            amaxa.SalesforceId("001000000000001"),
+            id_map[amaxa.SalesforceId("001000000000000")],
+        )
+        self.assertEqual(
+            amaxa.SalesforceId("001000000000001"), id_map["001000000000000AAA"]
+        )
+        self.assertIsNone(id_map.get(amaxa.SalesforceId("001000000000002")))
+        self.assertEqual(1, len(id_map))
+
+    def test_iterates_items(self):
+        id_map = self.get_id_map()
+        expected = {
+            amaxa.SalesforceId("001000000000000"): amaxa.SalesforceId(
+                "001000000000001"
+            ),
+            amaxa.SalesforceId("001000000000002"): amaxa.SalesforceId(
+                "001000000000003"
+            ),
+        }
+
+        id_map.update(expected)
+
+        self.assertEqual(expected, dict(id_map.items()))
+        self.assertEqual(expected, id_map)
+
+    def test_deletes_ids(self):
+        id_map = self.get_id_map()
+        id_map[amaxa.SalesforceId("001000000000000")] = amaxa.SalesforceId(
+            "001000000000001"
+        )
+
+        del id_map[amaxa.SalesforceId("001000000000000")]
+
+        self.assertNotIn(amaxa.SalesforceId("001000000000000"), id_map)
+        with self.assertRaises(KeyError):
+            del id_map[amaxa.SalesforceId("001000000000000")]
+
+
+class test_CompactIdMap(IdMapTests, unittest.TestCase):
+    def get_id_map(self):
+        return amaxa.CompactIdMap()
+
+
+class test_CompactIdMap_packing(unittest.TestCase):
+    @unittest.mock.patch("amaxa.constants.PACKED_ID_MERGE_SIZE", 2)
+    def test_maps_ids_across_merges(self):
+        id_map = amaxa.CompactIdMap()
+        expected = {
+            amaxa.SalesforceId(f"001000000aB{i:04}"): amaxa.SalesforceId(
+                f"003000000Cd{i:04}"
+            )
+            for i in range(20)
+        }
+
+        for k, v in reversed(expected.items()):
+            id_map[k] = v
+        id_map[amaxa.SalesforceId("001000000aB0005")] = amaxa.SalesforceId(
+            "003000000000000"
+        )
+        expected[amaxa.SalesforceId("001000000aB0005")] = amaxa.SalesforceId(
+            "003000000000000"
+        )
+
+        self.assertEqual(expected, dict(id_map.items()))
+        self.assertEqual(20, len(id_map))
+
+    @unittest.mock.patch("amaxa.constants.PACKED_ID_MERGE_SIZE", 2)
+    def test_updates_id_strings(self):
+        id_map = amaxa.CompactIdMap()
+        id_map[amaxa.SalesforceId("001000000aB0001")] = amaxa.SalesforceId(
+            "003000000000000"
+        )
+        pairs = [
+            (
+                str(amaxa.SalesforceId(f"001000000aB{i:04}")),
+                str(amaxa.SalesforceId(f"003000000Cd{i:04}")),
+            )
+            for i in range(10)
+        ]
+
+        id_map.update_id_strings(pairs)
+
+        self.assertEqual(
+            {amaxa.SalesforceId(k): amaxa.SalesforceId(v) for k, v in pairs},
+            dict(id_map.items()),
+        )
+        self.assertEqual(10, len(id_map))
+
+    def test_memory_does_not_grow_with_intern_table(self):
+        # Ids rebuilt from their packed form aren't interned, so reading the map
+        # doesn't leave a full-size SalesforceId alive for each entry.
+        id_map = amaxa.CompactIdMap()
+        id_map.update_id_strings(
+            (
+                str(amaxa.SalesforceId(f"001000000aB{i:04}")),
+                str(amaxa.SalesforceId(f"003000000Cd{i:04}")),
+            )
+            for i in range(5000)
+        )
+
+        with unittest.mock.patch.dict("amaxa.amaxa._interned_ids", clear=True):
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+            before = tracemalloc.get_traced_memory()[0]
+
+            mismatched = [k for k, v in id_map.items() if id_map[k] != v]
+            gc.collect()
+            grown = tracemalloc.get_traced_memory()[0] - before
+            interned = len(amaxa.amaxa._interned_ids)
+
+        self.assertEqual([], mismatched)
+        self.assertEqual(0, interned)
+        # 10,000 interned Ids would hold well over 500KB.
+        self.assertLess(grown, 50000)
+
+    @unittest.mock.patch("amaxa.constants.PACKED_ID_MERGE_SIZE", 2)
+    def test_reads_consistently_while_another_thread_adds_ids(self):
+        # The load pipeline reads the map on one thread while results are registered
+        # on another. Entries added in random order force frequent merges.
+        id_map = amaxa.CompactIdMap()
+        numbers = list(range(10000))
+        random.Random(0).shuffle(numbers)
+        added = []
+        errors = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set() or added:
+                for i in added[-50:]:
+                    try:
+                        value = id_map[amaxa.SalesforceId(f"001000000aB{i:04}")]
+                    except Exception as e:
+                        errors.append(e)
+                        return
+                    if value != amaxa.SalesforceId(f"003000000Cd{i:04}"):
+                        errors.append(value)
+                        return
+                if done.is_set():
+                    return
+
+        # Switch threads as often as possible, to interleave reads with merges.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        for i in numbers:
+            id_map[amaxa.SalesforceId(f"001000000aB{i:04}")] = amaxa.SalesforceId(
+                f"003000000Cd{i:04}"
+            )
+            added.append(i)
+        done.set()
+        reader.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(10000, len(id_map))
+
+
+class test_IdSet(unittest.TestCase):
+    def test_adds_and_discards_ids(self):
+        id_set = amaxa.IdSet()
+
+        id_set.add(amaxa.SalesforceId("001000000000000"))
+        id_set.add("003000000aBcDeF")
+        id_set.add(amaxa.SalesforceId("001000000000000"))
+
+        self.assertIn("001000000000000AAA", id_set)
+        self.assertIn(amaxa.SalesforceId("003000000aBcDeF"), id_set)
+        self.assertNotIn(amaxa.SalesforceId("001000000000001"), id_set)
+        self.assertEqual(2, len(id_set))
+
+        id_set.discard(amaxa.SalesforceId("001000000000000"))
+        id_set.discard(amaxa.SalesforceId("001000000000001"))
+
+        self.assertEqual({amaxa.SalesforceId("003000000aBcDeF")}, set(id_set))
+
+    @unittest.mock.patch("amaxa.constants.PACKED_ID_MERGE_SIZE", 2)
+    def test_iterates_ids_across_merges(self):
+        expected = {amaxa.SalesforceId(f"001000000aB{i:04}") for i in range(20)}
+
+        id_set = amaxa.IdSet(reversed(sorted(expected)))
+
+        self.assertEqual(expected, set(id_set))
+        self.assertTrue(all(i in id_set for i in expected))
+
+    def test_set_operations(self):
+        first = amaxa.IdSet(
+            [
+                amaxa.SalesforceId("001000000000000"),
+                amaxa.SalesforceId("003000000000000"),
+            ]
+        )
+        second = amaxa.IdSet(
+            [
+                amaxa.SalesforceId("001000000000000"),
+                amaxa.SalesforceId("001000000000001"),
+            ]
+        )
+
+        self.assertEqual(
+            {
+                amaxa.SalesforceId("001000000000000"),
+                amaxa.SalesforceId("001000000000001"),
+                amaxa.SalesforceId("003000000000000"),
+            },
+            set(first | second),
+        )
+        self.assertEqual(
+            {amaxa.SalesforceId("001000000000000")},
+            set(first.intersection({amaxa.SalesforceId("001000000000000")})),
+        )
+        self.assertEqual({amaxa.SalesforceId("003000000000000")}, set(first - second))
+
+        copy = first.copy()
+        copy |= second
+
+        self.assertEqual(3, len(copy))
+        self.assertEqual(2, len(first))
+
+    @unittest.mock.patch("amaxa.constants.PACKED_ID_MERGE_SIZE", 4)
+    def test_unions_ids_across_groups(self):
+        first_ids = {
+            amaxa.SalesforceId(f"{prefix}000000aB{i:04}")
+            for prefix in ["001", "003", "005"]
+            for i in range(0, 30, 2)
+        }
+        second_ids = {
+            amaxa.SalesforceId(f"{prefix}000000aB{i:04}")
+            for prefix in ["003", "005", "006"]
+            for i in range(0, 30, 3)
+        }
+        # Leave some Ids of each set pending, rather than merged into its arrays.
+        first = amaxa.IdSet(sorted(first_ids, reverse=True))
+        second = amaxa.IdSet(sorted(second_ids, reverse=True))
+
+        union = first | second
+
+        self.assertEqual(first_ids | second_ids, set(union))
+        self.assertEqual(len(first_ids | second_ids), len(union))
+        self.assertTrue(all(i in union for i in first_ids | second_ids))
+        self.assertEqual(first_ids, set(first))
+        self.assertEqual(first_ids & second_ids, set(union & second & first))
+        self.assertEqual(first_ids - second_ids, set(union - second))
+
+        first |= second
+
+        self.assertEqual(first_ids | second_ids, set(first))
+        self.assertEqual(len(first_ids | second_ids), len(first))
+
+
+class test_DiskIdSet(unittest.TestCase):
+    def setUp(self):
+        self.store = amaxa.DiskIdSetStore(memory_limit=4)
+        self.addCleanup(self.store.close)
+
+    def test_spills_least_recently_used_sets(self):
+        first = self.store.create()
+        second = self.store.create()
+        first_ids = {amaxa.SalesforceId(f"00100000000000{i}") for i in range(3)}
+        second_ids = {amaxa.SalesforceId(f"00300000000000{i}") for i in range(2)}
+
+        for i in first_ids:
+            first.add(i)
+        for i in second_ids:
+            second.add(i)
+
+        self.assertEqual(set(), first.memory)
+        self.assertEqual(3, first.spilled)
+        self.assertEqual(second_ids, second.memory)
+        self.assertEqual(2, self.store.in_memory)
+
+        self.assertEqual(3, len(first))
+        self.assertEqual(first_ids, set(first))
+        self.assertIn("001000000000000AAA", first)
+        self.assertNotIn(amaxa.SalesforceId("001000000000009"), first)
+
+        first.add(amaxa.SalesforceId("001000000000000"))
+        self.assertEqual(3, len(first))
+
+        first.discard(amaxa.SalesforceId("001000000000000"))
+        self.assertEqual(2, len(first))
+        self.assertNotIn(amaxa.SalesforceId("001000000000000"), first)
+
+    @unittest.mock.patch("amaxa.constants.ID_SET_READ_CHUNK_SIZE", 2)
+    def test_copies_and_combines_spilled_sets(self):
+        first = self.store.create(
+            amaxa.SalesforceId(f"00100000000000{i}") for i in range(6)
+        )
+        second = self.store.create([amaxa.SalesforceId("003000000000000")])
+
+        union = self.store.create()
+        union |= first
+        union |= second
+
+        self.assertEqual(set(first) | set(second), set(union))
+        self.assertEqual(7, len(union))
+        self.assertEqual(set(first), set(first.copy()))
+        self.assertEqual(
+            {amaxa.SalesforceId("001000000000001")},
+            set(first.intersection({amaxa.SalesforceId("001000000000001")})),
+        )
+
+    def test_combines_spilled_set_with_overlapping_set_in_memory(self):
+        spilled = self.store.create(
+            amaxa.SalesforceId(f"00100000000000{i}") for i in range(5)
+        )
+        in_memory = self.store.create(
+            amaxa.SalesforceId(f"00100000000000{i}") for i in range(3, 7)
+        )
+        self.assertGreater(spilled.spilled, 0)
+        self.assertEqual(0, in_memory.spilled)
+
+        in_memory |= spilled
+
+        self.assertEqual(7, len(in_memory))
+        self.assertEqual(
+            {amaxa.SalesforceId(f"00100000000000{i}") for i in range(7)},
+            set(in_memory),
+        )
+
+    @unittest.mock.patch("amaxa.constants.ID_SET_READ_CHUNK_SIZE", 2)
+    def test_iterates_each_id_once_when_spilled_during_iteration(self):
+        id_set = self.store.create(
+            amaxa.SalesforceId(f"00100000000000{i}") for i in range(6)
+        )
+        self.assertGreater(id_set.spilled, 0)
+        self.assertGreater(len(id_set.memory), 0)
+
+        ids = []
+        for id in id_set:
+            if not ids:
+                id_set.spill()
+            ids.append(id)
+
+        self.assertEqual(
+            sorted(amaxa.SalesforceId(f"00100000000000{i}") for i in range(6)),
+            sorted(ids),
+        )
+
+    @unittest.mock.patch("amaxa.constants.ID_SET_READ_CHUNK_SIZE", 2)
+    def test_spills_ids_in_memory_before_iterating_more_than_a_chunk(self):
+        self.store.memory_limit = 10
+        expected = {amaxa.SalesforceId(f"00100000000000{i}") for i in range(3)}
+        id_set = self.store.create(expected)
+        self.assertEqual(0, id_set.spilled)
+
+        self.assertEqual(sorted(expected), sorted(id_set))
+        self.assertEqual(set(), id_set.memory)
+        self.assertEqual(3, id_set.spilled)
+        self.assertEqual(0, self.store.in_memory)
+
+        small = self.store.create([amaxa.SalesforceId("003000000000000")])
+
+        self.assertEqual([amaxa.SalesforceId("003000000000000")], list(small))
+        self.assertEqual(0, small.spilled)
+
+    def test_drops_sets_when_collected(self):
+        id_set = self.store.create(
+            amaxa.SalesforceId(f"00100000000000{i}") for i in range(6)
+        )
+
+        del id_set
+        self.assertEqual(1, len(self.store.released))
+
+        # Rows are deleted on the next use of the store, rather than during collection.
+        self.store.create()
+
+        self.assertEqual(0, self.store.in_memory)
+        self.assertEqual(
+            0, self.store.db.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+        )
+
+
+class test_DiskIdMap(IdMapTests, unittest.TestCase):
+    def get_id_map(self):
+        id_map = amaxa.DiskIdMap(cache_size=1, write_batch_size=2)
+        self.addCleanup(id_map.close)
+
+        return id_map
+
+    def test_reads_entries_evicted_from_cache(self):
+        id_map = self.get_id_map()
+
+        for i in range(5):
+            id_map[amaxa.SalesforceId(f"00100000000000{i}")] = amaxa.SalesforceId(
+                f"00100000000001{i}"
+            )
+
+        for i in range(5):
+            self.assertEqual(
+                amaxa.SalesforceId(f"00100000000001{i}"),
+                id_map[amaxa.SalesforceId(f"00100000000000{i}")],
+            )
+
+    def test_iterates_snapshot_while_another_thread_adds_ids(self):
+        id_map = self.get_id_map()
+        expected = {
+            amaxa.SalesforceId(f"00100000000000{i}"): amaxa.SalesforceId(
+                f"00100000000001{i}"
+            )
+            for i in range(5)
+        }
+        id_map.update(expected)
+
+        items = id_map.items()
+        first = next(items)
+        writer = threading.Thread(
+            target=id_map.update_id_strings,
+            args=(
+                [
+                    (
+                        str(amaxa.SalesforceId(f"00300000000000{i}")),
+                        str(amaxa.SalesforceId(f"00300000000001{i}")),
+                    )
+                    for i in range(5)
+                ],
+            ),
+        )
+        writer.start()
+        writer.join()
+
+        self.assertEqual(expected, dict([first, *items]))
+        self.assertEqual(10, len(id_map))
+
+
+class test_LoadOperation_id_maps(unittest.TestCase):
+    def test_creates_id_map_of_type(self):
+        self.assertIsInstance(
+            amaxa.LoadOperation(None, amaxa.IdMapType.COMPACT).global_id_map,
+            amaxa.CompactIdMap,
+        )
+        self.assertIsInstance(amaxa.LoadOperation(None).global_id_map, dict)
+
+
+class test_ExtractOperation_id_sets(unittest.TestCase):
+    def test_creates_id_sets_of_type(self):
+        operation = amaxa.ExtractOperation(None, amaxa.IdSetType.COMPACT)
+
+        operation.add_dependency("Account", amaxa.SalesforceId("001000000000000"))
+
+        self.assertIsInstance(operation.get_dependencies("Account"), amaxa.IdSet)
+
+    def test_creates_disk_id_sets(self):
+        operation = amaxa.ExtractOperation(None, amaxa.IdSetType.DISK, 10)
+
+        operation.add_dependency("Account", amaxa.SalesforceId("001000000000000"))
+
+        self.assertIsInstance(operation.get_dependencies("Account"), amaxa.DiskIdSet)
+        self.assertEqual(10, operation.create_id_set.__self__.memory_limit)
+
+    def test_run_removes_disk_id_sets(self):
+        operation = amaxa.ExtractOperation(None, amaxa.IdSetType.DISK)
+        operation.file_store = unittest.mock.Mock()
+        operation.execute = unittest.mock.Mock(return_value=-1)
+        directory = operation.id_set_store.directory.name
+
+        self.assertEqual(-1, operation.run())
+        self.assertFalse(os.path.exists(directory))
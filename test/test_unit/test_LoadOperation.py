@@ -1,9 +1,11 @@
+import threading
 import unittest
 from unittest.mock import Mock
 
 import amaxa
 from amaxa import constants
 
+from .MockConnection import MockConnection
 from .MockFileStore import MockFileStore
 
 
@@ -57,12 +59,35 @@ class test_LoadOperation(unittest.TestCase):
 
         self.assertEqual(0, op.execute())
 
+        first_step.reattach_posted_batches.assert_called_once_with()
         first_step.execute.assert_called_once_with()
         first_step.execute_dependent_updates.assert_called_once_with()
 
+        second_step.reattach_posted_batches.assert_called_once_with()
         second_step.execute.assert_called_once_with()
         second_step.execute_dependent_updates.assert_called_once_with()
 
+    def test_execute_stops_after_error_reattaching_posted_batches(self):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+
+        first_step = Mock(sobjectname="Account")
+        second_step = Mock(sobjectname="Contact")
+        second_step.reattach_posted_batches.side_effect = lambda: op.register_error(
+            "Contact", "003000000000000", "err"
+        )
+
+        op.add_step(first_step)
+        op.add_step(second_step)
+
+        self.assertEqual(-1, op.execute())
+
+        first_step.reattach_posted_batches.assert_called_once_with()
+        second_step.reattach_posted_batches.assert_called_once_with()
+        first_step.execute.assert_not_called()
+        second_step.execute.assert_not_called()
+
     def test_execute_stops_after_first_error_in_step_execute(self):
         connection = Mock()
         op = amaxa.LoadOperation(connection)
@@ -107,6 +132,16 @@ class test_LoadOperation(unittest.TestCase):
         second_step.execute.assert_called_once_with()
         second_step.execute_dependent_updates.assert_not_called()
 
+    def test_register_posted_batch_writes_journal(self):
+        op = amaxa.LoadOperation(Mock())
+        op.journal = Mock()
+
+        op.register_posted_batch("Account", "job", "batch", ["001000000000000AAA"])
+
+        op.journal.add_batch.assert_called_once_with(
+            "Account", "job", "batch", ["001000000000000AAA"]
+        )
+
     def test_register_error_logs_to_result_file(self):
         connection = Mock()
         first_step = Mock()
@@ -140,8 +175,116 @@ class test_LoadOperation(unittest.TestCase):
 
         self.assertEqual(0, op.execute())
 
+        first_step.reattach_posted_batches.assert_not_called()
         first_step.execute.assert_not_called()
         second_step.execute.assert_not_called()
 
         first_step.execute_dependent_updates.assert_called_once_with()
         second_step.execute_dependent_updates.assert_called_once_with()
+
+    def test_get_step_dependencies(self):
+        op = amaxa.LoadOperation(MockConnection())
+        account_step = amaxa.LoadStep("Account", ["Name", "ParentId"])
+        contact_step = amaxa.LoadStep("Contact", ["LastName", "AccountId"])
+        opportunity_step = amaxa.LoadStep("Opportunity", ["Name"])
+
+        op.add_step(account_step)
+        op.add_step(contact_step)
+        op.add_step(opportunity_step)
+        op.initialize()
+
+        self.assertEqual(
+            {
+                account_step: set(),
+                contact_step: {account_step},
+                opportunity_step: set(),
+            },
+            op.get_step_dependencies(),
+        )
+
+    def test_get_step_dependencies_ignores_dependent_lookups(self):
+        op = amaxa.LoadOperation(MockConnection())
+        contact_step = amaxa.LoadStep("Contact", ["LastName", "AccountId"])
+        account_step = amaxa.LoadStep("Account", ["Name"])
+
+        op.add_step(contact_step)
+        op.add_step(account_step)
+        op.initialize()
+
+        self.assertEqual({"AccountId"}, contact_step.dependent_lookups)
+        self.assertEqual(
+            {contact_step: set(), account_step: set()}, op.get_step_dependencies()
+        )
+
+    def test_execute_runs_dependent_updates_concurrently(self):
+        connection = Mock()
+        first_step = Mock(sobjectname="Account")
+        second_step = Mock(sobjectname="Contact")
+
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.max_concurrent_steps = 2
+        op.add_step(first_step)
+        op.add_step(second_step)
+        op.get_step_dependencies = Mock(
+            return_value={first_step: set(), second_step: {first_step}}
+        )
+
+        # Inserts are complete, so each step's dependent updates may run
+        # while the other's do.
+        barrier = threading.Barrier(2, timeout=5)
+        first_step.execute_dependent_updates.side_effect = lambda: barrier.wait()
+        second_step.execute_dependent_updates.side_effect = lambda: barrier.wait()
+
+        self.assertEqual(0, op.execute())
+
+        first_step.execute.assert_called_once_with()
+        second_step.execute.assert_called_once_with()
+
+    def test_execute_runs_independent_steps_concurrently(self):
+        connection = Mock()
+        first_step = Mock(sobjectname="Product2")
+        second_step = Mock(sobjectname="Campaign")
+
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.max_concurrent_steps = 2
+        op.add_step(first_step)
+        op.add_step(second_step)
+        op.get_step_dependencies = Mock(
+            return_value={first_step: set(), second_step: set()}
+        )
+
+        # Each step waits for the other to start.
+        barrier = threading.Barrier(2, timeout=5)
+        first_step.execute.side_effect = lambda: barrier.wait()
+        second_step.execute.side_effect = lambda: barrier.wait()
+
+        self.assertEqual(0, op.execute())
+
+        first_step.execute_dependent_updates.assert_called_once_with()
+        second_step.execute_dependent_updates.assert_called_once_with()
+
+    def test_execute_does_not_start_dependents_of_failed_step(self):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.max_concurrent_steps = 2
+
+        first_step = Mock(sobjectname="Account")
+        second_step = Mock(sobjectname="Contact")
+        first_step.execute.side_effect = lambda: op.register_error(
+            "Account", "001000000000000", "err"
+        )
+
+        op.add_step(first_step)
+        op.add_step(second_step)
+        op.get_step_dependencies = Mock(
+            return_value={first_step: set(), second_step: {first_step}}
+        )
+
+        self.assertEqual(-1, op.execute())
+
+        first_step.execute.assert_called_once_with()
+        second_step.execute.assert_not_called()
+        first_step.execute_dependent_updates.assert_not_called()
@@ -685,7 +685,12 @@ class test_LoadOperationLoader(unittest.TestCase):
         result = self._run_success_test(
             {
                 "version": 2,
-                "options": {"bulk-api-batch-size": 9000},
+                "options": {
+                    "bulk-api-batch-size": 9000,
+                    "max-concurrent-steps": 4,
+                    "id-map": "compact",
+                    "state-format": "binary",
+                },
                 "operation": [
                     {
                         "sobject": "Account",
@@ -704,6 +709,9 @@ class test_LoadOperationLoader(unittest.TestCase):
 
         self.assertEqual(9000, result.steps[0].get_option("bulk-api-batch-size"))
         self.assertEqual(10000, result.steps[1].get_option("bulk-api-batch-size"))
+        self.assertEqual(4, result.max_concurrent_steps)
+        self.assertIsInstance(result.global_id_map, amaxa.CompactIdMap)
+        self.assertEqual(amaxa.StateFormat.BINARY, result.state_format)
 
     def test_LoadOperationLoader_populates_default_options(self):
         result = self._run_success_test(
@@ -719,3 +727,143 @@ class test_LoadOperationLoader(unittest.TestCase):
             constants.OPTION_DEFAULTS["bulk-api-batch-size"],
             result.steps[0].get_option("bulk-api-batch-size"),
         )
+        self.assertEqual(
+            constants.OPTION_DEFAULTS["max-concurrent-steps"],
+            result.max_concurrent_steps,
+        )
+        self.assertEqual(amaxa.StateFormat.TEXT, result.state_format)
+
+    def test_LoadOperationLoader_validates_parent_grouping_field(self):
+        ex = {
+            "version": 2,
+            "operation": [
+                {
+                    "sobject": "Account",
+                    "fields": ["Name"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+                {
+                    "sobject": "Contact",
+                    "options": {"bulk-api-group-by-parent": "LastName"},
+                    "fields": ["LastName", "AccountId"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+            ],
+        }
+
+        self._run_error_validating_test(
+            ex,
+            [
+                "Field Contact.LastName is specified for bulk-api-group-by-parent, "
+                "but is not a lookup to an sObject loaded earlier in the operation."
+            ],
+        )
+
+    def test_LoadOperationLoader_orders_steps(self):
+        ex = {
+            "version": 2,
+            "options": {"order-steps": True},
+            "operation": [
+                {
+                    "sobject": "Contact",
+                    "fields": ["LastName", "AccountId"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+                {
+                    "sobject": "Account",
+                    "fields": ["Name"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+            ],
+        }
+
+        context = loader.LoadOperationLoader(ex, MockConnection())
+        self._mock_execute(context, None)
+
+        self.assertEqual([], context.errors)
+        self.assertEqual(["Account", "Contact"], context.result.get_sobject_list())
+        self.assertEqual(
+            ["Account", "Contact"], [e["sobject"] for e in context.input["operation"]]
+        )
+        self.assertEqual(set(), context.result.steps[1].dependent_lookups)
+        self.assertEqual({"AccountId"}, context.result.steps[1].descendent_lookups)
+
+    @unittest.mock.patch("logging.getLogger")
+    def test_LoadOperationLoader_makes_only_lookups_in_cycles_dependent(self, logger):
+        amaxa_logger = Mock()
+        logger.return_value = amaxa_logger
+
+        # A looks up B, and B and C look up each other. Loading A last leaves only
+        # one lookup in the B-C cycle dependent.
+        context = loader.LoadOperationLoader({}, MockConnection())
+        context.result = amaxa.LoadOperation(MockConnection())
+        context.input = {"operation": []}
+        for sobject in ["A", "B", "C"]:
+            context.result.add_step(amaxa.LoadStep(sobject, set()))
+            context.input["operation"].append({"sobject": sobject})
+        context._get_step_lookups = Mock(
+            return_value={
+                "A": [("B__c", "B", 1)],
+                "B": [("C__c", "C", constants.REQUIRED_LOOKUP_WEIGHT)],
+                "C": [("B__c", "B", 1)],
+            }
+        )
+
+        context._plan_step_order(True)
+
+        self.assertEqual(["C", "B", "A"], context.result.get_sobject_list())
+        self.assertEqual(
+            ["C", "B", "A"], [e["sobject"] for e in context.input["operation"]]
+        )
+        amaxa_logger.info.assert_any_call(
+            "Field %s.%s remains a dependent lookup, because %s must be loaded "
+            "after %s: lookups between them form a cycle.",
+            "C",
+            "B__c",
+            "B",
+            "C",
+        )
+        self.assertEqual(2, amaxa_logger.info.call_count)
+
+    @unittest.mock.patch("logging.getLogger")
+    def test_LoadOperationLoader_warns_on_costly_step_order(self, logger):
+        amaxa_logger = Mock()
+        logger.return_value = amaxa_logger
+
+        ex = {
+            "version": 1,
+            "operation": [
+                {
+                    "sobject": "Contact",
+                    "fields": ["LastName", "AccountId"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+                {
+                    "sobject": "Account",
+                    "fields": ["Name"],
+                    "extract": {"all": True},
+                    "input-validation": "none",
+                },
+            ],
+        }
+
+        result = self._run_success_test(ex)
+
+        self.assertEqual(["Contact", "Account"], result.get_sobject_list())
+        amaxa_logger.warning.assert_called_once_with(
+            "The order of steps makes %d lookup%s (%s) dependent, requiring update passes "
+            "over %d sObject%s. Loading in the order %s would require update passes over %d. "
+            "Set the order-steps option to reorder steps automatically.",
+            1,
+            "",
+            "Contact.AccountId",
+            1,
+            "",
+            "Account, Contact",
+            0,
+        )
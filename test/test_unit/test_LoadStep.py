@@ -1,16 +1,32 @@
+import csv
+import os
 import pytest
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from salesforce_bulk import UploadResult
 
 import amaxa
-from amaxa import constants
+from amaxa import constants, formats
 
 from .MockConnection import MockConnection
 from .MockFileStore import MockFileStore
 
 
+def mock_bulk_jobs(*job_results):
+    # Returns a mock Bulk API call that consumes the records for each job
+    # (storing them in `jobs`) and returns the next set of results.
+    jobs = []
+    results = iter(job_results)
+
+    def bulk_api_call(sobject, records, *args):
+        jobs.append(list(records))
+        return next(results)
+
+    return Mock(side_effect=bulk_api_call), jobs
+
+
 class test_LoadStep(unittest.TestCase):
     def test_stores_lookup_behaviors(self):
         load_step = amaxa.LoadStep("Account", ["Name", "ParentId"])
@@ -193,6 +209,82 @@ class test_LoadStep(unittest.TestCase):
 
         assert load_step.primitivize({"Address__c": "foo"})["Address__c"] is None
 
+    def test_record_preparer_matches_individual_passes(self):
+        connection = MockConnection()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000000"),
+            amaxa.SalesforceId("001000000000001"),
+        )
+        op.mappers["Account"] = Mock()
+        op.mappers["Account"].transform_record = Mock(
+            side_effect=lambda x: {**x, "Name": x["Name"].upper()}
+        )
+
+        load_step = amaxa.LoadStep(
+            "Account", ["Name", "ParentId", "IsDeleted", "Description"]
+        )
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.descendent_lookups = set(["ParentId"])
+        load_step.self_lookups = set()
+        load_step.dependent_lookups = set()
+
+        record = {
+            "Id": "001000000000002",
+            "Name": "Test",
+            "ParentId": "001000000000000",
+            "IsDeleted": "no",
+            "Description": "",
+            "Excess__c": "x",
+        }
+
+        self.assertEqual(
+            load_step.primitivize(
+                load_step.populate_lookups(
+                    load_step.clean_dependent_lookups(
+                        load_step.transform_record(record)
+                    ),
+                    load_step.descendent_lookups,
+                    record["Id"],
+                )
+            ),
+            load_step.get_record_preparer()(record, record["Id"]),
+        )
+        self.assertEqual(
+            {
+                "Name": "TEST",
+                "ParentId": str(amaxa.SalesforceId("001000000000001")),
+                "IsDeleted": "false",
+                "Description": None,
+            },
+            load_step.get_record_preparer()(record, record["Id"]),
+        )
+
+    def test_record_preparer_cleans_dependent_lookups(self):
+        connection = MockConnection()
+        op = amaxa.LoadOperation(connection)
+
+        load_step = amaxa.LoadStep("Account", ["Name", "ParentId"])
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.self_lookups = set(["ParentId"])
+
+        record = {"Name": "Test", "ParentId": "001000000000000"}
+
+        self.assertEqual(
+            {"Name": "Test"},
+            load_step.get_record_preparer()(record, "001000000000002"),
+        )
+        self.assertEqual(
+            {"Name": "Test", "ParentId": "001000000000000"},
+            load_step.get_record_preparer(frozenset(["ParentId"]))(
+                record, "001000000000002"
+            ),
+        )
+
     def test_transform_records_calls_context_mapper(self):
         connection = Mock()
         op = amaxa.LoadOperation(connection)
@@ -292,6 +384,31 @@ class test_LoadStep(unittest.TestCase):
             ),
         )
 
+    def test_execute_reads_only_columns_in_field_scope(self):
+        record_list = [
+            {"Title": "Test", "Id": "001000000000000", "Industry": "Defense"},
+        ]
+        connection = MockConnection(
+            bulk_insert_results=[UploadResult("001000000000002", True, True, "")]
+        )
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.mappers["Account"] = amaxa.DataMapper({"Title": "Name"})
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+
+        load_step.initialize()
+
+        self.assertEqual(
+            [{"Title": "Test", "Id": "001000000000000"}], list(load_step.read_input())
+        )
+
+        load_step.execute()
+
+        self.assertEqual([{"Name": "Test"}], connection.inserted_records)
+
     def test_execute_transforms_and_loads_records_without_lookups(self):
         record_list = [
             {"Name": "Test", "Id": "001000000000000"},
@@ -310,11 +427,10 @@ class test_LoadStep(unittest.TestCase):
         op.file_store.records["Account"] = record_list
         op.mappers["Account"] = Mock()
         op.mappers["Account"].transform_record = Mock(side_effect=lambda x: x)
+        op.mappers["Account"].transform_key = Mock(side_effect=lambda x: x)
 
         load_step = amaxa.LoadStep("Account", ["Name"])
         op.add_step(load_step)
-        load_step.primitivize = Mock(side_effect=lambda x: x)
-        load_step.populate_lookups = Mock(side_effect=lambda x, y, z: x)
 
         load_step.initialize()
         load_step.execute()
@@ -322,24 +438,16 @@ class test_LoadStep(unittest.TestCase):
         op.mappers["Account"].transform_record.assert_has_calls(
             [unittest.mock.call(x) for x in record_list]
         )
-        load_step.primitivize.assert_has_calls(
-            [unittest.mock.call(x) for x in clean_record_list]
-        )
-        load_step.populate_lookups.assert_has_calls(
-            [
-                unittest.mock.call(x, set(), y["Id"])
-                for (x, y) in zip(clean_record_list, record_list)
-            ]
-        )
 
         op.connection.bulk_api_insert.assert_called_once_with(
             "Account",
-            clean_record_list,
+            unittest.mock.ANY,
             load_step.get_option("bulk-api-timeout"),
             load_step.get_option("bulk-api-poll-interval"),
             load_step.get_option("bulk-api-batch-size"),
             load_step.get_option("bulk-api-mode"),
         )
+        self.assertEqual(clean_record_list, connection.inserted_records)
         op.register_new_id.assert_has_calls(
             [
                 unittest.mock.call(
@@ -389,10 +497,10 @@ class test_LoadStep(unittest.TestCase):
         op.file_store.records["Account"] = record_list
         op.mappers["Account"] = Mock()
         op.mappers["Account"].transform_record = Mock(side_effect=lambda x: x)
+        op.mappers["Account"].transform_key = Mock(side_effect=lambda x: x)
 
         load_step = amaxa.LoadStep("Account", ["Name", "OwnerId"])
         op.add_step(load_step)
-        load_step.primitivize = Mock(side_effect=lambda x: x)
 
         load_step.initialize()
         load_step.descendent_lookups = set(["OwnerId"])
@@ -402,18 +510,16 @@ class test_LoadStep(unittest.TestCase):
         op.mappers["Account"].transform_record.assert_has_calls(
             [unittest.mock.call(x) for x in record_list]
         )
-        load_step.primitivize.assert_has_calls(
-            [unittest.mock.call(x) for x in transformed_record_list]
-        )
 
         op.connection.bulk_api_insert.assert_called_once_with(
             "Account",
-            transformed_record_list,
+            unittest.mock.ANY,
             load_step.get_option("bulk-api-timeout"),
             load_step.get_option("bulk-api-poll-interval"),
             load_step.get_option("bulk-api-batch-size"),
             load_step.get_option("bulk-api-mode"),
         )
+        self.assertEqual(transformed_record_list, connection.inserted_records)
         op.register_new_id.assert_has_calls(
             [
                 unittest.mock.call(
@@ -581,6 +687,135 @@ class test_LoadStep(unittest.TestCase):
             ],
             op.register_error.call_args_list,
         )
+        # Records that could be prepared are still loaded.
+        self.assertEqual(
+            [{"Name": "Test", "IsDeleted": "false"}], connection.inserted_records
+        )
+
+    @patch("amaxa.constants.PREPARATION_RANGE_SIZE", 100)
+    def test_execute_prepares_records_in_processes(self):
+        record_list = [
+            {
+                "Id": "001{:012d}".format(i),
+                "Name": 'Test {}\n"{}"'.format(i, i),
+                "IsDeleted": "foo" if i == 8 else "false",
+                "ParentId": "001{:012d}".format(i - 1) if i % 2 and i != 9 else "",
+            }
+            for i in range(20)
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(record_list[0]))
+            writer.writeheader()
+            writer.writerows(record_list)
+
+        connection = MockConnection(
+            bulk_insert_results=[
+                UploadResult("001{:012d}".format(i + 100), True, True, "")
+                for i in range(20)
+                if i != 8
+            ],
+            bulk_update_results=[
+                UploadResult("001{:012d}".format(i + 100), True, True, "")
+                for i in range(20)
+                if i % 2 and i != 9
+            ],
+        )
+        # Workers read the compact Id map, whose lock the parent holds as they fork.
+        op = amaxa.LoadOperation(Mock(wraps=connection), amaxa.IdMapType.COMPACT)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = formats.InputSource(path)
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep(
+            "Account",
+            ["Name", "IsDeleted", "ParentId"],
+            options={"preparation-processes": 2},
+        )
+        op.add_step(load_step)
+
+        load_step.initialize()
+        self.assertGreater(
+            len(list(op.file_store.records["Account"].byte_ranges(100))), 2
+        )
+        load_step.execute()
+        load_step.execute_dependent_updates()
+
+        # Workers are given their step when they start. Steps running concurrently
+        # share no state in this process.
+        self.assertIsNone(amaxa.amaxa._preparing_step)
+        self.assertEqual(
+            [
+                {"Name": r["Name"], "IsDeleted": "false"}
+                for r in record_list
+                if r["Id"] != "001000000000008"
+            ],
+            connection.inserted_records,
+        )
+        self.assertEqual(
+            [
+                unittest.mock.call(
+                    "Account",
+                    "001000000000008",
+                    "Bad data in record 001000000000008: Invalid Boolean value foo",
+                ),
+            ],
+            op.register_error.call_args_list,
+        )
+        # Self-lookups captured in the worker processes are populated by the update pass.
+        self.assertEqual(
+            [
+                {
+                    "Id": str(amaxa.SalesforceId("001{:012d}".format(i + 100))),
+                    "ParentId": str(amaxa.SalesforceId("001{:012d}".format(i + 99))),
+                }
+                for i in range(20)
+                if i % 2 and i != 9
+            ],
+            connection.updated_records,
+        )
+
+    @patch("amaxa.constants.PREPARATION_RANGE_SIZE", 50)
+    def test_execute_prepares_records_in_processes_with_loose_quoting(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            f.write("Id,Name\r\n")
+            for i in range(20):
+                # A quote within an unquoted value upsets boundaries found by counting quotes.
+                name = 'Test "{}'.format(i) if i == 5 else '"Test\r\n""{}"""'.format(i)
+                f.write("001{:012d},{}\r\n".format(i, name))
+
+        connection = MockConnection(
+            bulk_insert_results=[
+                UploadResult("001{:012d}".format(i + 100), True, True, "")
+                for i in range(20)
+            ]
+        )
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = formats.InputSource(path)
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep(
+            "Account", ["Name"], options={"preparation-processes": 2}
+        )
+        op.add_step(load_step)
+
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual(
+            [
+                {"Name": 'Test "{}'.format(i) if i == 5 else 'Test\n"{}"'.format(i)}
+                for i in range(20)
+            ],
+            connection.inserted_records,
+        )
+        op.register_error.assert_not_called()
 
     def test_execute_dependent_updates_handles_lookups(self):
         record_list = [
@@ -639,12 +874,161 @@ class test_LoadStep(unittest.TestCase):
         op.register_error.assert_not_called()
         op.connection.bulk_api_update.assert_called_once_with(
             "Account",
-            transformed_record_list,
+            unittest.mock.ANY,
             load_step.get_option("bulk-api-timeout"),
             load_step.get_option("bulk-api-poll-interval"),
             load_step.get_option("bulk-api-batch-size"),
             load_step.get_option("bulk-api-mode"),
         )
+        self.assertEqual(transformed_record_list, connection.updated_records)
+
+    def test_execute_dependent_updates_uses_lookups_captured_during_execute(self):
+        record_list = [
+            {"Name": "Test", "Id": "001000000000000", "ParentId": ""},
+            {"Name": "Test 2", "Id": "001000000000001", "ParentId": "001000000000000"},
+        ]
+        connection = MockConnection(
+            bulk_insert_results=[
+                UploadResult("001000000000002", True, True, ""),
+                UploadResult("001000000000003", True, True, ""),
+            ],
+            bulk_update_results=[UploadResult("001000000000003", True, True, "")],
+        )
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+
+        load_step = amaxa.LoadStep("Account", ["Name", "ParentId"])
+        op.add_step(load_step)
+
+        load_step.initialize()
+        load_step.execute()
+
+        # The dependents pass doesn't read the input again.
+        op.file_store.records["Account"] = []
+        load_step.execute_dependent_updates()
+
+        self.assertEqual(
+            [
+                {
+                    "Id": str(amaxa.SalesforceId("001000000000003")),
+                    "ParentId": str(amaxa.SalesforceId("001000000000002")),
+                }
+            ],
+            connection.updated_records,
+        )
+        self.assertIsNone(load_step.dependent_lookup_store)
+
+    def test_get_self_lookup_levels(self):
+        record_list = [
+            {"Name": "C", "Id": "001000000000002", "ParentId": "001000000000001"},
+            {"Name": "B", "Id": "001000000000001", "ParentId": "001000000000000"},
+            {"Name": "A", "Id": "001000000000000", "ParentId": ""},
+            {"Name": "D", "Id": "001000000000003", "ParentId": "001000000000004"},
+            {"Name": "E", "Id": "001000000000004", "ParentId": "001000000000003"},
+            {"Name": "F", "Id": "001000000000005", "ParentId": "001000000000005"},
+            {"Name": "G", "Id": "001000000000006", "ParentId": "001000000000004"},
+        ]
+        op = amaxa.LoadOperation(Mock(wraps=MockConnection()))
+        load_step = amaxa.LoadStep("Account", ["Name", "ParentId"])
+        op.add_step(load_step)
+        load_step.initialize()
+
+        levels, deferred = load_step.get_self_lookup_levels(record_list)
+
+        self.assertEqual(
+            [["A", "D", "E", "F"], ["B", "G"], ["C"]],
+            [sorted(r["Name"] for r in level) for level in levels],
+        )
+        self.assertEqual(
+            {
+                (amaxa.SalesforceId("001000000000003"), "ParentId"),
+                (amaxa.SalesforceId("001000000000004"), "ParentId"),
+                (amaxa.SalesforceId("001000000000005"), "ParentId"),
+            },
+            deferred,
+        )
+
+    def test_execute_inserts_self_lookups_by_level(self):
+        record_list = [
+            {"Name": "B", "Id": "001000000000001", "ParentId": "001000000000000"},
+            {"Name": "A", "Id": "001000000000000", "ParentId": ""},
+            {"Name": "C", "Id": "001000000000002", "ParentId": "001000000000002"},
+        ]
+        mock_connection = MockConnection(
+            bulk_update_results=[UploadResult("001000000000005", True, True, "")]
+        )
+        connection = Mock(wraps=mock_connection)
+        connection.bulk_api_insert, jobs = mock_bulk_jobs(
+            [
+                UploadResult("001000000000003", True, True, ""),
+                UploadResult("001000000000005", True, True, ""),
+            ],
+            [UploadResult("001000000000004", True, True, "")],
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+
+        load_step = amaxa.LoadStep(
+            "Account",
+            ["Name", "ParentId"],
+            options={"insert-self-lookups-by-level": True},
+        )
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual(
+            [
+                [{"Name": "A", "ParentId": None}, {"Name": "C"}],
+                [{"Name": "B", "ParentId": str(amaxa.SalesforceId("001000000000003"))}],
+            ],
+            jobs,
+        )
+
+        load_step.execute_dependent_updates()
+
+        # Only the cyclic self-lookup is populated by an update.
+        self.assertEqual(
+            [
+                {
+                    "Id": str(amaxa.SalesforceId("001000000000005")),
+                    "ParentId": str(amaxa.SalesforceId("001000000000005")),
+                }
+            ],
+            mock_connection.updated_records,
+        )
+
+    def test_execute_inserts_by_level_reports_malformed_self_lookups(self):
+        record_list = [
+            {"Name": "A", "Id": "001000000000000", "ParentId": ""},
+            {"Name": "B", "Id": "001000000000001", "ParentId": "bogus"},
+        ]
+        connection = Mock(wraps=MockConnection())
+        connection.bulk_api_insert, jobs = mock_bulk_jobs(
+            [UploadResult("001000000000003", True, True, "")]
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep(
+            "Account",
+            ["Name", "ParentId"],
+            options={"insert-self-lookups-by-level": True},
+        )
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual([[{"Name": "A", "ParentId": None}]], jobs)
+        op.register_error.assert_called_once_with(
+            "Account",
+            "001000000000001",
+            "Bad data in record 001000000000001: Salesforce Ids must be 15 or 18 characters.",
+        )
 
     def test_execute_dependent_updates_handles_errors(self):
         record_list = [
@@ -757,24 +1141,23 @@ class test_LoadStep(unittest.TestCase):
         op.file_store.records["Account"] = record_list
         op.mappers["Account"] = Mock()
         op.mappers["Account"].transform_record = Mock(side_effect=lambda x: x)
+        op.mappers["Account"].transform_key = Mock(side_effect=lambda x: x)
 
         load_step = amaxa.LoadStep("Account", ["Name"])
         op.add_step(load_step)
 
-        load_step.primitivize = Mock(side_effect=lambda x: x)
-        load_step.populate_lookups = Mock(side_effect=lambda x, y, z: x)
-
         load_step.initialize()
         load_step.execute()
 
         op.connection.bulk_api_insert.assert_called_once_with(
             "Account",
-            clean_record_list,
+            unittest.mock.ANY,
             load_step.get_option("bulk-api-timeout"),
             load_step.get_option("bulk-api-poll-interval"),
             load_step.get_option("bulk-api-batch-size"),
             load_step.get_option("bulk-api-mode"),
         )
+        self.assertEqual(clean_record_list, connection.inserted_records)
         op.register_new_id.assert_has_calls(
             [
                 unittest.mock.call(
@@ -811,6 +1194,116 @@ class test_LoadStep(unittest.TestCase):
 
         op.connection.bulk_api_insert.assert_not_called()
 
+    def test_execute_records_posted_batches(self):
+        record_list = [
+            {"Name": "Test", "Id": "001000000000000"},
+            {"Name": "Test 2", "Id": "001000000000001"},
+        ]
+        connection = MockConnection(
+            bulk_insert_results=[
+                UploadResult("001000000000007", True, True, ""),
+                UploadResult("001000000000008", True, True, ""),
+            ]
+        )
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.journal = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+
+        load_step.initialize()
+        load_step.execute()
+
+        op.journal.add_batch.assert_called_once_with(
+            "Account",
+            "750000000000000AAA",
+            "751000000000000AAA",
+            ["001000000000000", "001000000000001"],
+        )
+
+    def test_reattach_posted_batches_registers_created_records(self):
+        connection = Mock()
+        connection.get_bulk_api_batch_results.return_value = [
+            UploadResult("001000000000007", True, True, ""),
+            UploadResult(None, False, False, [{"statusCode": "ERROR"}]),
+            UploadResult("001000000000009", True, True, ""),
+        ]
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.posted_batches["Account"] = [
+            ("job", "batch", ["001000000000000", "001000000000001", "001000000000002"]),
+            ("job", "done", ["001000000000002"]),
+        ]
+        op.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000002"),
+            amaxa.SalesforceId("001000000000009"),
+        )
+        op.register_new_id = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+        load_step.reattach_posted_batches()
+
+        connection.get_bulk_api_batch_results.assert_called_once_with(
+            "job",
+            "batch",
+            load_step.get_option("bulk-api-timeout"),
+            load_step.get_option("bulk-api-poll-interval"),
+        )
+        op.register_new_id.assert_called_once_with(
+            "Account",
+            amaxa.SalesforceId("001000000000000"),
+            amaxa.SalesforceId("001000000000007"),
+        )
+        self.assertEqual({}, op.posted_batches)
+
+    def test_reattach_posted_batches_skips_failed_batches(self):
+        connection = Mock()
+        connection.get_bulk_api_batch_results.return_value = None
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.posted_batches["Account"] = [("job", "batch", ["001000000000000"])]
+        op.register_new_id = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+        load_step.reattach_posted_batches()
+
+        op.register_new_id.assert_not_called()
+
+    def test_reattach_posted_batches_registers_errors_for_unreadable_batches(self):
+        connection = Mock()
+        connection.get_bulk_api_batch_results.return_value = (
+            "Unable to read the results of Bulk API batch batch: expired"
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.posted_batches["Account"] = [
+            ("job", "batch", ["001000000000000", "001000000000001"])
+        ]
+        op.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000001"),
+            amaxa.SalesforceId("001000000000009"),
+        )
+        op.register_new_id = Mock()
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+        load_step.reattach_posted_batches()
+
+        op.register_new_id.assert_not_called()
+        op.register_error.assert_called_once_with(
+            "Account",
+            "001000000000000",
+            "Unable to read the results of Bulk API batch batch: expired. "
+            "This record may or may not have been loaded by a prior run.",
+        )
+
     def test_format_error_constructs_messages(self):
         step = amaxa.LoadStep("Account", ["Name"])
 
@@ -876,15 +1369,13 @@ class test_LoadStep(unittest.TestCase):
             },
         )
         step.context = op
-        step.primitivize = Mock(side_effect=lambda x: x)
-        step.populate_lookups = Mock(side_effect=lambda x, y, z: x)
-
         step.initialize()
         step.execute()
 
         op.connection.bulk_api_insert.assert_called_once_with(
-            "Account", cleaned_record_list, 600, 10, 5000, "Serial"
+            "Account", unittest.mock.ANY, 600, 10, 5000, "Serial"
         )
+        self.assertEqual(cleaned_record_list, connection.inserted_records)
 
     def test_execute_dependent_updates_uses_bulk_api_options(self):
         record_list = [
@@ -936,5 +1427,241 @@ class test_LoadStep(unittest.TestCase):
         load_step.execute_dependent_updates()
 
         op.connection.bulk_api_update.assert_called_once_with(
-            "Account", cleaned_record_list, 600, 10, 5000, "Serial"
+            "Account", unittest.mock.ANY, 600, 10, 5000, "Serial"
+        )
+        self.assertEqual(cleaned_record_list, connection.updated_records)
+
+    def test_execute_retries_lock_errors_in_serial_mode(self):
+        record_list = [
+            {"Name": "Test", "Id": "001000000000000"},
+            {"Name": "Test 2", "Id": "001000000000001"},
+        ]
+        error = [
+            {
+                "statusCode": "UNABLE_TO_LOCK_ROW",
+                "message": "unable to obtain exclusive access to this record",
+                "fields": [],
+            }
+        ]
+        connection = Mock(wraps=MockConnection())
+        connection.bulk_api_insert, jobs = mock_bulk_jobs(
+            [
+                UploadResult("001000000000002", True, True, ""),
+                UploadResult(None, False, False, error),
+            ],
+            [UploadResult("001000000000003", True, True, "")],
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.register_new_id = Mock()
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep(
+            "Account", ["Name"], options={"bulk-api-retry-attempts": 2}
+        )
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual(
+            [
+                unittest.mock.call(
+                    "Account",
+                    unittest.mock.ANY,
+                    load_step.get_option("bulk-api-timeout"),
+                    load_step.get_option("bulk-api-poll-interval"),
+                    load_step.get_option("bulk-api-batch-size"),
+                    "Parallel",
+                ),
+                unittest.mock.call(
+                    "Account",
+                    unittest.mock.ANY,
+                    load_step.get_option("bulk-api-timeout"),
+                    load_step.get_option("bulk-api-poll-interval"),
+                    load_step.get_option("bulk-api-batch-size"),
+                    "Serial",
+                ),
+            ],
+            connection.bulk_api_insert.call_args_list,
+        )
+        self.assertEqual(
+            [[{"Name": "Test"}, {"Name": "Test 2"}], [{"Name": "Test 2"}]], jobs
+        )
+        op.register_error.assert_not_called()
+        op.register_new_id.assert_has_calls(
+            [
+                unittest.mock.call(
+                    "Account",
+                    amaxa.SalesforceId("001000000000000"),
+                    amaxa.SalesforceId("001000000000002"),
+                ),
+                unittest.mock.call(
+                    "Account",
+                    amaxa.SalesforceId("001000000000001"),
+                    amaxa.SalesforceId("001000000000003"),
+                ),
+            ]
+        )
+
+    def test_execute_registers_lock_errors_after_final_retry(self):
+        record_list = [{"Name": "Test", "Id": "001000000000000"}]
+        error = [
+            {
+                "statusCode": "UNABLE_TO_LOCK_ROW",
+                "message": "unable to obtain exclusive access to this record",
+                "fields": [],
+            }
+        ]
+        connection = Mock(wraps=MockConnection())
+        connection.bulk_api_insert, jobs = mock_bulk_jobs(
+            [UploadResult(None, False, False, error)],
+            [UploadResult(None, False, False, error)],
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep(
+            "Account", ["Name"], options={"bulk-api-retry-attempts": 1}
+        )
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual(2, connection.bulk_api_insert.call_count)
+        op.register_error.assert_called_once_with(
+            "Account", "001000000000000", load_step.format_error(error)
+        )
+
+    def test_execute_does_not_retry_by_default(self):
+        record_list = [{"Name": "Test", "Id": "001000000000000"}]
+        error = [
+            {
+                "statusCode": "UNABLE_TO_LOCK_ROW",
+                "message": "unable to obtain exclusive access to this record",
+                "fields": [],
+            }
+        ]
+        connection = Mock(wraps=MockConnection())
+        connection.bulk_api_insert, jobs = mock_bulk_jobs(
+            [UploadResult(None, False, False, error)]
+        )
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.register_error = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        connection.bulk_api_insert.assert_called_once()
+        op.register_error.assert_called_once_with(
+            "Account", "001000000000000", load_step.format_error(error)
+        )
+
+    def test_execute_groups_records_by_parent(self):
+        record_list = [
+            {"LastName": "A", "Id": "003000000000000", "AccountId": "001000000000001"},
+            {"LastName": "B", "Id": "003000000000001", "AccountId": "001000000000000"},
+            {"LastName": "C", "Id": "003000000000002", "AccountId": "001000000000001"},
+            {"LastName": "D", "Id": "003000000000003", "AccountId": ""},
+        ]
+        connection = MockConnection(
+            bulk_insert_results=[
+                UploadResult("003000000000004", True, True, ""),
+                UploadResult("003000000000005", True, True, ""),
+                UploadResult("003000000000006", True, True, ""),
+                UploadResult("003000000000007", True, True, ""),
+            ]
+        )
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000000"),
+            amaxa.SalesforceId("001000000000010"),
+        )
+        op.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000001"),
+            amaxa.SalesforceId("001000000000009"),
+        )
+        op.register_new_id = Mock()
+        op.file_store.records["Contact"] = record_list
+
+        load_step = amaxa.LoadStep(
+            "Contact",
+            ["LastName", "AccountId"],
+            options={"bulk-api-group-by-parent": True},
+        )
+        op.add_step(amaxa.LoadStep("Account", ["Name"]))
+        op.add_step(load_step)
+        load_step.initialize()
+
+        self.assertEqual("AccountId", load_step.get_parent_lookup_for_grouping())
+
+        load_step.execute()
+
+        self.assertEqual(
+            ["D", "A", "C", "B"],
+            [r["LastName"] for r in connection.inserted_records],
+        )
+        self.assertEqual(
+            [
+                unittest.mock.call(
+                    "Contact",
+                    amaxa.SalesforceId(original_id),
+                    amaxa.SalesforceId(new_id),
+                )
+                for original_id, new_id in [
+                    ("003000000000003", "003000000000004"),
+                    ("003000000000000", "003000000000005"),
+                    ("003000000000002", "003000000000006"),
+                    ("003000000000001", "003000000000007"),
+                ]
+            ],
+            op.register_new_id.call_args_list,
+        )
+
+    def test_get_parent_lookup_for_grouping(self):
+        op = amaxa.LoadOperation(Mock(wraps=MockConnection()))
+        load_step = amaxa.LoadStep("Contact", ["LastName", "AccountId"])
+        op.add_step(amaxa.LoadStep("Account", ["Name"]))
+        op.add_step(load_step)
+        load_step.initialize()
+
+        self.assertIsNone(load_step.get_parent_lookup_for_grouping())
+
+        load_step.options["bulk-api-group-by-parent"] = "AccountId"
+        self.assertEqual("AccountId", load_step.get_parent_lookup_for_grouping())
+
+    def test_execute_adopts_reduced_batch_size(self):
+        record_list = [{"Name": "Test", "Id": "001000000000000"}]
+        connection = MockConnection(
+            bulk_insert_results=[UploadResult("001000000000002", True, True, "")]
+        )
+        connection.get_bulk_api_batch_size_limit = Mock(return_value=200)
+        op = amaxa.LoadOperation(Mock(wraps=connection))
+        op.file_store = MockFileStore()
+        op.file_store.records["Account"] = record_list
+        op.register_new_id = Mock()
+
+        load_step = amaxa.LoadStep("Account", ["Name"])
+        op.add_step(load_step)
+        load_step.initialize()
+        load_step.execute()
+
+        self.assertEqual(200, load_step.get_bulk_api_batch_size())
+        op.connection.bulk_api_insert.assert_called_once_with(
+            "Account",
+            unittest.mock.ANY,
+            load_step.get_option("bulk-api-timeout"),
+            load_step.get_option("bulk-api-poll-interval"),
+            200,
+            load_step.get_option("bulk-api-mode"),
         )
+        self.assertEqual([{"Name": "Test"}], connection.inserted_records)
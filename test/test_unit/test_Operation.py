@@ -1,3 +1,4 @@
+import os
 import unittest
 from unittest.mock import Mock
 
@@ -71,3 +72,52 @@ class test_Operation(unittest.TestCase):
 
         op.logger.error.assert_called_once_with("Unexpected exception Test occurred.")
         op.file_store.close.assert_called_once_with()
+
+    def test_run_logs_output_errors(self):
+        connection = Mock()
+        op = ConcreteOperation(connection)
+        op.initialize = Mock()
+        op.execute = Mock(return_value=0)
+        op.logger = Mock()
+        op.file_store = Mock()
+        op.file_store.close.side_effect = OSError("No space left on device")
+
+        self.assertEqual(-1, op.run())
+
+        op.logger.error.assert_called_once_with(
+            "Unable to write output files (No space left on device)."
+        )
+
+    def test_run_closes_operation(self):
+        op = ConcreteOperation(Mock())
+        op.close = Mock()
+        op.execute = Mock(return_value=0)
+        op.file_store = Mock()
+
+        self.assertEqual(0, op.run())
+        op.close.assert_called_once_with()
+
+    def test_load_run_removes_disk_id_map(self):
+        op = amaxa.LoadOperation(Mock(), amaxa.IdMapType.DISK)
+        directory = op.global_id_map.directory.name
+        op.file_store = Mock()
+        op.execute = Mock(return_value=0)
+
+        self.assertEqual(0, op.run())
+        self.assertFalse(os.path.exists(directory))
+
+    def test_failed_load_run_keeps_disk_id_map_until_closed(self):
+        op = amaxa.LoadOperation(Mock(), amaxa.IdMapType.DISK)
+        directory = op.global_id_map.directory.name
+        op.global_id_map[amaxa.SalesforceId("001000000000000")] = amaxa.SalesforceId(
+            "001000000000001"
+        )
+        op.file_store = Mock()
+        op.execute = Mock(return_value=-1)
+
+        self.assertEqual(-1, op.run())
+        # The caller saves state from the Id map of a failed load.
+        self.assertEqual(1, len(op.global_id_map))
+
+        op.close()
+        self.assertFalse(os.path.exists(directory))
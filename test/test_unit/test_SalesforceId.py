@@ -1,4 +1,6 @@
+import pickle
 import unittest
+import unittest.mock
 
 import amaxa
 
@@ -65,3 +67,32 @@ class test_SalesforceId(unittest.TestCase):
             self.assertNotIn(new_id, id_set)
             id_set.add(new_id)
             self.assertIn(new_id, id_set)
+
+    def test_interns_ids(self):
+        the_id = amaxa.SalesforceId("001000000000000")
+
+        self.assertIs(the_id, amaxa.SalesforceId("001000000000000"))
+        self.assertIs(the_id, amaxa.SalesforceId(str(the_id)))
+        self.assertIs(the_id, amaxa.SalesforceId(the_id))
+
+    def test_empties_intern_table_when_full(self):
+        with unittest.mock.patch(
+            "amaxa.constants.ID_INTERN_TABLE_SIZE", 1
+        ), unittest.mock.patch.dict("amaxa.amaxa._interned_ids", clear=True):
+            first = amaxa.SalesforceId("001000000000000")
+            amaxa.SalesforceId("001000000000001")
+
+            second = amaxa.SalesforceId("001000000000000")
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            amaxa.SalesforceId("001000000000000").__dict__
+
+    def test_pickles(self):
+        the_id = amaxa.SalesforceId("001000000000000")
+
+        self.assertIs(the_id, pickle.loads(pickle.dumps(the_id)))
@@ -1,11 +1,21 @@
+import io
 import json
+import os
+import tempfile
 import unittest
 from unittest.mock import Mock
 
 import yaml
 
 import amaxa
-from amaxa.loader import StateLoader, save_state
+from amaxa.loader import (
+    StateJournal,
+    StateLoader,
+    load_binary_state,
+    replay_journal,
+    save_binary_state,
+    save_state,
+)
 
 EXAMPLE_DICT = {
     "version": 1,
@@ -26,7 +36,7 @@ EXAMPLE_ID_MAP = {
 
 class test_StateLoader(unittest.TestCase):
     def test_loads_state(self):
-        sl = StateLoader(EXAMPLE_DICT, Mock())
+        sl = StateLoader(EXAMPLE_DICT, amaxa.LoadOperation(Mock()))
 
         sl.load()
 
@@ -48,3 +58,185 @@ class test_StateLoader(unittest.TestCase):
         self.assertEqual(
             EXAMPLE_DICT, json.loads(save_state(operation, json_mode=True))
         )
+
+
+class test_BinaryState(unittest.TestCase):
+    def get_state_file(self, stage=amaxa.LoadStage.DEPENDENTS):
+        operation = amaxa.LoadOperation(Mock())
+        operation.global_id_map.update(EXAMPLE_ID_MAP)
+        operation.stage = stage
+
+        state_file = io.BytesIO()
+        save_binary_state(operation, state_file)
+        state_file.seek(0)
+
+        return state_file
+
+    def test_round_trips_state(self):
+        for id_map_type in amaxa.IdMapType:
+            operation = amaxa.LoadOperation(Mock(), id_map_type)
+
+            self.assertEqual([], load_binary_state(self.get_state_file(), operation))
+            self.assertEqual(EXAMPLE_ID_MAP, dict(operation.global_id_map.items()))
+            self.assertEqual(amaxa.LoadStage.DEPENDENTS, operation.stage)
+
+    def test_reads_in_chunks(self):
+        operation = amaxa.LoadOperation(Mock())
+
+        with unittest.mock.patch("amaxa.constants.BINARY_STATE_CHUNK_SIZE", 1):
+            errors = load_binary_state(self.get_state_file(), operation)
+
+        self.assertEqual([], errors)
+        self.assertEqual(EXAMPLE_ID_MAP, operation.global_id_map)
+
+    def test_rejects_other_files(self):
+        operation = amaxa.LoadOperation(Mock())
+
+        self.assertEqual(
+            ["The state file is not an Amaxa binary state file."],
+            load_binary_state(io.BytesIO(b"version: 1\n"), operation),
+        )
+        self.assertEqual({}, operation.global_id_map)
+
+    def test_rejects_truncated_files(self):
+        data = self.get_state_file().getvalue()
+        operation = amaxa.LoadOperation(Mock())
+
+        self.assertEqual(
+            ["The state file is truncated."],
+            load_binary_state(io.BytesIO(data[:-1]), operation),
+        )
+        self.assertEqual(amaxa.LoadStage.INSERTS, operation.stage)
+
+    def test_rejects_invalid_stage(self):
+        data = self.get_state_file().getvalue().replace(b"dependents", b"dependentX")
+
+        self.assertEqual(
+            ["The state file has invalid stage dependentX."],
+            load_binary_state(io.BytesIO(data), amaxa.LoadOperation(Mock())),
+        )
+
+
+class test_StateJournal(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "operation.journal")
+
+    def test_journal_replays_ids_and_stage(self):
+        operation = amaxa.LoadOperation(Mock())
+        operation.file_store = Mock()
+        operation.global_id_map.update(EXAMPLE_ID_MAP)
+        operation.journal = StateJournal(self.path, operation)
+
+        operation.register_new_id(
+            "Account",
+            amaxa.SalesforceId("001000000000004"),
+            amaxa.SalesforceId("001000000000005"),
+        )
+        operation.journal.set_stage(amaxa.LoadStage.DEPENDENTS)
+        operation.journal.close()
+
+        resumed = amaxa.LoadOperation(Mock())
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual([], replay_journal(f, resumed))
+
+        self.assertEqual(amaxa.LoadStage.DEPENDENTS, resumed.stage)
+        self.assertEqual(
+            {
+                **EXAMPLE_ID_MAP,
+                amaxa.SalesforceId("001000000000004"): amaxa.SalesforceId(
+                    "001000000000005"
+                ),
+            },
+            resumed.global_id_map,
+        )
+
+    def test_journal_replays_posted_batches(self):
+        operation = amaxa.LoadOperation(Mock())
+        operation.journal = StateJournal(self.path, operation)
+
+        operation.register_posted_batch(
+            "Account", "750000000000000AAA", "751000000000000AAA", list(EXAMPLE_ID_MAP)
+        )
+        operation.journal.close()
+
+        resumed = amaxa.LoadOperation(Mock())
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual([], replay_journal(f, resumed))
+
+        self.assertEqual(
+            {
+                "Account": [
+                    (
+                        "750000000000000AAA",
+                        "751000000000000AAA",
+                        [str(k) for k in EXAMPLE_ID_MAP],
+                    )
+                ]
+            },
+            resumed.posted_batches,
+        )
+
+    def test_journal_snapshot_omits_collected_batches(self):
+        operation = amaxa.LoadOperation(Mock())
+        operation.global_id_map.update(EXAMPLE_ID_MAP)
+        operation.posted_batches["Account"] = [
+            ("750000000000000AAA", "751000000000000AAA", list(EXAMPLE_ID_MAP)),
+            ("750000000000000AAA", "751000000000001AAA", ["001000000000004AAA"]),
+        ]
+        StateJournal(self.path, operation).close()
+
+        resumed = amaxa.LoadOperation(Mock())
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual([], replay_journal(f, resumed))
+
+        self.assertEqual(
+            {
+                "Account": [
+                    ("750000000000000AAA", "751000000000001AAA", ["001000000000004AAA"])
+                ]
+            },
+            resumed.posted_batches,
+        )
+
+    def test_journal_syncs_in_batches(self):
+        journal = StateJournal(
+            self.path, amaxa.LoadOperation(Mock()), sync_interval=2, sync_seconds=60
+        )
+        journal.sync = Mock(wraps=journal.sync)
+
+        journal.add_id("001000000000000AAA", "001000000000001AAA")
+        journal.sync.assert_not_called()
+        journal.add_id("001000000000002AAA", "001000000000003AAA")
+        journal.sync.assert_called_once_with()
+
+        journal.close()
+
+    def test_replay_ignores_truncated_entry(self):
+        journal = io.StringIO(
+            "amaxa-journal 1\n"
+            "S inserts\n"
+            "I 001000000000000AAA 001000000000001AAA\n"
+            "I 001000000000002AAA 0010000"
+        )
+        operation = amaxa.LoadOperation(Mock())
+
+        self.assertEqual([], replay_journal(journal, operation))
+        self.assertEqual(
+            {
+                amaxa.SalesforceId("001000000000000AAA"): amaxa.SalesforceId(
+                    "001000000000001AAA"
+                )
+            },
+            operation.global_id_map,
+        )
+
+    def test_replay_rejects_other_files(self):
+        state = io.StringIO("version: 1\n")
+        state.name = "operation.state.yaml"
+
+        self.assertEqual(
+            ["operation.state.yaml is not an Amaxa journal."],
+            replay_journal(state, amaxa.LoadOperation(Mock())),
+        )
@@ -176,10 +176,11 @@ class test_CLI(unittest.TestCase):
 
         self.assertEqual(0, return_value)
 
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
     @unittest.mock.patch("amaxa.__main__.CredentialLoader")
     @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
     def test_main_calls_execute_with_json_input_load_mode(
-        self, operation_mock, credential_mock
+        self, operation_mock, credential_mock, journal_mock
     ):
         context = Mock()
         context.run.return_value = 0
@@ -212,6 +213,10 @@ class test_CLI(unittest.TestCase):
         )
 
         context.run.assert_called_once_with()
+        journal_mock.assert_called_once_with("extraction-good.journal", context)
+        self.assertEqual(journal_mock.return_value, context.journal)
+        journal_mock.return_value.close.assert_called_once_with()
+        journal_mock.return_value.remove.assert_called_once_with()
 
         self.assertEqual(0, return_value)
 
@@ -369,9 +374,12 @@ class test_CLI(unittest.TestCase):
 
         self.assertEqual(-1, return_value)
 
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
     @unittest.mock.patch("amaxa.__main__.CredentialLoader")
     @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
-    def test_main_saves_state_on_error(self, operation_mock, credential_mock):
+    def test_main_saves_state_on_error(
+        self, operation_mock, credential_mock, journal_mock
+    ):
         context = Mock()
         op = Mock()
         op.run = Mock(return_value=-1)
@@ -403,6 +411,8 @@ class test_CLI(unittest.TestCase):
                 return_value = main()
 
         self.assertEqual(-1, return_value)
+        journal_mock.return_value.close.assert_called_once_with()
+        journal_mock.return_value.remove.assert_not_called()
         contents = state_file.getvalue()
         self.assertLess(0, len(contents))
         state_file.close.assert_called_once_with()
@@ -418,14 +428,16 @@ class test_CLI(unittest.TestCase):
             yaml_state["state"]["id-map"],
         )
 
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
     @unittest.mock.patch("amaxa.__main__.CredentialLoader")
     @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
     def test_main_loads_state_with_use_state_option(
-        self, operation_mock, credential_mock
+        self, operation_mock, credential_mock, journal_mock
     ):
         context = Mock()
         op = Mock()
         op.run = Mock(return_value=0)
+        op.global_id_map = {}
 
         credential_mock.return_value = Mock()
         credential_mock.return_value.result = context
@@ -464,6 +476,162 @@ class test_CLI(unittest.TestCase):
             op.global_id_map,
         )
 
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
+    @unittest.mock.patch("amaxa.__main__.CredentialLoader")
+    @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
+    def test_main_closes_state_file_before_load(
+        self, operation_mock, credential_mock, journal_mock
+    ):
+        op = Mock()
+        op.global_id_map = {}
+        credential_mock.return_value.errors = []
+        operation_mock.return_value.result = op
+        operation_mock.return_value.errors = []
+
+        files = {}
+
+        def open_file(f, *args, **kwargs):
+            files[f] = select_file(f, *args, **kwargs)
+            return files[f]
+
+        def run():
+            # The journal replaces the state file it resumes from.
+            files["state-good.yaml"].close.assert_called_once_with()
+            return 0
+
+        op.run = Mock(side_effect=run)
+
+        with unittest.mock.patch("builtins.open", Mock(side_effect=open_file)):
+            with unittest.mock.patch(
+                "sys.argv",
+                [
+                    "amaxa",
+                    "-c",
+                    "credentials-good.yaml",
+                    "--load",
+                    "extraction-good.yaml",
+                    "--use-state",
+                    "state-good.yaml",
+                ],
+            ):
+                return_value = main()
+
+        self.assertEqual(0, return_value)
+        op.run.assert_called_once_with()
+
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
+    @unittest.mock.patch("amaxa.__main__.CredentialLoader")
+    @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
+    def test_main_refuses_to_overwrite_existing_journal(
+        self, operation_mock, credential_mock, journal_mock
+    ):
+        op = Mock()
+        credential_mock.return_value.errors = []
+        operation_mock.return_value.result = op
+        operation_mock.return_value.errors = []
+
+        m = Mock(side_effect=select_file)
+        with unittest.mock.patch("builtins.open", m):
+            with unittest.mock.patch(
+                "os.path.exists", Mock(side_effect=lambda p: p.endswith(".journal"))
+            ):
+                with unittest.mock.patch(
+                    "sys.argv",
+                    [
+                        "amaxa",
+                        "-c",
+                        "credentials-good.yaml",
+                        "--load",
+                        "extraction-good.yaml",
+                    ],
+                ):
+                    return_value = main()
+
+        self.assertEqual(-1, return_value)
+        journal_mock.assert_not_called()
+        op.run.assert_not_called()
+
+    @unittest.mock.patch("amaxa.__main__.StateLoader")
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
+    @unittest.mock.patch("amaxa.__main__.CredentialLoader")
+    @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
+    def test_main_refuses_to_resume_from_state_file_over_existing_journal(
+        self, operation_mock, credential_mock, journal_mock, state_mock
+    ):
+        op = Mock()
+        state_mock.return_value.errors = []
+        credential_mock.return_value.errors = []
+        operation_mock.return_value.result = op
+        operation_mock.return_value.errors = []
+
+        m = Mock(side_effect=select_file)
+        with unittest.mock.patch("builtins.open", m):
+            with unittest.mock.patch(
+                "os.path.exists", Mock(side_effect=lambda p: p.endswith(".journal"))
+            ):
+                with unittest.mock.patch(
+                    "sys.argv",
+                    [
+                        "amaxa",
+                        "-c",
+                        "credentials-good.yaml",
+                        "--load",
+                        "extraction-good.yaml",
+                        "--use-state",
+                        "state-good.yaml",
+                    ],
+                ):
+                    return_value = main()
+
+        self.assertEqual(-1, return_value)
+        journal_mock.assert_not_called()
+        op.run.assert_not_called()
+
+    @unittest.mock.patch("amaxa.__main__.replay_journal")
+    @unittest.mock.patch("amaxa.__main__.StateJournal")
+    @unittest.mock.patch("amaxa.__main__.CredentialLoader")
+    @unittest.mock.patch("amaxa.__main__.LoadOperationLoader")
+    def test_main_resumes_from_existing_journal(
+        self, operation_mock, credential_mock, journal_mock, replay_mock
+    ):
+        op = Mock()
+        op.run.return_value = 0
+        replay_mock.return_value = []
+        credential_mock.return_value.errors = []
+        operation_mock.return_value.result = op
+        operation_mock.return_value.errors = []
+
+        def open_file(f, *args, **kwargs):
+            if f == "extraction-good.journal":
+                m = unittest.mock.mock_open(read_data="")(f, *args, **kwargs)
+                m.name = f
+                return m
+
+            return select_file(f, *args, **kwargs)
+
+        with unittest.mock.patch("builtins.open", Mock(side_effect=open_file)):
+            with unittest.mock.patch(
+                "os.path.exists", Mock(side_effect=lambda p: p.endswith(".journal"))
+            ):
+                with unittest.mock.patch(
+                    "sys.argv",
+                    [
+                        "amaxa",
+                        "-c",
+                        "credentials-good.yaml",
+                        "--load",
+                        "extraction-good.yaml",
+                        "--use-state",
+                        "extraction-good.journal",
+                    ],
+                ):
+                    return_value = main()
+
+        self.assertEqual(0, return_value)
+        replay_mock.assert_called_once()
+        journal_mock.assert_called_once_with("extraction-good.journal", op)
+        op.run.assert_called_once_with()
+
     @unittest.mock.patch("amaxa.__main__.CredentialLoader")
     @unittest.mock.patch("amaxa.__main__.ExtractionOperationLoader")
     def test_main_stops_with_check_only(self, operation_mock, credential_mock):
@@ -0,0 +1,285 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from amaxa import formats
+
+FIELDNAMES = ["Id", "Name", "NumberOfEmployees"]
+RECORDS = [
+    {"Id": "001000000000000AAA", "Name": "Caprica Steel", "NumberOfEmployees": 100},
+    {"Id": "001000000000001AAA", "Name": "Picon Fleet Headquarters", "Extra": "x"},
+]
+EXPECTED = [
+    {"Id": "001000000000000AAA", "Name": "Caprica Steel", "NumberOfEmployees": "100"},
+    {
+        "Id": "001000000000001AAA",
+        "Name": "Picon Fleet Headquarters",
+        "NumberOfEmployees": "",
+    },
+]
+
+
+class test_formats(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def round_trip(self, name):
+        path = os.path.join(self.directory.name, name)
+        f, writer = formats.open_output(path, FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(RECORDS)
+        f.close()
+
+        reader = formats.open_input(path)
+        self.addCleanup(reader.close)
+
+        self.assertEqual(FIELDNAMES, reader.fieldnames)
+        self.assertEqual(EXPECTED, list(reader))
+
+    def test_round_trips_csv(self):
+        self.round_trip("Account.csv")
+
+    def test_round_trips_gzip_csv(self):
+        self.round_trip("Account.csv.gz")
+
+    def test_round_trips_json_lines(self):
+        self.round_trip("Account.jsonl")
+
+    def test_round_trips_gzip_json_lines(self):
+        self.round_trip("Account.jsonl.gz")
+
+    @unittest.skipIf(formats.zstandard is None, "zstandard is not installed")
+    def test_round_trips_zstd_csv(self):
+        self.round_trip("Account.csv.zst")
+
+    @unittest.skipIf(formats.pyarrow is None, "pyarrow is not installed")
+    def test_round_trips_parquet(self):
+        self.round_trip("Account.parquet")
+
+    @unittest.skipIf(formats.pyarrow is None, "pyarrow is not installed")
+    def test_round_trips_arrow(self):
+        self.round_trip("Account.arrow")
+
+    @unittest.skipIf(formats.pyarrow is None, "pyarrow is not installed")
+    def test_closes_arrow_memory_map(self):
+        path = os.path.join(self.directory.name, "Account.arrow")
+        f, writer = formats.open_output(path, FIELDNAMES)
+        writer.writerows(RECORDS)
+        f.close()
+
+        reader = formats.open_input(path)
+        memory_map = reader.memory_map
+        self.assertEqual(EXPECTED, list(reader))
+        reader.close()
+
+        self.assertTrue(memory_map.closed)
+
+    def test_reads_kept_columns(self):
+        for name in ["Account.csv", "Account.jsonl", "Account.parquet"]:
+            if name.endswith(".parquet") and formats.pyarrow is None:
+                continue
+
+            with self.subTest(name=name):
+                path = os.path.join(self.directory.name, name)
+                f, writer = formats.open_output(path, FIELDNAMES)
+                writer.writeheader()
+                writer.writerows(RECORDS)
+                f.close()
+
+                reader = formats.open_input(path, lambda c: c != "Name")
+                self.addCleanup(reader.close)
+
+                self.assertEqual(FIELDNAMES, reader.fieldnames)
+                self.assertEqual(
+                    [{k: v for k, v in r.items() if k != "Name"} for r in EXPECTED],
+                    list(reader),
+                )
+
+    def test_reads_csv_like_dict_reader(self):
+        path = os.path.join(self.directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            f.write("Id,Name,Industry\r\n001000000000000,Caprica Steel\r\n\r\n")
+            f.write("001000000000001,Picon Fleet Headquarters,Defense\r\n")
+
+        reader = formats.open_input(path, lambda c: c != "Name")
+        self.addCleanup(reader.close)
+
+        self.assertEqual(
+            [
+                {"Id": "001000000000000", "Industry": None},
+                {"Id": "001000000000001", "Industry": "Defense"},
+            ],
+            list(reader),
+        )
+
+    def test_get_file_format(self):
+        self.assertEqual((formats.CSV, None), formats.get_file_format("Account.csv"))
+        self.assertEqual((formats.CSV, None), formats.get_file_format("Account.txt"))
+        self.assertEqual(
+            (formats.JSON_LINES, ".gz"), formats.get_file_format("Account.JSONL.GZ")
+        )
+
+    def test_get_file_format_rejects_compressed_columnar_files(self):
+        with unittest.mock.patch("amaxa.formats.pyarrow"):
+            with self.assertRaises(formats.FileFormatException):
+                formats.get_file_format("Account.parquet.gz")
+
+    def test_get_file_format_requires_optional_packages(self):
+        with unittest.mock.patch("amaxa.formats.pyarrow", None):
+            with self.assertRaises(formats.FileFormatException) as e:
+                formats.get_file_format("Account.parquet")
+
+        self.assertEqual(
+            "the pyarrow package is required for parquet files", str(e.exception)
+        )
+
+        with unittest.mock.patch("amaxa.formats.zstandard", None):
+            with self.assertRaises(formats.FileFormatException):
+                formats.get_file_format("Account.csv.zst")
+
+
+class test_InputSource(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, records, fieldnames=FIELDNAMES):
+        f, writer = formats.open_output(
+            os.path.join(self.directory.name, name), fieldnames
+        )
+        writer.writeheader()
+        writer.writerows(records)
+        f.close()
+
+    def test_reads_files_matching_pattern_in_order(self):
+        self.write("Account-2.csv.gz", RECORDS[1:])
+        self.write("Account-1.csv", RECORDS[:1])
+        self.write("Contact.csv", RECORDS)
+
+        source = formats.InputSource(os.path.join(self.directory.name, "Account-*"))
+
+        self.assertEqual(FIELDNAMES, source.fieldnames)
+        self.assertEqual(EXPECTED, list(source))
+        # Each iteration reads the files again.
+        self.assertEqual(EXPECTED, list(source))
+
+    def test_reads_single_file(self):
+        self.write("Account.jsonl", RECORDS)
+
+        source = formats.InputSource(os.path.join(self.directory.name, "Account.jsonl"))
+
+        self.assertEqual(EXPECTED, list(source))
+
+    def test_raises_exception_for_missing_files(self):
+        with self.assertRaises(IOError):
+            formats.InputSource(os.path.join(self.directory.name, "Account-*.csv"))
+        with self.assertRaises(IOError):
+            formats.InputSource(os.path.join(self.directory.name, "Account.csv"))
+
+    def test_reads_byte_ranges(self):
+        records = [
+            {"Id": "001{:012d}".format(i), "Name": 'Line\r\n"{}",'.format(i) * (i % 3)}
+            for i in range(50)
+        ]
+        self.write("Account-1.csv", records, ["Id", "Name"])
+        self.write("Account-2.csv", records[:1], ["Id", "Name"])
+        source = formats.InputSource(os.path.join(self.directory.name, "Account-*"))
+
+        for size in [1, 10, 100, 100000]:
+            with self.subTest(size=size):
+                ranges = list(source.byte_ranges(size))
+
+                self.assertEqual(
+                    list(source),
+                    [
+                        r
+                        for byte_range in ranges
+                        for r in source.read_range(*byte_range)
+                    ],
+                )
+                if size == 100000:
+                    self.assertEqual(2, len(ranges))
+
+    def read_ranges(self, source, size):
+        # Reads source as a load does, reading the rest of a file sequentially
+        # from the first range that can't be read on its own.
+        records = []
+        sequential = set()
+        for path, start, end in source.byte_ranges(size):
+            if path in sequential:
+                continue
+            try:
+                records.extend(source.read_range(path, start, end))
+            except formats.UnsplittableRangeException:
+                sequential.add(path)
+                records.extend(source.read_range(path, start, None))
+
+        return records, sequential
+
+    def test_reads_byte_ranges_with_loose_quoting(self):
+        path = os.path.join(self.directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            f.write("Id,Name\r\n")
+            for i in range(50):
+                # csv reads a quote within an unquoted value as an ordinary character.
+                name = (
+                    'Bare "quote {}'.format(i)
+                    if i == 20
+                    else '"Quoted\r\n""{}"""'.format(i)
+                )
+                f.write("001{:012d},{}\r\n".format(i, name))
+        source = formats.InputSource(path)
+
+        for size in [1, 10, 100]:
+            with self.subTest(size=size):
+                records, sequential = self.read_ranges(source, size)
+
+                self.assertEqual(list(source), records)
+                self.assertEqual({path}, sequential)
+
+    def test_rejects_long_range_with_loose_quoting(self):
+        # A range that doesn't follow strict quoting is rejected in linear time,
+        # however many CRLF-terminated lines come before the stray quote.
+        path = os.path.join(self.directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            f.write("Id,Name\r\n")
+            for i in range(1000):
+                f.write("001{:012d},Test {}\r\n".format(i, i))
+            f.write('001000000001000,Bare "quote\r\n')
+        source = formats.InputSource(path)
+        start, end = len("Id,Name\r\n"), os.path.getsize(path)
+
+        with self.assertRaises(formats.UnsplittableRangeException):
+            list(source.read_range(path, start, end))
+        self.assertEqual(1001, len(list(source.read_range(path, start, None))))
+
+    def test_reads_byte_ranges_with_loose_quoting_in_header(self):
+        path = os.path.join(self.directory.name, "Account.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            f.write('Id,Name "Full"\r\n001000000000000,Test\r\n')
+        source = formats.InputSource(path)
+
+        self.assertEqual([(path, 0, None)], list(source.byte_ranges(10)))
+        self.assertEqual(
+            [{"Id": "001000000000000", 'Name "Full"': "Test"}],
+            list(source.read_range(path, 0, None)),
+        )
+
+    def test_byte_ranges_requires_uncompressed_csv(self):
+        self.write("Account.csv.gz", RECORDS)
+        source = formats.InputSource(
+            os.path.join(self.directory.name, "Account.csv.gz")
+        )
+
+        self.assertIsNone(source.byte_ranges(100))
+
+    def test_raises_exception_for_mismatched_columns(self):
+        self.write("Account-1.csv", RECORDS)
+        self.write("Account-2.csv", RECORDS, ["Id", "Name"])
+
+        with self.assertRaises(formats.FileFormatException) as e:
+            formats.InputSource(os.path.join(self.directory.name, "Account-*.csv"))
+
+        self.assertIn("has different columns from", str(e.exception))
@@ -2,7 +2,7 @@ import json
 import unittest
 from functools import reduce
 
-from amaxa.api import BatchIterator, JSONIterator
+from amaxa.api import BatchIterator, JSONIterator, ThreadedIterator
 
 
 class test_iterators(unittest.TestCase):
@@ -24,3 +24,20 @@ class test_iterators(unittest.TestCase):
 
         with self.assertRaises(StopIteration):
             next(b)
+
+    def test_ThreadedIterator(self):
+        self.assertEqual(
+            list(range(1001)), list(ThreadedIterator(iter(range(1001)), 2, 100))
+        )
+        self.assertEqual([], list(ThreadedIterator(iter([]), 2)))
+
+    def test_ThreadedIterator_raises_exceptions(self):
+        def records():
+            yield 1
+            raise ValueError("bad record")
+
+        t = ThreadedIterator(records(), 2)
+
+        self.assertEqual(1, next(t))
+        with self.assertRaises(ValueError):
+            next(t)